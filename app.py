@@ -1,6 +1,26 @@
+import importlib
+import os
+
+# Green thread servers need the standard library patched before anything
+# else (Flask, SQLAlchemy, database drivers) is imported
+async_mode = os.environ.get('SOCKETIO_ASYNC_MODE', 'threading')
+if async_mode == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif async_mode == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+if async_mode in ('eventlet', 'gevent') and os.environ.get('DATABASE_URL', '').startswith('postgres'):
+    # psycopg2 is a C extension the monkey patching can't reach; psycogreen makes it yield
+    try:
+        importlib.import_module(f'psycogreen.{async_mode}').patch_psycopg()
+    except ImportError:
+        print("Install psycogreen so database queries don't block the server (pip install psycogreen)")
+
 from flask_app import create_app
 
 app, socketio = create_app()
 
 if __name__ == '__main__':
-    socketio.run(app, debug=True, host='0.0.0.0', allow_unsafe_werkzeug=True)
\ No newline at end of file
+    socketio.run(app, debug=True, host='0.0.0.0', allow_unsafe_werkzeug=True)
@@ -0,0 +1,114 @@
+"""
+Benchmark the JSON codec backends on realistic saves
+
+Usage:
+    python -m benchmarks.codec_benchmark [iterations]
+
+Builds a 10-planet game save shaped like the ones the client sends (with
+orbits, buildings and orbital structures) and times encoding and decoding
+it with every installed backend, checking each one round-trips the data.
+"""
+import json
+import math
+import random
+import sys
+import time
+from datetime import datetime
+
+from flask_app import codec
+
+def make_save(num_planets=10, seed=42):
+    """Generate a game save with num_planets planets"""
+    rng = random.Random(seed)
+    planet_types = ["Terrestrial", "Gas Giant", "Ice Giant", "Desert", "Ocean"]
+    data = {
+        "resources": rng.uniform(0, 10000),
+        "research_points": rng.uniform(0, 5000),
+        "population": rng.uniform(0, 2000),
+        "last_updated": datetime.utcnow().isoformat(),
+        "num_planets": num_planets,
+        "planets": [],
+        "stars": [{
+            "id": "star_1",
+            "position": {"x": 0, "y": 0, "z": 0},
+            "data": {"name": "Sol Prime", "type": "Main Sequence", "temperature": 5500, "luminosity": 1.0}
+        }],
+        "seed": str(rng.random()),
+        "playerPosition": {"x": 0, "y": 100, "z": 400},
+        "buildings": {},
+        "mining_facilities": {},
+        "research_outposts": {},
+        "colony_bases": {},
+        "materials": {"blue": rng.uniform(0, 500), "red": rng.uniform(0, 500), "green": rng.uniform(0, 500)},
+        "orbital_structures": {},
+        "ships": {"fighters": rng.randint(0, 50), "capital_ships": rng.randint(0, 5)}
+    }
+    
+    for i in range(num_planets):
+        planet_id = f"planet_{i}"
+        distance = 80 + i * 50 + rng.randint(0, 20)
+        angle = rng.random() * 2 * math.pi
+        data["planets"].append({
+            "position": {"x": distance * math.cos(angle), "y": (rng.random() - 0.5) * 20,
+                         "z": distance * math.sin(angle)},
+            "orbit": {"distance": distance, "angle": angle, "speed": rng.uniform(0.001, 0.01)},
+            "data": {
+                "name": f"Planet {i + 1}",
+                "type": rng.choice(planet_types),
+                "radius": rng.uniform(2, 12),
+                "seed": rng.random(),
+                "resources": {"minerals": rng.randint(20, 100), "energy": rng.randint(20, 100),
+                              "water": rng.randint(20, 100)}
+            }
+        })
+        data["buildings"][planet_id] = [
+            {"type": rng.choice(["mining", "research", "colony", "defense"]),
+             "position": {"lat": rng.uniform(-90, 90), "lon": rng.uniform(-180, 180)},
+             "level": rng.randint(1, 3)}
+            for _ in range(rng.randint(0, 6))
+        ]
+        data["mining_facilities"][planet_id] = rng.randint(0, 4)
+        data["research_outposts"][planet_id] = rng.randint(0, 2)
+        data["colony_bases"][planet_id] = rng.randint(0, 2)
+        data["orbital_structures"][planet_id] = {"fighter_hangar": rng.randint(0, 1),
+                                                 "shipyard": rng.randint(0, 1)}
+    return data
+
+def time_backend(name, data, iterations):
+    """Time dumps() and loads() for one backend"""
+    codec.configure(name)
+    raw = codec.dumps(data)
+    
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.dumps(data)
+    dump_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.loads(raw)
+    load_time = time.perf_counter() - start
+    
+    return dump_time, load_time, len(raw), codec.loads(raw) == data
+
+def main(iterations):
+    data = make_save()
+    print(f"10-planet save, {len(json.dumps(data))} bytes with json.dumps defaults, {iterations} iterations")
+    
+    totals = {}
+    for name in codec.available():
+        dump_time, load_time, size, round_trips = time_backend(name, data, iterations)
+        totals[name] = dump_time + load_time
+        print(f"{name:>8}: dumps {dump_time / iterations * 1e6:7.1f} us, "
+              f"loads {load_time / iterations * 1e6:7.1f} us, "
+              f"{size} bytes, round trip {'ok' if round_trips else 'MISMATCH'}")
+    
+    # Speedups against the standard library
+    for name, total in totals.items():
+        if name != 'json':
+            print(f"{name} is {totals['json'] / total:.1f}x faster than json for a dumps + loads")
+    
+    codec.configure()
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
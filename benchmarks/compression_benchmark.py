@@ -0,0 +1,39 @@
+"""
+Benchmark the game_data storage formats
+
+Usage:
+    python -m benchmarks.compression_benchmark [iterations]
+
+Packs a realistic 10-planet save with every available compression method
+and reports the stored size (what each tick or save writes to the
+database) and the time to pack and unpack it.
+"""
+import sys
+import time
+
+from flask_app import codec, compression
+from benchmarks.codec_benchmark import make_save
+
+def main(iterations):
+    text = codec.dumps(make_save())
+    print(f"10-planet save, {len(text)} bytes of JSON, {iterations} iterations")
+    
+    for method in compression.available():
+        packed = compression.pack(text, method)
+        
+        start = time.perf_counter()
+        for _ in range(iterations):
+            compression.pack(text, method)
+        pack_time = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        for _ in range(iterations):
+            compression.unpack(packed)
+        unpack_time = time.perf_counter() - start
+        
+        print(f"{method:>5}: {len(packed):6} bytes stored ({len(packed) / len(text):6.1%}), "
+              f"pack {pack_time / iterations * 1e6:7.1f} us, unpack {unpack_time / iterations * 1e6:7.1f} us, "
+              f"round trip {'ok' if compression.unpack(packed) == text else 'MISMATCH'}")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000)
@@ -0,0 +1,120 @@
+"""
+Benchmark how many concurrent Socket.IO connections a server process holds
+
+Usage:
+    python -m benchmarks.connections_benchmark URL [connections] [rounds]
+
+Start the server first with the same DATABASE_URL and SECRET_KEY as the
+benchmark, e.g. `SOCKETIO_ASYNC_MODE=eventlet python app.py`. The
+benchmark creates `connections` users (bench_0, bench_1, ...) if they
+don't exist, signs a login session cookie for each with the app's secret
+key instead of logging in (so password hashing isn't what's measured)
+and opens one websocket connection per user. It reports how long
+connecting took, then sends `rounds` rounds of a roster request from
+every connection at once and reports the reply latency, which is how
+responsive the server stays with that many players online.
+
+Needs the Socket.IO client: pip install "python-socketio[client]"
+"""
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import socketio as socketio_client
+
+from flask_app import create_app, db
+from flask_app.models.user import User
+
+def bench_users(app, count):
+    """Get the IDs of `count` benchmark users, creating the missing ones"""
+    with app.app_context():
+        names = [f"bench_{i}" for i in range(count)]
+        existing = {user.username: user.id for user in User.query.filter(User.username.in_(names))}
+        new_users = [User(username=name, email=f"{name}@bench.invalid", faction=("blue", "red", "green")[i % 3],
+                          password_hash="!") for i, name in enumerate(names) if name not in existing]
+        if new_users:
+            db.session.add_all(new_users)
+            db.session.flush()
+            for user in new_users:
+                user.initialize_game_data()
+            db.session.commit()
+            existing.update((user.username, user.id) for user in new_users)
+        return [existing[name] for name in names]
+
+def session_cookie(app, user_id):
+    """Build the Cookie header of a logged in Flask-Login session"""
+    serializer = app.session_interface.get_signing_serializer(app)
+    value = serializer.dumps({'_user_id': str(user_id), '_fresh': False})
+    return f"{app.config['SESSION_COOKIE_NAME']}={value}"
+
+class BenchClient:
+    """One connected player, timing roster replies"""
+    
+    def __init__(self, url, cookie):
+        self.client = socketio_client.Client(reconnection=False)
+        self.url = url
+        self.cookie = cookie
+        self.replied = threading.Event()
+        self.client.on('active_players_list', lambda data: self.replied.set())
+    
+    def connect(self):
+        start = time.perf_counter()
+        self.client.connect(self.url, headers={'Cookie': self.cookie}, transports=['websocket'])
+        return time.perf_counter() - start
+    
+    def round_trip(self, timeout=30):
+        self.replied.clear()
+        start = time.perf_counter()
+        self.client.emit('get_active_players', {'limit': 10})
+        if not self.replied.wait(timeout):
+            return None
+        return time.perf_counter() - start
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda fraction: samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000
+    return f"p50 {pick(0.5):7.1f} ms, p95 {pick(0.95):7.1f} ms, p99 {pick(0.99):7.1f} ms"
+
+def main(url, connections, rounds):
+    app, _ = create_app()
+    user_ids = bench_users(app, connections)
+    clients = [BenchClient(url, session_cookie(app, user_id)) for user_id in user_ids]
+    
+    with ThreadPoolExecutor(max_workers=64) as executor:
+        start = time.perf_counter()
+        connect_futures = [executor.submit(client.connect) for client in clients]
+        connect_times = []
+        for future in connect_futures:
+            try:
+                connect_times.append(future.result())
+            except Exception as e:
+                print(f"Connection failed: {e}")
+        connect_elapsed = time.perf_counter() - start
+        connected = [client for client in clients if client.client.connected]
+        print(f"{len(connected)}/{connections} connected in {connect_elapsed:.1f}s "
+              f"({len(connected) / connect_elapsed:.0f}/s), connect {percentiles(connect_times or [0])}")
+        
+        # Let the server settle (initial resource updates) before measuring
+        time.sleep(1)
+    
+    # One thread per connection so every request is in flight at once
+    with ThreadPoolExecutor(max_workers=max(1, len(connected))) as executor:
+        for round_number in range(rounds):
+            start = time.perf_counter()
+            latencies = list(executor.map(lambda client: client.round_trip(), connected))
+            elapsed = time.perf_counter() - start
+            answered = [latency for latency in latencies if latency is not None]
+            print(f"round {round_number + 1}: {len(answered)}/{len(connected)} replies in {elapsed:.2f}s, "
+                  f"{percentiles(answered or [0])}")
+        
+        for client in connected:
+            executor.submit(client.client.disconnect)
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    main(sys.argv[1],
+         int(sys.argv[2]) if len(sys.argv) > 2 else 200,
+         int(sys.argv[3]) if len(sys.argv) > 3 else 5)
@@ -0,0 +1,98 @@
+"""
+Benchmark the scalar and vectorized resource accrual paths
+
+Usage:
+    python -m benchmarks.economy_benchmark [user counts...]
+
+Builds synthetic online users, advances them one tick with
+accrue_resources() per user and with EconomyEngine.step(), and checks
+that both paths produce bit-identical balances.
+"""
+import copy
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from flask_app.economy import EconomyEngine, FACTIONS
+from flask_app.models.game_settings import SettingsSnapshot
+from flask_app.models.user import accrue_resources
+
+SETTINGS = SettingsSnapshot({
+    'mining_rate': 5,
+    'research_rate': 3,
+    'population_rate': 2,
+    'blue_material_rate': 1.0,
+    'red_material_rate': 1.0,
+    'green_material_rate': 1.0
+})
+
+def make_users(count, now, seed=42):
+    """Generate (user_id, faction, game_data) tuples for count users"""
+    rng = random.Random(seed)
+    users = []
+    for user_id in range(count):
+        num_planets = rng.randint(5, 10)
+        planets = [f"planet_{i}" for i in range(num_planets)]
+        data = {
+            "resources": rng.uniform(0, 10000),
+            "research_points": rng.uniform(0, 5000),
+            "population": rng.uniform(0, 2000),
+            "materials": {name: rng.uniform(0, 500) for name in FACTIONS},
+            "mining_facilities": {planet: rng.randint(0, 4) for planet in planets},
+            "research_outposts": {planet: rng.randint(0, 2) for planet in planets},
+            "colony_bases": {planet: rng.randint(0, 2) for planet in planets},
+            "last_updated": (now - timedelta(microseconds=rng.randint(1, 5_000_000))).isoformat()
+        }
+        users.append((user_id, rng.choice(FACTIONS), data))
+    return users
+
+def run_scalar(users, now):
+    """Advance every user with the scalar accrual path"""
+    results = {}
+    start = time.perf_counter()
+    for user_id, faction, data in users:
+        seconds = (now - datetime.fromisoformat(data["last_updated"])).total_seconds()
+        accrue_resources(data, faction, SETTINGS, seconds)
+        data["last_updated"] = now.isoformat()
+        results[user_id] = data
+    return results, time.perf_counter() - start
+
+def run_vectorized(users, now):
+    """Advance every user with one vectorized engine step"""
+    engine = EconomyEngine(capacity=len(users))
+    for user_id, faction, data in users:
+        engine.load(user_id, faction, data)
+    
+    start = time.perf_counter()
+    engine.step(SETTINGS, now)
+    elapsed = time.perf_counter() - start
+    
+    results = {user_id: engine.export(user_id, copy.deepcopy(data)) for user_id, faction, data in users}
+    return results, elapsed
+
+def compare(scalar, vectorized):
+    """Count balances that differ between the two paths"""
+    mismatches = 0
+    for user_id, expected in scalar.items():
+        actual = vectorized[user_id]
+        for key in ("resources", "research_points", "population", "last_updated"):
+            mismatches += actual[key] != expected[key]
+        for name in FACTIONS:
+            mismatches += actual["materials"][name] != expected["materials"][name]
+    return mismatches
+
+def main(counts):
+    now = datetime.utcnow()
+    for count in counts:
+        users = make_users(count, now)
+        scalar, scalar_time = run_scalar(copy.deepcopy(users), now)
+        vectorized, vector_time = run_vectorized(users, now)
+        mismatches = compare(scalar, vectorized)
+        
+        print(f"{count:>7} users: scalar {scalar_time * 1000:8.1f} ms, "
+              f"vectorized {vector_time * 1000:8.1f} ms "
+              f"({scalar_time / vector_time:5.1f}x), mismatches {mismatches}")
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000])
@@ -0,0 +1,59 @@
+"""
+Benchmark storing planets as an overlay on the seed-generated world
+
+Usage:
+    python -m benchmarks.worldgen_benchmark [iterations]
+
+Builds a 10-planet save from a seed the way the client saves it back
+(orbits moved on, a few structures built) and compares the stored size and
+the time to serialize and parse it with and without the overlay.
+"""
+import random
+import sys
+import time
+
+from flask_app import codec, worldgen
+
+def make_world_save(num_planets=10, seed=42):
+    """Generate a seeded 10-planet save with the changes a client makes to it"""
+    rng = random.Random(seed)
+    world_seed = str(rng.random())
+    planets = worldgen.generate_planets(world_seed, num_planets)
+    for planet in planets:
+        planet["orbit"]["angle"] += rng.uniform(0, 1)
+        if rng.random() < 0.3:
+            planet["data"]["structures"] = [{"type": "mining"}]
+    return {
+        "seed": world_seed,
+        "num_planets": num_planets,
+        "planets": planets,
+        "resources": rng.uniform(0, 10000),
+        "mining_facilities": {f"planet_{i}": rng.randint(0, 4) for i in range(num_planets)}
+    }
+
+def time_format(data, iterations, compact):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        raw = codec.dumps(worldgen.compact_world(data) if compact else data)
+    dump_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for _ in range(iterations):
+        loaded = codec.loads(raw)
+        if compact:
+            worldgen.expand_world(loaded)
+    load_time = time.perf_counter() - start
+    
+    return dump_time, load_time, len(raw), loaded == data
+
+def main(iterations):
+    data = make_world_save()
+    print(f"10-planet seeded save, {iterations} iterations, {codec.backend} codec")
+    
+    for name, compact in (("planets", False), ("overlay", True)):
+        dump_time, load_time, size, round_trips = time_format(data, iterations, compact)
+        print(f"{name:>8}: {size:5} bytes stored, save {dump_time / iterations * 1e6:6.1f} us, "
+              f"load {load_time / iterations * 1e6:6.1f} us, round trip {'ok' if round_trips else 'MISMATCH'}")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
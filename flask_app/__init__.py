@@ -3,6 +3,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
 from flask_socketio import SocketIO
+from flask_app import codec, compression
 import os
 
 # Initialize extensions
@@ -19,14 +20,86 @@ def create_app():
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///massgravity.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
+    # Seconds between checks for game settings changed by another process
+    app.config['SETTINGS_RECHECK_INTERVAL'] = float(os.environ.get('SETTINGS_RECHECK_INTERVAL', 30))
+    
+    # Resource tick settings
+    app.config['RESOURCE_TICK_INTERVAL'] = float(os.environ.get('RESOURCE_TICK_INTERVAL', 5))
+    app.config['RESOURCE_TICK_BUILDING_INTERVAL'] = float(os.environ.get('RESOURCE_TICK_BUILDING_INTERVAL', 2))
+    app.config['RESOURCE_TICK_RESOLUTION'] = float(os.environ.get('RESOURCE_TICK_RESOLUTION', 0.25))
+    app.config['BUILDING_STATE_DURATION'] = float(os.environ.get('BUILDING_STATE_DURATION', 60))
+    app.config['RESOURCE_TICK_BATCHED'] = os.environ.get('RESOURCE_TICK_BATCHED', 'true').lower() == 'true'
+    app.config['RESOURCE_TICK_CHUNK_SIZE'] = int(os.environ.get('RESOURCE_TICK_CHUNK_SIZE', 500))
+    # 'tick' accrues and writes resources every tick, 'lazy' computes them on read
+    app.config['RESOURCE_ACCRUAL_MODE'] = os.environ.get('RESOURCE_ACCRUAL_MODE', 'tick')
+    # 'numpy' advances online users in one vectorized step and writes back every flush interval
+    app.config['ECONOMY_ENGINE'] = os.environ.get('ECONOMY_ENGINE', 'scalar')
+    app.config['ECONOMY_FLUSH_INTERVAL'] = float(os.environ.get('ECONOMY_FLUSH_INTERVAL', 60))
+    # Send only changed fields in resource updates, with a full keyframe every N updates
+    app.config['RESOURCE_DELTAS'] = os.environ.get('RESOURCE_DELTAS', 'true').lower() == 'true'
+    app.config['RESOURCE_KEYFRAME_INTERVAL'] = int(os.environ.get('RESOURCE_KEYFRAME_INTERVAL', 12))
+    # Keep online players' parsed game state in memory and write it back in batches
+    app.config['GAME_STATE_CACHE'] = os.environ.get('GAME_STATE_CACHE', 'false').lower() == 'true'
+    app.config['GAME_STATE_FLUSH_INTERVAL'] = float(os.environ.get('GAME_STATE_FLUSH_INTERVAL', 10))
+    app.config['GAME_STATE_CACHE_BUDGET'] = int(os.environ.get('GAME_STATE_CACHE_BUDGET', 64 * 1024 * 1024))
+    # Hold Socket.IO saves for a window so bursts cost one write, and cap each user's save rate
+    app.config['SAVE_COALESCE_WINDOW'] = float(os.environ.get('SAVE_COALESCE_WINDOW', 2))
+    app.config['SAVE_RATE_LIMIT'] = float(os.environ.get('SAVE_RATE_LIMIT', 60))
+    app.config['SAVE_RATE_BURST'] = int(os.environ.get('SAVE_RATE_BURST', 10))
+    # Pre-generated starting systems kept ready for registration (0 generates them inline)
+    app.config['WORLD_POOL_SIZE'] = int(os.environ.get('WORLD_POOL_SIZE', 32))
+    # Password hashing on a bounded thread pool; the method sets the algorithm and iterations
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 64))
+    # Seconds a logged in user's identity is reused before it is loaded again (0 disables)
+    app.config['USER_CACHE_TTL'] = float(os.environ.get('USER_CACHE_TTL', 30))
+    # Roster join/leave deltas kept for clients catching up on the players panel
+    app.config['PRESENCE_LOG_SIZE'] = int(os.environ.get('PRESENCE_LOG_SIZE', 1000))
+    # Seconds a process can miss presence heartbeats before its players are taken offline (redis state backend)
+    app.config['PRESENCE_PROCESS_TTL'] = float(os.environ.get('PRESENCE_PROCESS_TTL', 30))
+    # Seconds before an unanswered battle request expires, a battle whose players
+    # didn't both get ready times out, and an untouched battle is ended
+    app.config['BATTLE_REQUEST_TIMEOUT'] = float(os.environ.get('BATTLE_REQUEST_TIMEOUT', 60))
+    app.config['BATTLE_READY_TIMEOUT'] = float(os.environ.get('BATTLE_READY_TIMEOUT', 10))
+    app.config['BATTLE_INACTIVITY_TIMEOUT'] = float(os.environ.get('BATTLE_INACTIVITY_TIMEOUT', 300))
+    # Socket.IO server model: 'threading', or 'eventlet'/'gevent' (app.py monkey-patches for them)
+    app.config['SOCKETIO_ASYNC_MODE'] = os.environ.get('SOCKETIO_ASYNC_MODE', 'threading')
+    # Redis URL Socket.IO processes exchange emits through, needed to run more than one
+    app.config['SOCKETIO_MESSAGE_QUEUE'] = os.environ.get('SOCKETIO_MESSAGE_QUEUE') or None
+    # Where presence, pending battles and combat rooms live: 'memory' (one process) or 'redis' (shared)
+    app.config['STATE_BACKEND'] = os.environ.get('STATE_BACKEND', 'memory')
+    app.config['STATE_BACKEND_URL'] = os.environ.get('STATE_BACKEND_URL') or app.config['SOCKETIO_MESSAGE_QUEUE']
+    # JSON backend for game data, responses and socket packets: auto, orjson, msgspec or json
+    app.config['JSON_CODEC'] = os.environ.get('JSON_CODEC', 'auto')
+    # Storage format for new game_data writes: none, zlib or zstd
+    app.config['GAME_DATA_COMPRESSION'] = os.environ.get('GAME_DATA_COMPRESSION', 'none')
+    
+    # Serialize responses with the configured JSON codec
+    codec.configure(app.config['JSON_CODEC'])
+    app.json = codec.CodecJSONProvider(app)
+    
+    # Compress game_data on write with the configured method
+    compression.configure(app.config['GAME_DATA_COMPRESSION'])
+    
     # Initialize extensions with app
     db.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     
+    # Cache users for the user loader
+    from flask_app import user_cache
+    user_cache.init_app(app)
+    
     # Initialize SocketIO with CORS support and message queue
-    socketio.init_app(app, cors_allowed_origins="*")
+    socketio.init_app(app, cors_allowed_origins="*", json=codec,
+                      async_mode=app.config['SOCKETIO_ASYNC_MODE'],
+                      message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'])
+    
+    # Hash passwords off the workers serving requests and Socket.IO events
+    from flask_app import passwords
+    passwords.init_app(app, socketio.async_mode)
     
     # Register blueprints
     from flask_app.routes.main import main
@@ -36,12 +109,23 @@ def create_app():
     app.register_blueprint(auth)
     app.register_blueprint(admin)
     
+    # Register CLI commands
+    from flask_app.cli import world_cli, game_data_cli, users_cli
+    app.cli.add_command(world_cli)
+    app.cli.add_command(game_data_cli)
+    app.cli.add_command(users_cli)
+    
     # Create database tables
     with app.app_context():
         db.create_all()
     
+    # Starting systems for registration
+    from flask_app import world_pool
+    world_pool.init_app(app)
+    
     # Import socket events (must be after app is initialized)
     with app.app_context():
         import flask_app.socket_events
+        flask_app.socket_events.init_app(app)
     
     return app, socketio
\ No newline at end of file
@@ -0,0 +1,252 @@
+import csv
+import functools
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from werkzeug.security import generate_password_hash
+
+from flask_app import db, codec, compression, schema, worldgen
+from flask_app.models.user import User, parse_timestamp
+from flask_app.models.world import stage_world_sync
+
+world_cli = AppGroup('world', help='Manage the planet, facility, fleet and balance tables.')
+
+@world_cli.command('backfill')
+@click.option('--chunk-size', default=500, show_default=True,
+              help='Users loaded and committed together.')
+def backfill_world(chunk_size):
+    """Rebuild every user's world rows and production columns from their game_data"""
+    start = time.monotonic()
+    last_id = 0
+    written = 0
+    skipped = 0
+    
+    while True:
+        users = (User.query.filter(User.id > last_id)
+                 .order_by(User.id)
+                 .limit(chunk_size)
+                 .all())
+        if not users:
+            break
+        
+        for user in users:
+            try:
+                data = user.read_game_data()
+            except codec.JSONDecodeError:
+                click.echo(f"Skipping user {user.id} ({user.username}): invalid game data")
+                skipped += 1
+                continue
+            
+            # Stage the rows without touching game_data itself
+            user.update_production(data)
+            user.last_accrual_at = parse_timestamp(data.get('last_updated'))
+            stage_world_sync(user.id, data)
+            written += 1
+        
+        db.session.commit()
+        last_id = users[-1].id
+        click.echo(f"Backfilled {written} users (up to user {last_id})")
+    
+    elapsed = time.monotonic() - start
+    click.echo(f"Done: {written} users backfilled, {skipped} skipped in {elapsed:.1f}s")
+
+game_data_cli = AppGroup('game-data', help='Inspect and convert the stored game_data format.')
+
+@game_data_cli.command('stats')
+@click.option('--chunk-size', default=500, show_default=True,
+              help='Rows read together.')
+def game_data_stats(chunk_size):
+    """Report stored game_data size against its plain JSON size"""
+    rows = 0
+    stored_bytes = 0
+    json_bytes = 0
+    formats = {}
+    
+    with db.engine.connect() as connection:
+        for chunk in compression.scan(connection, chunk_size):
+            for user_id, stored in chunk:
+                if stored is None:
+                    continue
+                rows += 1
+                stored_bytes += len(stored)
+                json_bytes += len(compression.unpack(stored))
+                stored_format = compression.stored_format(stored)
+                formats[stored_format] = formats.get(stored_format, 0) + 1
+    
+    if not rows:
+        click.echo("No game data stored")
+        return
+    
+    saved = json_bytes - stored_bytes
+    click.echo(f"{rows} rows: {stored_bytes / 1024:.1f} KiB stored, {json_bytes / 1024:.1f} KiB as JSON "
+               f"({stored_bytes / json_bytes:.1%} of JSON size)")
+    click.echo(f"Average write: {stored_bytes / rows:.0f} bytes instead of {json_bytes / rows:.0f} "
+               f"({saved / rows:.0f} bytes of I/O saved per full write)")
+    click.echo("Formats: " + ", ".join(f"{name} {count}" for name, count in sorted(formats.items())))
+
+@game_data_cli.command('compress')
+@click.option('--method', type=click.Choice(compression.METHODS), default=None,
+              help='Format to store (defaults to GAME_DATA_COMPRESSION).')
+@click.option('--chunk-size', default=500, show_default=True,
+              help='Rows rewritten and committed together.')
+def compress_game_data(method, chunk_size):
+    """Rewrite every stored game_data value in one format"""
+    method = method or current_app.config['GAME_DATA_COMPRESSION']
+    start = time.monotonic()
+    totals = None
+    
+    with db.engine.connect() as connection:
+        for totals in compression.recompress(connection, method, chunk_size):
+            connection.commit()
+            click.echo(f"Scanned {totals['rows']} rows, rewrote {totals['rewritten']}")
+    
+    if totals:
+        click.echo(f"Done in {time.monotonic() - start:.1f}s: {totals['bytes_before'] / 1024:.1f} KiB "
+                   f"-> {totals['bytes_after'] / 1024:.1f} KiB")
+
+@game_data_cli.command('upgrade')
+@click.option('--chunk-size', default=500, show_default=True,
+              help='Users loaded and committed together.')
+def upgrade_game_data(chunk_size):
+    """Bring every user's game_data up to the current schema version"""
+    start = time.monotonic()
+    last_id = 0
+    scanned = 0
+    upgraded = 0
+    skipped = 0
+    
+    while True:
+        users = (User.query.filter(User.id > last_id)
+                 .order_by(User.id)
+                 .limit(chunk_size)
+                 .all())
+        if not users:
+            break
+        
+        for user in users:
+            scanned += 1
+            try:
+                data = worldgen.expand_world(codec.loads(user.game_data_text()))
+            except codec.JSONDecodeError:
+                click.echo(f"Skipping user {user.id} ({user.username}): invalid game data")
+                skipped += 1
+                continue
+            
+            if schema.upgrade_game_data(data):
+                user.write_game_data(data)
+                upgraded += 1
+        
+        db.session.commit()
+        last_id = users[-1].id
+        click.echo(f"Scanned {scanned} users, upgraded {upgraded} (up to user {last_id})")
+    
+    elapsed = time.monotonic() - start
+    click.echo(f"Done: {upgraded} of {scanned} users upgraded to schema version "
+               f"{schema.CURRENT_VERSION}, {skipped} skipped in {elapsed:.1f}s")
+
+users_cli = AppGroup('users', help='Provision user accounts in bulk.')
+
+FACTIONS = ('blue', 'red', 'green')
+
+def read_accounts(path, file_format):
+    """Yield account dicts (username, email, password, faction) from a CSV or NDJSON file"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield codec.loads(line)
+
+def hash_batch(executor, accounts, workers):
+    """Start hashing a batch's passwords in the process pool (an iterator of hashes in order)"""
+    passwords = [account['password'] for account in accounts]
+    hash_password = functools.partial(generate_password_hash, method=current_app.config['PASSWORD_HASH_METHOD'])
+    return executor.map(hash_password, passwords, chunksize=max(1, len(passwords) // (workers * 4)))
+
+@users_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'ndjson']), default=None,
+              help='File format (defaults to the file extension).')
+@click.option('--batch-size', default=500, show_default=True,
+              help='Users inserted and committed together.')
+@click.option('--workers', default=os.cpu_count(), show_default=True,
+              help='Processes hashing passwords.')
+def import_users(path, file_format, batch_size, workers):
+    """
+    Create users from a CSV or NDJSON file of username, email, password and faction
+    
+    Passwords are hashed across a process pool while the previous batch is
+    inserted, and every user gets a starting system like on registration.
+    Usernames or emails that already exist are skipped.
+    """
+    file_format = file_format or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    start = time.monotonic()
+    created = 0
+    skipped = 0
+    hash_wait = 0.0
+    seen_usernames = set()
+    seen_emails = set()
+    
+    def valid(account):
+        nonlocal skipped
+        username = account.get('username')
+        email = account.get('email')
+        if (not username or not email or not account.get('password')
+                or account.get('faction') not in FACTIONS
+                or username in seen_usernames or email in seen_emails):
+            skipped += 1
+            return False
+        seen_usernames.add(username)
+        seen_emails.add(email)
+        return True
+    
+    accounts = filter(valid, read_accounts(path, file_format))
+    batches = iter(lambda: list(itertools.islice(accounts, batch_size)), [])
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        batch = next(batches, None)
+        hashes = hash_batch(executor, batch, workers) if batch else None
+        
+        while batch:
+            # Hash the next batch while this one is inserted
+            next_batch = next(batches, None)
+            next_hashes = hash_batch(executor, next_batch, workers) if next_batch else None
+            
+            existing = {name for (name,) in db.session.query(User.username)
+                        .filter(User.username.in_([account['username'] for account in batch]))}
+            existing.update(email for (email,) in db.session.query(User.email)
+                            .filter(User.email.in_([account['email'] for account in batch])))
+            
+            wait_start = time.monotonic()
+            password_hashes = list(hashes)
+            hash_wait += time.monotonic() - wait_start
+            
+            users = []
+            for account, password_hash in zip(batch, password_hashes):
+                if account['username'] in existing or account['email'] in existing:
+                    skipped += 1
+                    continue
+                users.append(User(username=account['username'], email=account['email'],
+                                  faction=account['faction'], password_hash=password_hash))
+            
+            # One multi-row INSERT for the batch, then the game data and world rows
+            db.session.add_all(users)
+            db.session.flush()
+            for user in users:
+                user.initialize_game_data()
+            db.session.commit()
+            
+            created += len(users)
+            elapsed = time.monotonic() - start
+            click.echo(f"Created {created} users ({created / elapsed:.0f}/s), skipped {skipped}")
+            batch, hashes = next_batch, next_hashes
+    
+    elapsed = time.monotonic() - start
+    click.echo(f"Done: {created} users created, {skipped} skipped in {elapsed:.1f}s "
+               f"({created / elapsed:.0f} users/s, {hash_wait:.1f}s waiting on password hashing)")
@@ -0,0 +1,129 @@
+"""
+JSON encoding for game data, HTTP responses and Socket.IO packets
+
+Uses orjson or msgspec when installed and falls back to the standard
+library. The module has the dumps()/loads() interface of the json module
+so it can be passed straight to Socket.IO, and CodecJSONProvider plugs it
+into Flask. Output is compact; ensure_ascii is ignored by the fast
+backends since both forms decode to the same data.
+"""
+import json
+from json import JSONDecodeError
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+BACKENDS = ('orjson', 'msgspec', 'json')
+
+# Backend in use, set by configure()
+backend = 'json'
+
+COMPACT_SEPARATORS = (',', ':')
+
+# Errors raised by the fast backends on input they can't parse
+DECODE_ERRORS = (ValueError, msgspec.DecodeError) if msgspec is not None else (ValueError,)
+
+def available():
+    """Get the installed backends, fastest first"""
+    installed = {'orjson': orjson is not None, 'msgspec': msgspec is not None, 'json': True}
+    return [name for name in BACKENDS if installed[name]]
+
+def configure(name='auto'):
+    """
+    Pick the backend used by dumps() and loads()
+    
+    Args:
+        name: 'auto' for the fastest installed backend, or one of BACKENDS
+    
+    Returns:
+        Name of the backend in use
+    """
+    global backend
+    installed = available()
+    
+    if name == 'auto':
+        backend = installed[0]
+    elif name in installed:
+        backend = name
+    else:
+        backend = installed[0]
+        print(f"JSON backend {name!r} is not available, using {backend}")
+    return backend
+
+def dumps(obj, *, default=None, sort_keys=False, indent=None, separators=None, **kwargs):
+    """
+    Serialize obj to a JSON string
+    
+    Takes the same arguments as json.dumps(). Options the fast backends
+    can't honour (custom separators or indents, cls, ...) and values they
+    reject (e.g. integers over 64 bits) go through the standard library.
+    """
+    if backend != 'json':
+        kwargs.pop('ensure_ascii', None)
+    fast = (backend != 'json' and not kwargs and indent in (None, 2)
+            and separators in (None, COMPACT_SEPARATORS))
+    
+    if fast and backend == 'orjson':
+        # Leave datetimes to default (e.g. HTTP dates in Flask) like the json module
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent == 2:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=default, option=option).decode()
+        except TypeError:
+            pass
+    elif fast and backend == 'msgspec':
+        try:
+            encoded = msgspec.json.encode(obj, enc_hook=default, order='sorted' if sort_keys else None)
+            if indent == 2:
+                encoded = msgspec.json.format(encoded, indent=2)
+            return encoded.decode()
+        except (TypeError, msgspec.EncodeError):
+            pass
+    
+    if separators is None and indent is None:
+        separators = COMPACT_SEPARATORS
+    return json.dumps(obj, default=default, sort_keys=sort_keys, indent=indent,
+                      separators=separators, **kwargs)
+
+def loads(s, **kwargs):
+    """
+    Parse a JSON string or bytes
+    
+    Raises json.JSONDecodeError on invalid input with every backend. Text
+    the fast backends reject but the standard library accepts (NaN or
+    Infinity written by older servers) is parsed by the standard library.
+    """
+    if backend != 'json' and not kwargs:
+        try:
+            if backend == 'orjson':
+                return orjson.loads(s)
+            return msgspec.json.decode(s)
+        except DECODE_ERRORS:
+            pass
+    
+    return json.loads(s, **kwargs)
+
+class CodecJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that serializes with the configured codec backend"""
+    
+    def dumps(self, obj, **kwargs):
+        kwargs.setdefault('default', self.default)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return dumps(obj, **kwargs)
+    
+    def loads(self, s, **kwargs):
+        return loads(s, **kwargs)
+
+configure()
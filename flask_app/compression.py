@@ -0,0 +1,147 @@
+"""
+Compressed storage format for the game_data column
+
+Compressed values are base64 text behind a marker naming the format, so
+the column stays Text and plain-JSON rows written before compression was
+turned on (or blobs too small to be worth it) still read as they are.
+"""
+import base64
+import zlib
+
+import sqlalchemy as sa
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+METHODS = ('none', 'zlib', 'zstd')
+
+# Prefix of each compressed format; plain JSON never starts with these
+MARKERS = {
+    'zlib': 'z1:',
+    'zstd': 'zs1:'
+}
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Blobs shorter than this (e.g. an empty '{}') are always stored as plain JSON
+MIN_SIZE = 256
+
+# Method used by pack() when none is given, set by configure()
+method = 'none'
+
+def available():
+    """Get the usable compression methods"""
+    return [name for name in METHODS if name != 'zstd' or zstandard is not None]
+
+def configure(name='none'):
+    """
+    Pick the method used to store game_data
+    
+    Returns:
+        Name of the method in use
+    """
+    global method
+    if name in available():
+        method = name
+    else:
+        method = 'zlib'
+        print(f"Game data compression {name!r} is not available, using zlib")
+    return method
+
+def pack(text, using=None):
+    """
+    Encode serialized game data for storage
+    
+    Args:
+        text: Plain JSON
+        using: Compression method (defaults to the configured one)
+    
+    Returns:
+        The stored form: plain JSON, or a marker plus base64 compressed data
+    """
+    using = using or method
+    if using == 'none' or len(text) < MIN_SIZE:
+        return text
+    
+    if using == 'zstd':
+        compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(text.encode())
+    else:
+        compressed = zlib.compress(text.encode(), ZLIB_LEVEL)
+    
+    packed = MARKERS[using] + base64.b64encode(compressed).decode('ascii')
+    return packed if len(packed) < len(text) else text
+
+def unpack(stored):
+    """Get the plain JSON back from a stored game_data value in any format"""
+    if not stored or stored[0] == '{':
+        return stored
+    
+    if stored.startswith(MARKERS['zlib']):
+        return zlib.decompress(base64.b64decode(stored[len(MARKERS['zlib']):])).decode()
+    
+    if stored.startswith(MARKERS['zstd']):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed game data")
+        compressed = base64.b64decode(stored[len(MARKERS['zstd']):])
+        return zstandard.ZstdDecompressor().decompress(compressed).decode()
+    
+    return stored
+
+def stored_format(stored):
+    """Get the storage format of a game_data value"""
+    for name, marker in MARKERS.items():
+        if stored and stored.startswith(marker):
+            return name
+    return 'none'
+
+# Lightweight table so migrations and the CLI can work on raw rows
+users = sa.table('user', sa.column('id', sa.Integer), sa.column('game_data', sa.Text))
+
+def scan(connection, chunk_size=500):
+    """Yield chunks of (user_id, stored game_data) rows in ID order"""
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(users.c.id, users.c.game_data)
+            .where(users.c.id > last_id)
+            .order_by(users.c.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+def recompress(connection, using, chunk_size=500):
+    """
+    Rewrite every game_data value in the given format, one chunk at a time
+    
+    Yields after each chunk is updated so the caller can commit and report.
+    
+    Yields:
+        Running totals: rows scanned, rows rewritten, bytes before and after
+    """
+    totals = {'rows': 0, 'rewritten': 0, 'bytes_before': 0, 'bytes_after': 0}
+    update = (users.update()
+              .where(users.c.id == sa.bindparam('user_id'))
+              .values(game_data=sa.bindparam('packed')))
+    
+    for rows in scan(connection, chunk_size):
+        changed = []
+        for user_id, stored in rows:
+            if stored is None:
+                continue
+            packed = pack(unpack(stored), using)
+            totals['rows'] += 1
+            totals['bytes_before'] += len(stored)
+            totals['bytes_after'] += len(packed)
+            if packed != stored:
+                changed.append({'user_id': user_id, 'packed': packed})
+        
+        if changed:
+            connection.execute(update, changed)
+        totals['rewritten'] += len(changed)
+        yield dict(totals)
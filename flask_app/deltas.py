@@ -0,0 +1,115 @@
+import copy
+import threading
+
+def diff_state(old, new):
+    """
+    Find what changed between two game_data dicts
+    
+    Nested dicts are compared key by key; any other value (numbers,
+    strings, lists) is sent whole when it differs.
+    
+    Returns:
+        Tuple of (changed, removed) where changed is a nested dict holding
+        only the changed values and removed is a list of key paths
+    """
+    changed = {}
+    removed = []
+    
+    for key, value in new.items():
+        if key not in old:
+            changed[key] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            nested_changed, nested_removed = diff_state(old[key], value)
+            if nested_changed:
+                changed[key] = nested_changed
+            removed.extend([key] + path for path in nested_removed)
+        elif value != old[key]:
+            changed[key] = value
+    
+    for key in old:
+        if key not in new:
+            removed.append([key])
+    
+    return changed, removed
+
+def merge_state(base, changed):
+    """Apply a nested dict of changed values onto base in place"""
+    for key, value in changed.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            merge_state(base[key], value)
+        else:
+            base[key] = copy.deepcopy(value)
+    return base
+
+class DeltaEncoder:
+    """
+    Tracks the last resource state sent to each client and encodes changes
+    
+    The first update for a client, and every keyframe_interval updates
+    after that, is a full 'resource_update' keyframe. In between only the
+    changed fields go out as a 'resource_delta' with a sequence number that
+    restarts after each keyframe, so a client can spot a gap and resync.
+    """
+    
+    def __init__(self, keyframe_interval=12):
+        self.keyframe_interval = keyframe_interval
+        self._sent = {}
+        self._seq = {}
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._sent)
+    
+    def keyframe(self, sid, data):
+        """Record a full state sent to a client"""
+        with self._lock:
+            self._sent[sid] = copy.deepcopy(data)
+            self._seq[sid] = 0
+        return 'resource_update', data
+    
+    def encode(self, sid, data, partial=False):
+        """
+        Encode the next resource update for a client
+        
+        Args:
+            sid: Client session ID
+            data: Current game data for the client
+            partial: True if data only holds some fields (e.g. balances);
+                     missing fields are then left alone instead of removed
+        
+        Returns:
+            Tuple of (event name, payload) to emit
+        """
+        with self._lock:
+            base = self._sent.get(sid)
+            seq = self._seq.get(sid, 0) + 1
+            
+            if base is None or seq >= self.keyframe_interval:
+                if partial and base is not None:
+                    data = merge_state(base, data)
+                self._sent[sid] = copy.deepcopy(data)
+                self._seq[sid] = 0
+                return 'resource_update', data
+            
+            changed, removed = diff_state(base, data)
+            if partial:
+                removed = []
+            merge_state(base, changed)
+            for path in removed:
+                parent = base
+                for key in path[:-1]:
+                    parent = parent[key]
+                parent.pop(path[-1], None)
+            self._seq[sid] = seq
+        
+        return 'resource_delta', {
+            'seq': seq,
+            'changed': changed,
+            'removed': removed
+        }
+    
+    def reset(self, sid):
+        """Forget what a client has so its next update is a keyframe"""
+        with self._lock:
+            self._sent.pop(sid, None)
+            self._seq.pop(sid, None)
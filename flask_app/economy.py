@@ -0,0 +1,207 @@
+import threading
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Faction materials, in column order of the materials array
+FACTIONS = ('blue', 'red', 'green')
+
+# Timestamps are kept as integer microseconds since this epoch so elapsed
+# time converts to seconds exactly like timedelta.total_seconds()
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+# Marks a user with no last_updated timestamp yet
+NO_TIMESTAMP = -1
+
+def to_microseconds(timestamp):
+    """Convert an ISO timestamp from game_data to microseconds since EPOCH"""
+    if not timestamp:
+        return NO_TIMESTAMP
+    try:
+        return (datetime.fromisoformat(timestamp) - EPOCH) // MICROSECOND
+    except (ValueError, TypeError):
+        return NO_TIMESTAMP
+
+def from_microseconds(microseconds):
+    """Convert microseconds since EPOCH back to a game_data ISO timestamp"""
+    return (EPOCH + timedelta(microseconds=int(microseconds))).isoformat()
+
+class EconomyEngine:
+    """
+    Vectorized resource accrual for all online users
+    
+    Facility counts, balances and timestamps live in struct-of-arrays NumPy
+    buffers, one row per user, so a tick advances every due user in a
+    single vectorized step. The arithmetic mirrors accrue_resources() in
+    the same operation order, giving bit-identical results. Balances are
+    only written back to game_data when export() is called on flush.
+    """
+    
+    def __init__(self, capacity=1024):
+        if np is None:
+            raise RuntimeError("NumPy is required for the vectorized economy engine")
+        
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._user_ids = []
+        self._size = 0
+        self._allocate(capacity)
+    
+    def __len__(self):
+        return self._size
+    
+    def __contains__(self, user_id):
+        return user_id in self._rows
+    
+    def _allocate(self, capacity):
+        """Grow every buffer to hold at least capacity users"""
+        def grow(old, shape, dtype, fill=0):
+            new = np.full(shape, fill, dtype=dtype)
+            if old is not None:
+                new[:self._size] = old[:self._size]
+            return new
+        
+        current = getattr(self, 'capacity', None)
+        self.mining = grow(current and self.mining, capacity, np.float64)
+        self.research = grow(current and self.research, capacity, np.float64)
+        self.colony = grow(current and self.colony, capacity, np.float64)
+        self.faction = grow(current and self.faction, capacity, np.int8, -1)
+        self.resources = grow(current and self.resources, capacity, np.float64)
+        self.research_points = grow(current and self.research_points, capacity, np.float64)
+        self.population = grow(current and self.population, capacity, np.float64)
+        self.materials = grow(current and self.materials, (capacity, len(FACTIONS)), np.float64)
+        self.last_updated = grow(current and self.last_updated, capacity, np.int64, NO_TIMESTAMP)
+        self.capacity = capacity
+    
+    def load(self, user_id, faction, data):
+        """
+        Load (or reload) a user's row from parsed game_data
+        
+        Call this whenever facilities or balances change outside the engine,
+        e.g. after a save, so the next step starts from the stored state.
+        """
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is None:
+                if self._size == self.capacity:
+                    self._allocate(self.capacity * 2)
+                row = self._size
+                self._rows[user_id] = row
+                self._user_ids.append(user_id)
+                self._size += 1
+            
+            # Sums are taken in Python exactly as the scalar path does
+            self.mining[row] = sum(data.get("mining_facilities", {}).values())
+            self.research[row] = sum(data.get("research_outposts", {}).values())
+            self.colony[row] = sum(data.get("colony_bases", {}).values())
+            self.faction[row] = FACTIONS.index(faction) if faction in FACTIONS else -1
+            self.resources[row] = data.get("resources", 0)
+            self.research_points[row] = data.get("research_points", 0)
+            self.population[row] = data.get("population", 0)
+            materials = data.get("materials", {})
+            self.materials[row] = [materials.get(name, 0) for name in FACTIONS]
+            self.last_updated[row] = to_microseconds(data.get("last_updated"))
+    
+    def remove(self, user_id):
+        """Drop a user's row, moving the last row into its place"""
+        with self._lock:
+            row = self._rows.pop(user_id, None)
+            if row is None:
+                return
+            
+            last = self._size - 1
+            if row != last:
+                moved_id = self._user_ids[last]
+                for buffer in (self.mining, self.research, self.colony, self.faction,
+                               self.resources, self.research_points, self.population,
+                               self.materials, self.last_updated):
+                    buffer[row] = buffer[last]
+                self._user_ids[row] = moved_id
+                self._rows[moved_id] = row
+            
+            self._user_ids.pop()
+            self._size -= 1
+    
+    def step(self, settings, now=None, user_ids=None):
+        """
+        Accrue production for loaded users up to now
+        
+        Args:
+            settings: GameSettings snapshot with the production rates
+            now: Time to accrue up to (defaults to the current UTC time)
+            user_ids: Users to advance (defaults to every loaded user)
+        
+        Returns:
+            List of user IDs that were advanced
+        """
+        now_us = ((now or datetime.utcnow()) - EPOCH) // MICROSECOND
+        
+        mining_rate = settings.facility_rates['resources']
+        research_rate = settings.facility_rates['research_points']
+        population_rate = settings.facility_rates['population']
+        material_rates = np.array([settings.faction_material_rates[name] for name in FACTIONS],
+                                  dtype=np.float64)
+        
+        with self._lock:
+            if user_ids is None:
+                rows = np.arange(self._size)
+                advanced = list(self._user_ids)
+            else:
+                advanced = [user_id for user_id in user_ids if user_id in self._rows]
+                rows = np.array([self._rows[user_id] for user_id in advanced], dtype=np.intp)
+            
+            if not len(rows):
+                return advanced
+            
+            # Users without a timestamp only get one, like the first scalar update
+            last = self.last_updated[rows]
+            accrue = rows[last != NO_TIMESTAMP]
+            
+            # Rates are per minute, so scale by elapsed time in minutes
+            seconds = (now_us - self.last_updated[accrue]) / 1e6
+            time_factor = seconds / 60.0
+            
+            mining = self.mining[accrue]
+            self.resources[accrue] += mining * mining_rate * time_factor
+            self.research_points[accrue] += self.research[accrue] * research_rate * time_factor
+            self.population[accrue] += self.colony[accrue] * population_rate * time_factor
+            
+            # Each faction produces their own special material
+            faction = self.faction[accrue]
+            has_faction = faction >= 0
+            faction_rows = accrue[has_faction]
+            faction_cols = faction[has_faction]
+            self.materials[faction_rows, faction_cols] += (
+                mining[has_faction] * material_rates[faction_cols] * time_factor[has_faction])
+            
+            self.last_updated[rows] = now_us
+        
+        return advanced
+    
+    def balances(self, user_id):
+        """Get the current balances for a user in game_data shape"""
+        with self._lock:
+            row = self._rows[user_id]
+            return {
+                "resources": float(self.resources[row]),
+                "research_points": float(self.research_points[row]),
+                "population": float(self.population[row]),
+                "materials": {name: float(self.materials[row, col]) for col, name in enumerate(FACTIONS)},
+                "last_updated": (from_microseconds(self.last_updated[row])
+                                 if self.last_updated[row] != NO_TIMESTAMP else None)
+            }
+    
+    def export(self, user_id, data):
+        """Write a user's balances and timestamp back into parsed game_data"""
+        balances = self.balances(user_id)
+        data["resources"] = balances["resources"]
+        data["research_points"] = balances["research_points"]
+        data["population"] = balances["population"]
+        data.setdefault("materials", {}).update(balances["materials"])
+        if balances["last_updated"] is not None:
+            data["last_updated"] = balances["last_updated"]
+        return data
@@ -0,0 +1,165 @@
+"""
+JSON Patch (RFC 6902) for incremental game saves
+
+Clients send the operations that turn the last state they saved into the
+current one instead of the whole game state. apply_patch() checks each
+operation and applies it to a parsed document in place, so callers that
+must not see a half-applied patch pass a copy.
+"""
+
+OPERATIONS = ('add', 'remove', 'replace', 'move', 'copy', 'test')
+
+# Largest patch accepted, in operations
+MAX_OPERATIONS = 10_000
+
+class PatchError(ValueError):
+    """A malformed patch document"""
+
+class PatchConflict(PatchError):
+    """A well-formed patch that doesn't apply to the document (missing path or failed test)"""
+
+def parse_pointer(pointer):
+    """
+    Split a JSON Pointer (RFC 6901) into unescaped reference tokens
+    
+    Raises:
+        PatchError: If the pointer is not a string starting with '/' (or empty)
+    """
+    if not isinstance(pointer, str):
+        raise PatchError("Paths must be strings")
+    if pointer == '':
+        return []
+    if not pointer.startswith('/'):
+        raise PatchError(f"Invalid path {pointer!r}")
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+
+def array_index(container, token, pointer, allow_end=False):
+    """Get the list index a reference token refers to"""
+    if token == '-' and allow_end:
+        return len(container)
+    if not (token.isascii() and token.isdigit()) or (token != '0' and token.startswith('0')):
+        raise PatchConflict(f"Invalid array index in {pointer!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise PatchConflict(f"Array index out of range in {pointer!r}")
+    return index
+
+def resolve(document, tokens, pointer):
+    """Get the value the given reference tokens point to"""
+    value = document
+    for token in tokens:
+        if isinstance(value, dict):
+            if token not in value:
+                raise PatchConflict(f"Path {pointer!r} does not exist")
+            value = value[token]
+        elif isinstance(value, list):
+            value = value[array_index(value, token, pointer)]
+        else:
+            raise PatchConflict(f"Path {pointer!r} does not exist")
+    return value
+
+def parent_of(document, pointer):
+    """Get the container holding the target of a pointer and the last reference token"""
+    tokens = parse_pointer(pointer)
+    if not tokens:
+        raise PatchError("Operations on the whole document are not supported")
+    parent = resolve(document, tokens[:-1], pointer)
+    if not isinstance(parent, (dict, list)):
+        raise PatchConflict(f"Path {pointer!r} does not exist")
+    return parent, tokens[-1]
+
+def add(document, pointer, value):
+    parent, token = parent_of(document, pointer)
+    if isinstance(parent, dict):
+        parent[token] = value
+    else:
+        parent.insert(array_index(parent, token, pointer, allow_end=True), value)
+
+def remove(document, pointer):
+    parent, token = parent_of(document, pointer)
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise PatchConflict(f"Path {pointer!r} does not exist")
+        return parent.pop(token)
+    return parent.pop(array_index(parent, token, pointer))
+
+def replace(document, pointer, value):
+    parent, token = parent_of(document, pointer)
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise PatchConflict(f"Path {pointer!r} does not exist")
+        parent[token] = value
+    else:
+        parent[array_index(parent, token, pointer)] = value
+
+def equal(a, b):
+    """Compare JSON values like RFC 6902 'test' (numbers by value, booleans apart from numbers)"""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(equal(a[key], b[key]) for key in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(equal(x, y) for x, y in zip(a, b))
+    if isinstance(a, (dict, list)) or isinstance(b, (dict, list)):
+        return False
+    return a == b
+
+def copy_value(value):
+    """Deep copy a parsed JSON value"""
+    if isinstance(value, dict):
+        return {key: copy_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_value(item) for item in value]
+    return value
+
+def apply_patch(document, patch):
+    """
+    Apply a JSON Patch to a parsed document in place
+    
+    Args:
+        document: Parsed JSON object to update
+        patch: List of operation objects
+    
+    Returns:
+        The updated document
+    
+    Raises:
+        PatchError: If the patch is malformed
+        PatchConflict: If a path doesn't exist or a 'test' operation fails
+    """
+    if not isinstance(patch, list):
+        raise PatchError("A patch must be a list of operations")
+    if len(patch) > MAX_OPERATIONS:
+        raise PatchError(f"A patch can have at most {MAX_OPERATIONS} operations")
+    
+    for operation in patch:
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+            raise PatchError(f"Invalid operation {operation!r}")
+        
+        op = operation['op']
+        path = operation.get('path')
+        if op in ('add', 'replace', 'test') and 'value' not in operation:
+            raise PatchError(f"'{op}' operations need a value")
+        if op in ('move', 'copy') and 'from' not in operation:
+            raise PatchError(f"'{op}' operations need a 'from' path")
+        
+        if op == 'add':
+            add(document, path, operation['value'])
+        elif op == 'remove':
+            remove(document, path)
+        elif op == 'replace':
+            replace(document, path, operation['value'])
+        elif op == 'move':
+            source = operation['from']
+            parse_pointer(path)
+            if parse_pointer(source) and path.startswith(source + '/'):
+                raise PatchError(f"Can't move {source!r} into one of its children")
+            add(document, path, remove(document, source))
+        elif op == 'copy':
+            source = operation['from']
+            add(document, path, copy_value(resolve(document, parse_pointer(source), source)))
+        else:
+            if not equal(resolve(document, parse_pointer(path), path), operation['value']):
+                raise PatchConflict(f"Test failed at {path!r}")
+    
+    return document
@@ -1,5 +1,14 @@
 from flask_app import db
+from flask import current_app
 from datetime import datetime
+from types import MappingProxyType
+import threading
+import time
+
+# Cached settings snapshot and when its version was last checked
+_snapshot = None
+_snapshot_checked_at = 0.0
+_snapshot_lock = threading.Lock()
 
 class GameSettings(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -69,4 +78,84 @@ class GameSettings(db.Model):
             settings = cls()
             db.session.add(settings)
             db.session.commit()
-        return settings
\ No newline at end of file
+        return settings
+    
+    @classmethod
+    def snapshot(cls):
+        """
+        Get a cached, read-only snapshot of the game settings
+        
+        The snapshot is rebuilt after bump() or when the settings row's
+        updated_at changes, which is checked at most every
+        SETTINGS_RECHECK_INTERVAL seconds so hot paths don't query the DB.
+        """
+        global _snapshot, _snapshot_checked_at
+        
+        now = time.monotonic()
+        snapshot = _snapshot
+        recheck_interval = current_app.config.get('SETTINGS_RECHECK_INTERVAL', 30)
+        if snapshot is not None and now - _snapshot_checked_at < recheck_interval:
+            return snapshot
+        
+        with _snapshot_lock:
+            # Another thread may have refreshed it while we waited
+            if _snapshot is not None and _snapshot is not snapshot:
+                return _snapshot
+            
+            # Cheap version check: only reload the row if it changed
+            if snapshot is not None:
+                updated_at = db.session.query(cls.updated_at).order_by(cls.id).limit(1).scalar()
+                if updated_at == snapshot.updated_at:
+                    _snapshot_checked_at = now
+                    return snapshot
+            
+            settings = cls.query.order_by(cls.id).first()
+            if not settings:
+                settings = cls.get_settings()
+            _snapshot = SettingsSnapshot.from_settings(settings)
+            _snapshot_checked_at = now
+            return _snapshot
+    
+    @classmethod
+    def bump(cls):
+        """Invalidate the cached snapshot after the settings were changed"""
+        global _snapshot
+        _snapshot = None
+
+
+class SettingsSnapshot:
+    """
+    Immutable copy of the game settings with precomputed lookup tables
+    
+    Exposes the same attributes as a GameSettings row plus:
+        facility_rates: resource, research and population rate per facility
+        faction_material_rates: faction -> material rate per mining facility
+    """
+    
+    def __init__(self, values):
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+        
+        # Rates with missing values treated as zero
+        object.__setattr__(self, 'facility_rates', MappingProxyType({
+            'resources': values.get('mining_rate') or 0,
+            'research_points': values.get('research_rate') or 0,
+            'population': values.get('population_rate') or 0
+        }))
+        object.__setattr__(self, 'faction_material_rates', MappingProxyType({
+            'blue': values.get('blue_material_rate') or 0,
+            'red': values.get('red_material_rate') or 0,
+            'green': values.get('green_material_rate') or 0
+        }))
+    
+    @classmethod
+    def from_settings(cls, settings):
+        """Build a snapshot from a GameSettings row"""
+        return cls({column.name: getattr(settings, column.name)
+                    for column in GameSettings.__table__.columns})
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("Game settings snapshots are read-only")
+    
+    def __delattr__(self, name):
+        raise AttributeError("Game settings snapshots are read-only")
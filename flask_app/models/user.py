@@ -1,14 +1,33 @@
-from flask_app import db, login_manager
+from flask_app import db, login_manager, codec, compression, passwords, schema, user_cache, worldgen
+from flask_app.models.world import stage_world_sync
+from flask import current_app
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
-import json
-import random
-import math
+from sqlalchemy import case, event, inspect, update, and_
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import make_transient_to_detached
 from datetime import datetime
 
+# Columns kept by the user loader cache; the rest (game data, counts, rates)
+# are loaded on first access, so they are never served from the cache
+IDENTITY_COLUMNS = ("id", "username", "email", "password_hash", "faction")
+
+CHANGED_USERS_KEY = "changed_user_ids"
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    """Get the logged in user, without a query while their identity columns are cached"""
+    user_id = int(user_id)
+    values = user_cache.cache.get(user_id) if user_cache.cache is not None else None
+    if values is None:
+        user = db.session.get(User, user_id)
+        if user is not None and user_cache.cache is not None:
+            user_cache.cache.put(user_id, {column: getattr(user, column) for column in IDENTITY_COLUMNS})
+        return user
+    
+    # Attach the cached columns to this session as a persistent user without a SELECT
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -19,55 +38,151 @@ class User(UserMixin, db.Model):
     # User faction (blue, red, green)
     faction = db.Column(db.String(10), nullable=False)
     
-    # Game data - we'll store this as JSON
+    # Game data - we'll store this as JSON, compressed if GAME_DATA_COMPRESSION is set,
+    # with planets stored as an overlay on the ones the game's seed generates
+    # (use read_game_data() and write_game_data() rather than the column)
     game_data = db.Column(db.Text, default="{}")
     
+    # Facility totals and per-minute production, kept in step with game_data
+    # so ticks and dashboards don't have to parse it
+    mining_facility_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    research_outpost_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    colony_base_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    resources_per_minute = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    research_per_minute = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    population_per_minute = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    material_per_minute = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    # The last_updated timestamp of the stored balances
+    last_accrual_at = db.Column(db.DateTime)
+    
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hasher.hash(password)
         
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return passwords.hasher.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """Whether the password hash was made with older hashing settings than the configured ones"""
+        return passwords.hasher.needs_rehash(self.password_hash)
+    
+    @hybrid_property
+    def has_game_data(self):
+        """Whether the user has started a game (works in queries too)"""
+        return bool(self.game_data) and self.game_data != "{}"
     
-    def initialize_game_data(self):
-        """Initialize a new user's game data with default values"""
-        num_planets = random.randint(5, 10)
+    @has_game_data.expression
+    def has_game_data(cls):
+        return and_(cls.game_data.isnot(None), cls.game_data != "{}")
+    
+    def game_data_text(self):
+        """Get game_data as plain JSON, decompressing it if needed"""
+        return compression.unpack(self.game_data) or "{}"
+    
+    def read_game_data(self):
+        """
+        Parse game_data, treating an empty column as an empty game
         
-        # Create a star
-        star = {
-            "id": "star_1",
-            "position": {
-                "x": 0,
-                "y": 0,
-                "z": 0
-            },
-            "data": {
-                "name": "Sol Prime",
-                "type": "Main Sequence",
-                "temperature": 5500,
-                "luminosity": 1.0
-            }
-        }
+        Data from an older schema is upgraded and written back for the
+        caller's next commit, so each user is only upgraded once.
+        """
+        data = worldgen.expand_world(codec.loads(self.game_data_text()))
+        if schema.upgrade_game_data(data):
+            self.write_game_data(data)
+        return data
+    
+    def write_game_data(self, data, balances_only=False):
+        """
+        Serialize data into game_data and keep the user's world rows in step
+        
+        Planets are stored as an overlay on the generated ones, the data is
+        compressed with the configured GAME_DATA_COMPRESSION method, and the
+        planet, facility, fleet and balance rows are rewritten when the
+        session commits.
+        
+        Args:
+            data: Parsed game data
+            balances_only: True if only balances changed (e.g. a resource tick)
+        
+        Returns:
+            The serialized game data (uncompressed)
+        """
+        raw = codec.dumps(worldgen.compact_world(data))
+        self.game_data = compression.pack(raw)
+        if not balances_only:
+            self.update_production(data)
+        self.last_accrual_at = parse_timestamp(data.get("last_updated"))
+        stage_world_sync(self.id, data, balances_only=balances_only)
+        return raw
+    
+    def update_production(self, data, settings=None):
+        """Refresh the facility count and production rate columns from parsed game_data"""
+        if settings is None:
+            from flask_app.models.game_settings import GameSettings
+            settings = GameSettings.snapshot()
+        
+        self.mining_facility_count = int(sum((data.get("mining_facilities") or {}).values()))
+        self.research_outpost_count = int(sum((data.get("research_outposts") or {}).values()))
+        self.colony_base_count = int(sum((data.get("colony_bases") or {}).values()))
         
+        rates = settings.facility_rates
+        self.resources_per_minute = self.mining_facility_count * rates["resources"]
+        self.research_per_minute = self.research_outpost_count * rates["research_points"]
+        self.population_per_minute = self.colony_base_count * rates["population"]
+        self.material_per_minute = self.mining_facility_count * settings.faction_material_rates.get(self.faction, 0)
+    
+    @classmethod
+    def update_production_rates(cls, settings):
+        """
+        Recompute every user's production rate columns after the rates changed
+        
+        One UPDATE from the facility count columns; the caller commits.
+        """
+        rates = settings.facility_rates
+        material_rate = case(
+            *[(cls.faction == faction, rate) for faction, rate in settings.faction_material_rates.items()],
+            else_=0
+        )
+        db.session.execute(
+            update(cls).values(
+                resources_per_minute=cls.mining_facility_count * rates["resources"],
+                research_per_minute=cls.research_outpost_count * rates["research_points"],
+                population_per_minute=cls.colony_base_count * rates["population"],
+                material_per_minute=cls.mining_facility_count * material_rate
+            ).execution_options(synchronize_session=False)
+        )
+    
+    def initialize_game_data(self, system=None):
+        """
+        Initialize a new user's game data with default values
+        
+        Args:
+            system: A pre-generated starting system from the world pool
+                    (generated here when not given)
+        """
         # Get game settings for initial values
         from flask_app.models.game_settings import GameSettings
-        settings = GameSettings.get_settings()
+        settings = GameSettings.snapshot()
+        
+        if system is None:
+            system = worldgen.starting_system(settings.min_planets, settings.max_planets)
         
         game_data = {
+            "schema_version": schema.CURRENT_VERSION,
             "resources": settings.initial_resources,
             "research_points": settings.initial_research_points,
             "population": settings.initial_population,
             "last_updated": None,
-            "num_planets": num_planets,
-            "planets": [],
-            "stars": [star],  # Add the star to the game data
-            "seed": str(random.random()),
+            "num_planets": system["num_planets"],
+            "planets": system["planets"],  # Generated from the seed, so only changes to them are stored
+            "stars": system["stars"],
+            "seed": system["seed"],
             "playerPosition": {
                 "x": 0,
                 "y": 100,
                 "z": 400
             },
-            "buildings": {},  # Map planet_id -> building data
-            "mining_facilities": {},  # Map planet_id -> mining facilities count
+            "buildings": system["buildings"],  # Map planet_id -> building data
+            "mining_facilities": system["mining_facilities"],  # Map planet_id -> mining facilities count
             "research_outposts": {},  # Map planet_id -> research outposts count
             "colony_bases": {},  # Map planet_id -> colony bases count
             "materials": {
@@ -82,38 +197,7 @@ class User(UserMixin, db.Model):
             }
         }
         
-        # Generate the planets
-        planet_types = ["Terrestrial", "Gas Giant", "Ice Giant", "Desert", "Ocean"]
-        
-        for i in range(num_planets):
-            planet_id = f"planet_{i}"
-            distance = 80 + i * 50 + random.randint(0, 20)
-            angle = random.random() * 6.28  # 2*PI
-            
-            planet_type = planet_types[random.randint(0, len(planet_types)-1)]
-            
-            planet = {
-                "id": planet_id,
-                "position": {
-                    "x": distance * math.cos(angle),
-                    "y": (random.random() - 0.5) * 20,  # slight y-axis variation
-                    "z": distance * math.sin(angle)
-                },
-                "data": {
-                    "name": f"Planet {i+1}",
-                    "type": planet_type,
-                    "resources": {
-                        "minerals": random.randint(20, 100),
-                        "energy": random.randint(20, 100),
-                        "water": random.randint(20, 100)
-                    }
-                }
-            }
-            game_data["planets"].append(planet)
-            game_data["buildings"][planet_id] = []
-            game_data["mining_facilities"][planet_id] = 0
-        
-        self.game_data = json.dumps(game_data)
+        self.write_game_data(game_data)
         return game_data
     
     def update_resources(self, force_update=True):
@@ -124,99 +208,204 @@ class User(UserMixin, db.Model):
             force_update: If True, always update resources regardless of time elapsed
                          If False, only update if at least 5 seconds have passed
         """
-        data = json.loads(self.game_data)
+        data = self.read_game_data()
+        self.apply_accrual(data, force_update=force_update)
         
-        # Get game settings
-        from flask_app.models.game_settings import GameSettings
-        settings = GameSettings.get_settings()
-        
-        # Set default values if any are missing
-        if "resources" not in data:
-            data["resources"] = 0
-            
-        if "research_points" not in data:
-            data["research_points"] = 0
-            
-        if "population" not in data:
-            data["population"] = 0
-            
-        if "materials" not in data:
-            data["materials"] = {"blue": 0, "red": 0, "green": 0}
-            
-        if "mining_facilities" not in data:
-            data["mining_facilities"] = {}
-            
-        if "research_outposts" not in data:
-            data["research_outposts"] = {}
-            
-        if "colony_bases" not in data:
-            data["colony_bases"] = {}
-            
-        # Calculate time since last update to prevent duplicate resource generation
-        now = datetime.utcnow()
-        last_update_time = None
-        
-        # Check if we have a last_updated timestamp
-        if 'last_updated' in data and data['last_updated']:
-            try:
-                last_update_time = datetime.fromisoformat(data['last_updated'])
-            except (ValueError, TypeError):
-                # If invalid timestamp format, use None to indicate first update
-                last_update_time = None
-        
-        # If first update or missing timestamp, set resources but don't calculate increase
-        if last_update_time is None:
-            data['last_updated'] = now.isoformat()
-            self.game_data = json.dumps(data)
-            return data
-        
-        # Calculate seconds since last update
-        seconds_since_update = (now - last_update_time).total_seconds()
-        
-        # Only generate resources if forced or if at least 5 seconds have passed
-        if force_update or seconds_since_update >= 5:
-            # Calculate facility production
-            total_mining_facilities = sum(data["mining_facilities"].values())
-            total_research_outposts = sum(data["research_outposts"].values()) if "research_outposts" in data else 0
-            total_colony_bases = sum(data["colony_bases"].values()) if "colony_bases" in data else 0
-            
-            # Ensure rates are not None
-            mining_rate = settings.mining_rate or 0
-            research_rate = settings.research_rate or 0
-            population_rate = settings.population_rate or 0
-            blue_rate = settings.blue_material_rate or 0
-            red_rate = settings.red_material_rate or 0
-            green_rate = settings.green_material_rate or 0
-            
-            # Adjust resource gain based on time elapsed (scaled to minutes)
-            # Rates are per minute, so scale by elapsed time in minutes
-            time_factor = seconds_since_update / 60.0
-            
-            # Calculate gains
-            resource_gain = total_mining_facilities * mining_rate * time_factor
-            research_gain = total_research_outposts * research_rate * time_factor
-            population_gain = total_colony_bases * population_rate * time_factor
-            
-            # Add resources
-            data["resources"] += resource_gain
-            data["research_points"] += research_gain
-            data["population"] += population_gain
-            
-            # Update faction materials
-            # Each faction produces their special material at higher rates
-            if self.faction == "blue":
-                data["materials"]["blue"] += total_mining_facilities * blue_rate * time_factor
-            elif self.faction == "red":
-                data["materials"]["red"] += total_mining_facilities * red_rate * time_factor
-            elif self.faction == "green":
-                data["materials"]["green"] += total_mining_facilities * green_rate * time_factor
-            
-            # Update timestamp
-            data['last_updated'] = now.isoformat()
-            
-            # Log the resource update
+        # Save updated data
+        self.write_game_data(data, balances_only=True)
+        return data
+    
+    def refresh_resources(self):
+        """
+        Get current resources for display
+        
+        In the 'lazy' accrual mode resources are computed on read and nothing
+        is written; in the default 'tick' mode they are accrued into game_data.
+        """
+        if current_app.config.get('RESOURCE_ACCRUAL_MODE') == 'lazy':
+            return self.project_resources()
+        return self.update_resources()
+    
+    def project_resources(self, now=None):
+        """
+        Compute current resources on read without writing game_data
+        
+        The stored balances and last_updated timestamp stay untouched; the
+        production since last_updated is added in closed form so callers
+        can show live numbers without persisting every tick.
+        """
+        data = self.read_game_data()
+        settle_resources(data, self.faction, now=now)
+        return data
+    
+    def apply_accrual(self, data, now=None, force_update=True, log=True):
+        """
+        Accrue production into a parsed game_data dict in place
+        
+        Args:
+            data: Parsed game data to update
+            now: Time to accrue up to (defaults to the current UTC time)
+            force_update: If True, always update resources regardless of time elapsed
+                         If False, only update if at least 5 seconds have passed
+            log: Whether to print the resource gains
+        """
+        result = settle_resources(data, self.faction, now=now, force_update=force_update)
+        
+        # Log the resource update
+        if log and result:
+            (resource_gain, research_gain, population_gain), seconds_since_update = result
             print(f"Updated for {self.username}: +{resource_gain:.2f} resources, +{research_gain:.2f} research, +{population_gain:.2f} population (over {seconds_since_update:.2f} seconds)")
         
-        # Save updated data
-        self.game_data = json.dumps(data)
-        return data
\ No newline at end of file
+        return data
+
+
+def parse_timestamp(timestamp):
+    """Parse a game_data ISO timestamp, or None if it is missing or invalid"""
+    if not timestamp:
+        return None
+    try:
+        return datetime.fromisoformat(timestamp)
+    except (ValueError, TypeError):
+        return None
+
+
+def settle_resources(data, faction, now=None, force_update=True):
+    """
+    Accrue production since last_updated into a parsed game_data dict in place
+    
+    Args:
+        data: Parsed game data to update
+        faction: Faction of the player owning the data
+        now: Time to accrue up to (defaults to the current UTC time)
+        force_update: If True, always update resources regardless of time elapsed
+                     If False, only update if at least 5 seconds have passed
+    
+    Returns:
+        Tuple of ((resource_gain, research_gain, population_gain), seconds) or
+        None if nothing was accrued
+    """
+    # Get game settings
+    from flask_app.models.game_settings import GameSettings
+    settings = GameSettings.snapshot()
+    
+    # Users without a game (e.g. after an admin reset) have nothing to accrue;
+    # everything else has the current schema, so all balances are present
+    if not data:
+        return None
+    
+    # Calculate time since last update to prevent duplicate resource generation
+    now = now or datetime.utcnow()
+    
+    # Check if we have a last_updated timestamp (None on a first update or
+    # an invalid timestamp format)
+    last_update_time = parse_timestamp(data.get('last_updated'))
+    
+    # If first update or missing timestamp, set resources but don't calculate increase
+    if last_update_time is None:
+        data['last_updated'] = now.isoformat()
+        return None
+    
+    # Calculate seconds since last update
+    seconds_since_update = (now - last_update_time).total_seconds()
+    
+    # Only generate resources if forced or if at least 5 seconds have passed
+    if not (force_update or seconds_since_update >= 5):
+        return None
+    
+    gains = accrue_resources(data, faction, settings, seconds_since_update)
+    
+    # Update timestamp
+    data['last_updated'] = now.isoformat()
+    return gains, seconds_since_update
+
+
+def project_game_data(data, faction, now=None):
+    """
+    Get a copy of game_data with resources accrued up to now
+    
+    Only the balance fields are copied, so the original dict (and its
+    planets, buildings, etc.) is shared rather than duplicated.
+    """
+    projected = dict(data)
+    if data:
+        projected["materials"] = dict(data["materials"])
+    settle_resources(projected, faction, now=now)
+    return projected
+
+
+def production_rates(data, faction, settings):
+    """
+    Get per-minute production for a parsed game_data dict
+    
+    Returns:
+        Tuple of (resources, research_points, population, faction material) per minute
+    """
+    # Calculate facility production
+    total_mining_facilities = sum(data["mining_facilities"].values())
+    total_research_outposts = sum(data["research_outposts"].values())
+    total_colony_bases = sum(data["colony_bases"].values())
+    
+    # Each faction produces their special material at higher rates
+    rates = settings.facility_rates
+    return (
+        total_mining_facilities * rates["resources"],
+        total_research_outposts * rates["research_points"],
+        total_colony_bases * rates["population"],
+        total_mining_facilities * settings.faction_material_rates.get(faction, 0)
+    )
+
+
+def accrue_resources(data, faction, settings, seconds):
+    """
+    Add the production over a period to the balances in game_data
+    
+    Production is linear in elapsed time and facility counts, so the
+    balances at any time are the stored balances plus rate * time.
+    
+    Returns:
+        Tuple of (resource_gain, research_gain, population_gain)
+    """
+    resource_rate, research_rate, population_rate, material_rate = production_rates(data, faction, settings)
+    
+    # Adjust resource gain based on time elapsed (scaled to minutes)
+    # Rates are per minute, so scale by elapsed time in minutes
+    time_factor = seconds / 60.0
+    
+    # Calculate gains
+    resource_gain = resource_rate * time_factor
+    research_gain = research_rate * time_factor
+    population_gain = population_rate * time_factor
+    
+    # Add resources
+    data["resources"] += resource_gain
+    data["research_points"] += research_gain
+    data["population"] += population_gain
+    
+    # Update faction materials
+    if faction in ("blue", "red", "green"):
+        data["materials"][faction] += material_rate * time_factor
+    
+    return resource_gain, research_gain, population_gain
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    # Only deletes and changes to cached columns matter (saves and resets only touch game columns)
+    changed = {obj.id for obj in session.deleted if isinstance(obj, User)}
+    changed.update(obj.id for obj in session.dirty if isinstance(obj, User) and any(
+        inspect(obj).attrs[column].history.has_changes() for column in IDENTITY_COLUMNS))
+    if changed:
+        session.info.setdefault(CHANGED_USERS_KEY, set()).update(changed)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_changed_users(session):
+    # Changed or deleted users are dropped from the loader cache once the change is visible
+    changed = session.info.pop(CHANGED_USERS_KEY, None)
+    if changed and user_cache.cache is not None:
+        user_cache.cache.invalidate(changed)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop(CHANGED_USERS_KEY, None)
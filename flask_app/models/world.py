@@ -0,0 +1,304 @@
+from flask_app import db, codec
+from sqlalchemy import event, delete, func
+
+# Facility maps in game_data and the kind their rows are stored under
+FACILITY_KINDS = {
+    "mining_facilities": "mining",
+    "research_outposts": "research",
+    "colony_bases": "colony"
+}
+FACILITY_KEYS = {kind: key for key, kind in FACILITY_KINDS.items()}
+
+# Faction materials kept as balance columns
+MATERIALS = ("blue", "red", "green")
+
+# Key in session.info for world rows waiting to be written on commit
+PENDING_KEY = "world_sync"
+
+class Planet(db.Model):
+    """A planet in a player's system, mirrored from their game_data"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    
+    # Planet ID used as the key of the facility maps (e.g. planet_0)
+    planet_key = db.Column(db.String(64), nullable=False)
+    # Index in the game_data planets list
+    position = db.Column(db.Integer, nullable=False, default=0)
+    
+    name = db.Column(db.String(64))
+    planet_type = db.Column(db.String(32), index=True)
+    x = db.Column(db.Float)
+    y = db.Column(db.Float)
+    z = db.Column(db.Float)
+    minerals = db.Column(db.Float)
+    energy = db.Column(db.Float)
+    water = db.Column(db.Float)
+    
+    # Any other planet fields (orbit, seed, radius, ...) as JSON
+    extra = db.Column(db.Text)
+    
+    __table_args__ = (db.Index('ix_planet_user_key', 'user_id', 'planet_key'),)
+
+class Facility(db.Model):
+    """Number of facilities of one kind on one of a player's planets"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    planet_key = db.Column(db.String(64), nullable=False)
+    kind = db.Column(db.String(16), nullable=False)  # mining, research or colony
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (db.Index('ix_facility_kind_user', 'kind', 'user_id'),)
+
+class Fleet(db.Model):
+    """A player's ship counts"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    fighters = db.Column(db.Integer, nullable=False, default=0)
+    capital_ships = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {"fighters": self.fighters, "capital_ships": self.capital_ships}
+
+class Balance(db.Model):
+    """A player's stored resource balances as of last_updated"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    resources = db.Column(db.Float, nullable=False, default=0, index=True)
+    research_points = db.Column(db.Float, nullable=False, default=0)
+    population = db.Column(db.Float, nullable=False, default=0)
+    blue = db.Column(db.Float, nullable=False, default=0)
+    red = db.Column(db.Float, nullable=False, default=0)
+    green = db.Column(db.Float, nullable=False, default=0)
+    last_updated = db.Column(db.String(32))
+
+
+def _number(value, cast=float):
+    """Coerce a client-supplied count or balance, treating junk as zero"""
+    try:
+        return cast(value or 0)
+    except (TypeError, ValueError):
+        return cast(0)
+
+
+def planet_row(user_id, index, planet):
+    """
+    Split a game_data planet into Planet columns
+    
+    Fields with a column of their own are taken out of the planet and the
+    rest is kept in extra, so planet_json() can put the planet back together.
+    """
+    extra = dict(planet)
+    row = {
+        "user_id": user_id,
+        "planet_key": str(planet.get("id") or f"planet_{index}"),
+        "position": index
+    }
+    
+    position = extra.get("position")
+    if isinstance(position, dict) and set(position) == {"x", "y", "z"}:
+        del extra["position"]
+        row.update(x=_number(position["x"]), y=_number(position["y"]), z=_number(position["z"]))
+    
+    info = extra.get("data")
+    if isinstance(info, dict):
+        info = extra["data"] = dict(info)
+        if isinstance(info.get("name"), str):
+            row["name"] = info.pop("name")[:64]
+        if isinstance(info.get("type"), str):
+            row["planet_type"] = info.pop("type")[:32]
+        deposits = info.get("resources")
+        if isinstance(deposits, dict) and set(deposits) == {"minerals", "energy", "water"}:
+            del info["resources"]
+            row.update(minerals=_number(deposits["minerals"]), energy=_number(deposits["energy"]),
+                       water=_number(deposits["water"]))
+    
+    row["extra"] = codec.dumps(extra)
+    return row
+
+
+def planet_json(planet):
+    """Rebuild a game_data planet from its Planet row"""
+    data = codec.loads(planet.extra) if planet.extra else {}
+    if planet.x is not None:
+        data["position"] = {"x": planet.x, "y": planet.y, "z": planet.z}
+    if planet.name is not None or planet.planet_type is not None or planet.minerals is not None:
+        info = data.setdefault("data", {})
+        if planet.name is not None:
+            info["name"] = planet.name
+        if planet.planet_type is not None:
+            info["type"] = planet.planet_type
+        if planet.minerals is not None:
+            info["resources"] = {"minerals": planet.minerals, "energy": planet.energy, "water": planet.water}
+    return data
+
+
+def balance_row(user_id, data):
+    """Get Balance columns from parsed game_data"""
+    materials = data.get("materials") or {}
+    row = {
+        "user_id": user_id,
+        "resources": _number(data.get("resources")),
+        "research_points": _number(data.get("research_points")),
+        "population": _number(data.get("population")),
+        "last_updated": data.get("last_updated")
+    }
+    for name in MATERIALS:
+        row[name] = _number(materials.get(name))
+    return row
+
+
+def world_rows(user_id, data):
+    """
+    Get every world row for a user from parsed game_data
+    
+    Returns:
+        Tuple of (planets, facilities, fleet, balance) row mappings
+    """
+    planets = [planet_row(user_id, index, planet)
+               for index, planet in enumerate(data.get("planets") or [])
+               if isinstance(planet, dict)]
+    
+    facilities = []
+    for key, kind in FACILITY_KINDS.items():
+        for planet_key, count in (data.get(key) or {}).items():
+            facilities.append({
+                "user_id": user_id,
+                "planet_key": str(planet_key),
+                "kind": kind,
+                "count": _number(count, int)
+            })
+    
+    ships = data.get("ships") or {}
+    fleet = {
+        "user_id": user_id,
+        "fighters": _number(ships.get("fighters"), int),
+        "capital_ships": _number(ships.get("capital_ships"), int)
+    }
+    
+    return planets, facilities, fleet, balance_row(user_id, data)
+
+
+def stage_world_sync(user_id, data, balances_only=False):
+    """
+    Queue a user's world rows to be rewritten from game_data on commit
+    
+    Args:
+        user_id: User the data belongs to
+        data: Parsed game data (an empty dict removes the user's rows)
+        balances_only: True if only balances changed, e.g. on a resource tick,
+                       so just the Balance row is updated
+    """
+    pending = db.session.info.setdefault(PENDING_KEY, {})
+    previous = pending.get(user_id)
+    full = not balances_only or (previous is not None and previous[1])
+    pending[user_id] = (data, full)
+
+
+def write_world(session, pending):
+    """
+    Write staged world rows
+    
+    Users with structural changes have their rows deleted and reinserted
+    in bulk; balance-only changes are one bulk UPDATE by primary key.
+    """
+    full = [user_id for user_id, (data, is_full) in pending.items() if is_full]
+    balances = [balance_row(user_id, data) for user_id, (data, is_full) in pending.items()
+                if not is_full and data]
+    
+    if full:
+        for model in (Planet, Facility, Fleet, Balance):
+            session.execute(delete(model).where(model.user_id.in_(full)))
+        
+        planets, facilities, fleets, new_balances = [], [], [], []
+        for user_id in full:
+            data = pending[user_id][0]
+            if not data:
+                continue
+            user_planets, user_facilities, fleet, balance = world_rows(user_id, data)
+            planets.extend(user_planets)
+            facilities.extend(user_facilities)
+            fleets.append(fleet)
+            new_balances.append(balance)
+        
+        for model, rows in ((Planet, planets), (Facility, facilities),
+                            (Fleet, fleets), (Balance, new_balances)):
+            if rows:
+                session.bulk_insert_mappings(model, rows)
+    
+    if balances:
+        session.bulk_update_mappings(Balance, balances)
+
+
+@event.listens_for(db.session, 'before_commit')
+def _write_pending_world(session):
+    pending = session.info.pop(PENDING_KEY, None)
+    if pending:
+        write_world(session, pending)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_pending_world(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+def world_game_data(user_id, base=None):
+    """
+    Build the client's game_data shape from a user's world rows
+    
+    Args:
+        user_id: User to build the game data for
+        base: Parsed game data supplying every key without a table
+              (stars, buildings, orbital_structures, ...)
+    """
+    data = dict(base or {})
+    
+    planets = Planet.query.filter_by(user_id=user_id).order_by(Planet.position).all()
+    data["planets"] = [planet_json(planet) for planet in planets]
+    
+    for key in FACILITY_KINDS:
+        data[key] = {}
+    for facility in Facility.query.filter_by(user_id=user_id).all():
+        data[FACILITY_KEYS[facility.kind]][facility.planet_key] = facility.count
+    
+    fleet = db.session.get(Fleet, user_id)
+    if fleet is not None:
+        data["ships"] = fleet.to_dict()
+    
+    balance = db.session.get(Balance, user_id)
+    if balance is not None:
+        data["resources"] = balance.resources
+        data["research_points"] = balance.research_points
+        data["population"] = balance.population
+        data["materials"] = {name: getattr(balance, name) for name in MATERIALS}
+        data["last_updated"] = balance.last_updated
+    
+    return data
+
+
+def fleets(user_ids):
+    """Get ship counts for users with a Fleet row, keyed by user ID"""
+    rows = Fleet.query.filter(Fleet.user_id.in_(list(user_ids))).all()
+    return {fleet.user_id: fleet.to_dict() for fleet in rows}
+
+
+def planet_count():
+    """Get the number of planets across all players"""
+    return db.session.query(func.count(Planet.id)).scalar() or 0
+
+
+def leaderboard(limit=10):
+    """
+    Get the players with the most stored resources
+    
+    Returns:
+        List of (user, balance, planet count) tuples
+    """
+    from flask_app.models.user import User
+    
+    planets = (db.session.query(func.count(Planet.id))
+               .filter(Planet.user_id == User.id)
+               .correlate(User).scalar_subquery())
+    
+    return (db.session.query(User, Balance, planets)
+            .join(Balance, Balance.user_id == User.id)
+            .order_by(Balance.resources.desc())
+            .limit(limit)
+            .all())
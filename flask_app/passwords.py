@@ -0,0 +1,148 @@
+"""
+Password hashing off the request workers
+
+Hashing a password is deliberately slow, and the request workers also
+serve Socket.IO traffic, so a burst of logins or registrations hashed
+inline stalls real-time game events. Hashes are computed by a small,
+bounded set of OS threads instead (hashlib releases the GIL while it
+works); callers wait for the result, but only the calling request does.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# werkzeug's own default, so existing hashes aren't all rehashed on upgrade
+DEFAULT_METHOD = 'pbkdf2:sha256:260000'
+
+class HasherBusy(Exception):
+    """Raised when more hashes are waiting than the hasher's queue allows"""
+
+class PasswordHasher:
+    """
+    Bounded password hashing pool
+    
+    At most `workers` hashes run at once and at most `max_queue` more wait
+    for a worker; beyond that HasherBusy is raised so a login flood is
+    turned away instead of queueing without limit.
+    """
+    
+    def __init__(self, method=DEFAULT_METHOD, salt_length=16, workers=2, max_queue=64, run=None):
+        """
+        Args:
+            method: werkzeug hash method, e.g. 'pbkdf2:sha256:600000'
+            salt_length: Salt characters per hash
+            workers: Hashes computed at the same time
+            max_queue: Hashes that can wait for a worker
+            run: Function that runs func(*args) on an OS thread and returns its
+                 result (defaults to a thread pool; green thread servers pass
+                 their own so the hub isn't blocked)
+        """
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = workers
+        self.max_queue = max_queue
+        self._run = run or self._run_in_pool
+        self._executor = None
+        self._lock = threading.Lock()
+        self._method_prefix = None
+        
+        # Hashes running or waiting, and counters for server stats
+        self.queued = 0
+        self.peak_queued = 0
+        self.hashed = 0
+        self.verified = 0
+        self.outdated = 0
+        self.rejected = 0
+    
+    def _run_in_pool(self, func, *args):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix='password-hash')
+        return self._executor.submit(func, *args).result()
+    
+    def _call(self, func, *args):
+        with self._lock:
+            if self.queued >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HasherBusy("Too many passwords waiting to be hashed")
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+        try:
+            return self._run(func, *args)
+        finally:
+            with self._lock:
+                self.queued -= 1
+    
+    def hash(self, password):
+        """Hash a password with the configured method"""
+        password_hash = self._call(generate_password_hash, password, self.method, self.salt_length)
+        with self._lock:
+            self.hashed += 1
+        return password_hash
+    
+    def verify(self, password_hash, password):
+        """Check a password against a stored hash (False if there is no hash)"""
+        if not password_hash or password is None:
+            return False
+        matches = self._call(check_password_hash, password_hash, password)
+        with self._lock:
+            self.verified += 1
+        return matches
+    
+    def needs_rehash(self, password_hash):
+        """Check whether a stored hash was made with other settings than the configured ones"""
+        if self._method_prefix is None:
+            # werkzeug fills in defaults (e.g. the iteration count), so hash once to see the full method
+            self._method_prefix = self._call(generate_password_hash, '', self.method, 1).split('$', 1)[0]
+        if password_hash.split('$', 1)[0] == self._method_prefix:
+            return False
+        with self._lock:
+            self.outdated += 1
+        return True
+    
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+    
+    def stats(self):
+        """Get the queue depth and hashing counters"""
+        with self._lock:
+            return {
+                'method': self.method,
+                'workers': self.workers,
+                'queued': self.queued,
+                'peak_queued': self.peak_queued,
+                'hashed': self.hashed,
+                'verified': self.verified,
+                'outdated': self.outdated,
+                'rejected': self.rejected
+            }
+
+# Hasher used by the User model, replaced by init_app() with the configured one
+hasher = PasswordHasher()
+
+def os_thread_runner(async_mode, workers):
+    """Get a function that runs blocking calls on OS threads under a green thread server, or None"""
+    if async_mode == 'eventlet':
+        from eventlet import tpool
+        tpool.set_num_threads(workers)
+        return tpool.execute
+    if async_mode == 'gevent':
+        from gevent.threadpool import ThreadPool
+        pool = ThreadPool(workers)
+        return lambda func, *args: pool.apply(func, args)
+    return None
+
+def init_app(app, async_mode='threading'):
+    """Create the password hasher from app config"""
+    global hasher
+    workers = app.config.get('PASSWORD_HASH_WORKERS', 2)
+    hasher.shutdown()
+    hasher = PasswordHasher(method=app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+                            workers=workers,
+                            max_queue=app.config.get('PASSWORD_HASH_QUEUE', 64),
+                            run=os_thread_runner(async_mode, workers))
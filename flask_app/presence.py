@@ -0,0 +1,176 @@
+import itertools
+import secrets
+import threading
+from collections import deque
+
+class Presence:
+    """
+    Registry of online players, indexed for roster requests
+    
+    Each online user has one current connection (their latest sid) and the
+    username and faction captured when they connected. A reverse sid index
+    lets a disconnect tell whether it closed the user's current connection,
+    and per-faction sets (dicts kept in connection order) let rosters be
+    paged and filtered from memory without querying users.
+    
+    Every join and leave bumps the roster version and is kept in a bounded
+    log of deltas, so a client that saw an earlier version only needs what
+    it missed. The epoch changes when the registry is recreated (a server
+    restart), telling clients that their versions no longer apply.
+    
+    Lookups by user ID give the sid, so it can stand in for the plain
+    user_id -> sid dict it replaces.
+    """
+    
+    def __init__(self, log_size=1000):
+        """
+        Args:
+            log_size: Most recent roster deltas kept for clients catching up
+        """
+        # user_id -> (sid, player), in connection order
+        self._users = {}
+        # sid -> user_id
+        self._sids = {}
+        # faction -> {user_id: None}, in connection order
+        self._factions = {}
+        self._lock = threading.Lock()
+        
+        self.epoch = secrets.token_hex(4)
+        self.version = 0
+        # Deltas for the most recent versions, oldest first
+        self._log = deque(maxlen=log_size)
+    
+    def __len__(self):
+        return len(self._users)
+    
+    def __contains__(self, user_id):
+        return user_id in self._users
+    
+    def __getitem__(self, user_id):
+        return self._users[user_id][0]
+    
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._users))
+    
+    def get(self, user_id, default=None):
+        """Get a user's current sid"""
+        entry = self._users.get(user_id)
+        return entry[0] if entry is not None else default
+    
+    def player(self, user_id):
+        """Get an online user's roster entry (id, username, faction), or None"""
+        entry = self._users.get(user_id)
+        return entry[1] if entry is not None else None
+    
+    def user_id(self, sid):
+        """Get the user a connection belongs to, or None"""
+        return self._sids.get(sid)
+    
+    def _record(self, op, player):
+        self.version += 1
+        delta = {'version': self.version, 'op': op, 'player': player}
+        self._log.append(delta)
+        return delta
+    
+    def connect(self, user_id, sid, username, faction):
+        """
+        Register a user's new connection, replacing any earlier one
+        
+        A user reconnecting under the same name and faction keeps their
+        place in connection order (clients get no delta that would move
+        them); a changed name or faction rejoins at the end.
+        
+        Returns:
+            The 'join' delta to broadcast, or None if the user was already
+            online under the same name and faction
+        """
+        player = {'id': user_id, 'username': username, 'faction': faction}
+        with self._lock:
+            self._sids[sid] = user_id
+            previous = self._users.get(user_id)
+            if previous is not None and previous[1] == player:
+                self._users[user_id] = (sid, player)
+                return None
+            if previous is not None:
+                del self._users[user_id]
+                self._factions.get(previous[1]['faction'], {}).pop(user_id, None)
+            self._users[user_id] = (sid, player)
+            self._factions.setdefault(faction, {})[user_id] = None
+            return self._record('join', player)
+    
+    def disconnect(self, sid):
+        """
+        Forget a closed connection
+        
+        Returns:
+            The 'leave' delta to broadcast, or None if the sid wasn't the
+            user's current connection (they reconnected since) or isn't known
+        """
+        with self._lock:
+            user_id = self._sids.pop(sid, None)
+            entry = self._users.get(user_id)
+            if entry is None or entry[0] != sid:
+                return None
+            del self._users[user_id]
+            self._factions.get(entry[1]['faction'], {}).pop(user_id, None)
+            return self._record('leave', {'id': user_id})
+    
+    def heartbeat(self, now=None):
+        """Nothing expires with a single process; see RedisPresence"""
+        return []
+    
+    def keep_alive(self, handler, start_task):
+        """Nothing to keep alive with a single process"""
+    
+    def sync(self, epoch=None, version=None):
+        """
+        Get what a client needs to catch up with the roster
+        
+        Args:
+            epoch: Epoch the client's version belongs to
+            version: Last version the client applied
+        
+        Returns:
+            Dict of epoch, version and either 'deltas' (the ones the client
+            missed, oldest first) or 'players' (the full roster, when the
+            client has no version or one older than the log)
+        """
+        with self._lock:
+            result = {'epoch': self.epoch, 'version': self.version}
+            missed = self.version - version if epoch == self.epoch and isinstance(version, int) else -1
+            if 0 <= missed <= len(self._log):
+                result['deltas'] = list(itertools.islice(self._log, len(self._log) - missed, None))
+            else:
+                result['players'] = [player for sid, player in self._users.values()]
+            return result
+    
+    def roster(self, faction=None, offset=0, limit=100, exclude=None):
+        """
+        Get a page of online players in connection order
+        
+        Args:
+            faction: Only list this faction's players
+            offset: Players to skip
+            limit: Most players to return
+            exclude: User ID left out of the page and the total (the requester)
+        
+        Returns:
+            Tuple of (list of player dicts, total number of matching players)
+        """
+        with self._lock:
+            user_ids = self._users if faction is None else self._factions.get(faction, {})
+            total = len(user_ids) - (exclude in user_ids)
+            page = itertools.islice((user_id for user_id in user_ids if user_id != exclude),
+                                    offset, offset + limit)
+            return [self._users[user_id][1] for user_id in page], total
+    
+    def stats(self):
+        """Get the number of online players, overall and per faction"""
+        with self._lock:
+            return {
+                'online': len(self._users),
+                'version': self.version,
+                'connections': len(self._sids),
+                'factions': {faction: len(user_ids) for faction, user_ids in self._factions.items()}
+            }
@@ -1,10 +1,11 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
-from flask_app import db
+from flask_app import db, codec
 from flask_app.models.game_settings import GameSettings
 from flask_app.models.user import User
+from flask_app.models.world import Balance, leaderboard, planet_count
+from sqlalchemy import func
 import functools
-import json
 from datetime import datetime
 
 admin = Blueprint('admin', __name__, url_prefix='/admin')
@@ -26,64 +27,36 @@ def admin_required(f):
 def index():
     """Admin dashboard"""
     settings = GameSettings.get_settings()
-    users = User.query.all()
     
     # Calculate key metrics
-    user_count = len(users)
-    active_users = sum(1 for user in users if user.game_data and user.game_data != '{}')
+    user_count = User.query.count()
+    active_users = User.query.filter(User.has_game_data).count()
     
     # Total facilities and planets across all users
-    total_facilities = 0
-    total_planets = 0
+    total_facilities = db.session.query(func.coalesce(func.sum(User.mining_facility_count), 0)).scalar()
+    total_planets = planet_count()
     
-    # For the resource distribution chart
-    resource_labels = []
-    resource_data = []
+    # For the resource distribution chart (skipping admin)
+    chart_rows = (db.session.query(User.username, Balance.resources)
+                  .join(Balance, Balance.user_id == User.id)
+                  .filter(User.id != 1)
+                  .order_by(User.id)
+                  .all())
+    resource_labels = [username for username, _ in chart_rows]
+    resource_data = [resources for _, resources in chart_rows]
     
-    # Get data for recent users table
+    # Top 10 users by resources
     recent_users = []
-    
-    for user in users:
-        if user.game_data and user.game_data != '{}':
-            try:
-                game_data = json.loads(user.game_data)
-                
-                # Count facilities
-                mining_facilities = sum(planet.get('mining_facilities', 0) 
-                                       for planet in game_data.get('planets', []))
-                total_facilities += mining_facilities
-                
-                # Count planets
-                planets_count = len(game_data.get('planets', []))
-                total_planets += planets_count
-                
-                # Add to resource chart if not admin
-                if user.id != 1:  # Skip admin for chart
-                    resource_labels.append(user.username)
-                    resource_data.append(game_data.get('resources', 0))
-                
-                # Add to recent users list
-                status = 'Active'
-                status_class = 'success'
-                
-                recent_users.append({
-                    'username': user.username,
-                    'email': user.email,
-                    'resources': game_data.get('resources', 0),
-                    'planets': planets_count,
-                    'facilities': mining_facilities,
-                    'status': status,
-                    'status_class': status_class
-                })
-            except (json.JSONDecodeError, KeyError):
-                # Handle invalid JSON or missing keys
-                pass
-    
-    # Sort recent users by resources (descending)
-    recent_users.sort(key=lambda x: x['resources'], reverse=True)
-    
-    # Limit to top 10 users
-    recent_users = recent_users[:10]
+    for user, balance, planets_count in leaderboard(limit=10):
+        recent_users.append({
+            'username': user.username,
+            'email': user.email,
+            'resources': balance.resources,
+            'planets': planets_count,
+            'facilities': user.mining_facility_count,
+            'status': 'Active',
+            'status_class': 'success'
+        })
     
     return render_template('admin/index.html', 
                           settings=settings,
@@ -126,6 +99,11 @@ def settings():
         if 'research_facility_cost' in request.form:
             settings.research_facility_cost = int(request.form.get('research_facility_cost', 250))
         
+        db.session.commit()
+        GameSettings.bump()
+        
+        # Production rate columns depend on the rates that may have changed
+        User.update_production_rates(GameSettings.snapshot())
         db.session.commit()
         flash('Settings updated successfully')
         return redirect(url_for('admin.settings'))
@@ -183,9 +161,33 @@ def api_settings():
         if 'research_facility_cost' in data:
             settings.research_facility_cost = int(data['research_facility_cost'])
         
+        db.session.commit()
+        GameSettings.bump()
+        
+        # Production rate columns depend on the rates that may have changed
+        User.update_production_rates(GameSettings.snapshot())
         db.session.commit()
         return jsonify({'success': True})
 
+@admin.route('/api/server_stats')
+@login_required
+@admin_required
+def api_server_stats():
+    """API endpoint for real-time server statistics"""
+    from flask_app import passwords, socket_events, user_cache, world_pool
+    
+    return jsonify({
+        'active_users': len(socket_events.active_users),
+        'presence': socket_events.active_users.stats(),
+        'resource_tick': dict(socket_events.tick_stats),
+        'game_state_cache': socket_events.state_cache.stats() if socket_events.state_cache else None,
+        'saves': socket_events.save_coalescer.stats() if socket_events.save_coalescer else None,
+        'world_pool': world_pool.pool.stats() if world_pool.pool else None,
+        'password_hashing': passwords.hasher.stats(),
+        'user_cache': user_cache.cache.stats() if user_cache.cache else None,
+        'timers': socket_events.timers.stats()
+    })
+
 @admin.route('/users')
 @login_required
 @admin_required
@@ -194,7 +196,7 @@ def users():
     users = User.query.all()
     
     # Count active users and admin users
-    active_count = sum(1 for user in users if user.game_data and user.game_data != '{}')
+    active_count = sum(1 for user in users if user.has_game_data)
     admin_count = sum(1 for user in users if user.id == 1)  # Simplified admin check
     
     return render_template('admin/users.html', 
@@ -208,7 +210,12 @@ def users():
 def reset_user(user_id):
     """Reset a user's game data"""
     user = User.query.get_or_404(user_id)
-    user.game_data = "{}"
+    
+    # Drop any in-memory state for an online player first, so a flush
+    # before the commit can't write it back over the reset
+    from flask_app.socket_events import forget_game_state
+    forget_game_state(user.id)
+    user.write_game_data({})
     db.session.commit()
     flash(f'Game data reset for user {user.username}')
     return redirect(url_for('admin.users'))
@@ -221,9 +228,10 @@ def api_user_game_data(user_id):
     user = User.query.get_or_404(user_id)
     
     try:
-        game_data = json.loads(user.game_data) if user.game_data else {}
+        from flask_app.socket_events import load_game_state
+        game_data = load_game_state(user)
         return jsonify(game_data)
-    except json.JSONDecodeError:
+    except codec.JSONDecodeError:
         return jsonify({"error": "Invalid game data format"}), 400
 
 @admin.route('/api/reset_users', methods=['POST'])
@@ -239,10 +247,12 @@ def api_reset_users():
     user_ids = data['user_ids']
     reset_count = 0
     
+    from flask_app.socket_events import forget_game_state
     for user_id in user_ids:
         user = User.query.get(user_id)
         if user:
-            user.game_data = "{}"
+            user.write_game_data({})
+            forget_game_state(user.id)
             reset_count += 1
     
     db.session.commit()
@@ -264,6 +274,11 @@ def api_delete_user(user_id):
     user = User.query.get_or_404(user_id)
     username = user.username
     
+    from flask_app.socket_events import forget_game_state
+    forget_game_state(user_id)
+    
+    # Remove the user's world rows along with them
+    user.write_game_data({})
     db.session.delete(user)
     db.session.commit()
     
@@ -277,51 +292,25 @@ def api_delete_user(user_id):
 @admin_required
 def user_resources():
     """View to manage user resources"""
-    users = User.query.all()
+    rows = (db.session.query(User, Balance)
+            .outerjoin(Balance, Balance.user_id == User.id)
+            .order_by(User.id)
+            .all())
     
     # Process user data for display
     user_data = []
-    for user in users:
-        try:
-            # Parse game data if available
-            game_data = json.loads(user.game_data) if user.game_data else {}
-            
-            # Extract resource information
-            resources = game_data.get('resources', 0)
-            research_points = game_data.get('research_points', 0)
-            population = game_data.get('population', 0)
-            blue_material = game_data.get('materials', {}).get('blue', 0)
-            red_material = game_data.get('materials', {}).get('red', 0)
-            green_material = game_data.get('materials', {}).get('green', 0)
-            
-            # Create a user entry for display
-            user_entry = {
-                'id': user.id,
-                'username': user.username,
-                'faction': user.faction,
-                'resources': resources,
-                'research_points': research_points,
-                'population': population,
-                'blue_material': blue_material,
-                'red_material': red_material,
-                'green_material': green_material
-            }
-            
-            user_data.append(user_entry)
-            
-        except (json.JSONDecodeError, KeyError):
-            # Handle invalid JSON or missing keys
-            user_data.append({
-                'id': user.id,
-                'username': user.username,
-                'faction': user.faction,
-                'resources': 0,
-                'research_points': 0,
-                'population': 0,
-                'blue_material': 0,
-                'red_material': 0,
-                'green_material': 0
-            })
+    for user, balance in rows:
+        user_data.append({
+            'id': user.id,
+            'username': user.username,
+            'faction': user.faction,
+            'resources': balance.resources if balance else 0,
+            'research_points': balance.research_points if balance else 0,
+            'population': balance.population if balance else 0,
+            'blue_material': balance.blue if balance else 0,
+            'red_material': balance.red if balance else 0,
+            'green_material': balance.green if balance else 0
+        })
     
     return render_template('admin/user_resources.html', users=user_data)
 
@@ -337,8 +326,13 @@ def api_update_user_resources(user_id):
         return jsonify({"error": "No data provided"}), 400
     
     try:
-        # Parse current game data
-        game_data = json.loads(user.game_data) if user.game_data else {}
+        # Parse current game data (from memory if the player is online)
+        from flask_app.socket_events import load_game_state, store_game_state, sync_online_user
+        game_data = load_game_state(user)
+        
+        # Settle production up to now so new balances don't pick up past accrual
+        if game_data:
+            user.apply_accrual(game_data, log=False)
         
         # Update resources
         if 'resources' in data:
@@ -367,13 +361,16 @@ def api_update_user_resources(user_id):
             game_data['materials']['green'] = float(data['green_material'])
         
         # Save updated game data
-        user.game_data = json.dumps(game_data)
+        store_game_state(user, game_data, balances_only=True)
         db.session.commit()
         
+        # Make sure an online player's economy state picks up the new balances
+        sync_online_user(user, game_data)
+        
         return jsonify({
             "success": True,
             "message": f"Updated resources for user {user.username}"
         })
         
-    except (json.JSONDecodeError, ValueError) as e:
+    except (codec.JSONDecodeError, ValueError) as e:
         return jsonify({"error": f"Failed to update resources: {str(e)}"}), 400
\ No newline at end of file
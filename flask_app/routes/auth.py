@@ -1,10 +1,23 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
 from flask_app.models.user import User
+from flask_app.models.game_settings import GameSettings
+from flask_app.world_pool import claim_system
+from flask_app.passwords import HasherBusy
 from flask_app import db
 
 auth = Blueprint('auth', __name__)
 
+@auth.errorhandler(HasherBusy)
+def hasher_busy(error):
+    """Turn away logins and registrations while the password hashing queue is full"""
+    message = 'The server is busy. Please try again in a moment.'
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return jsonify({'success': False, 'message': message}), 503
+    flash(message)
+    template = 'register.html' if request.endpoint == 'auth.register' else 'login.html'
+    return render_template(template), 503
+
 @auth.route('/login', methods=['GET', 'POST'])
 def login():
     # Check if the request is AJAX
@@ -21,6 +34,11 @@ def login():
         
         user = User.query.filter_by(username=username).first()
         if user and user.check_password(password):
+            # Upgrade hashes made with older settings while the password is at hand
+            if user.password_needs_rehash():
+                user.set_password(password)
+                db.session.commit()
+            
             login_user(user)
             next_page = request.args.get('next')
             
@@ -81,10 +99,11 @@ def register():
         user = User(username=username, email=email, faction=faction)
         user.set_password(password)
         db.session.add(user)
-        db.session.commit()
+        # Assign the ID the world rows need without committing yet
+        db.session.flush()
         
-        # Initialize game data after a user is created
-        user.initialize_game_data()
+        # Give the user a pre-generated starting system and save both in one transaction
+        user.initialize_game_data(claim_system(GameSettings.snapshot()))
         db.session.commit()
         
         # Automatically log in the user
@@ -1,8 +1,6 @@
 from flask import Blueprint, render_template, jsonify, request, current_app
 from flask_login import login_required, current_user
-import json
-from datetime import datetime
-from flask_app import db
+from flask_app import db, codec
 from flask_app.models.game_settings import GameSettings
 
 main = Blueprint('main', __name__)
@@ -15,7 +13,7 @@ def index():
 @login_required
 def build():
     # Initialize game data for new users
-    if not current_user.game_data or current_user.game_data == "{}":
+    if not current_user.has_game_data:
         current_user.initialize_game_data()
         db.session.commit()
     
@@ -36,32 +34,41 @@ def combat(opponent_id):
     except ValueError:
         return jsonify({'error': 'Invalid opponent ID'}), 400
 
-@main.route('/api/save_game', methods=['POST'])
+@main.route('/api/save_game', methods=['POST', 'PATCH'])
 @login_required
 def save_game():
     data = request.json
     if not data:
         return jsonify({'error': 'No data provided'}), 400
     
-    # Add timestamp
-    data['last_updated'] = datetime.utcnow().isoformat()
-    
-    # Save the current game data
-    current_user.game_data = json.dumps(data)
-    db.session.commit()
-    
-    # Update resources based on mining facilities
-    # Note: update_resources() already updates game_data internally
-    updated_data = current_user.update_resources()
-    db.session.commit()
+    # Save the current game data and update resources based on facilities
+    from flask_app.socket_events import save_game_state, patch_game_state
+    from flask_app.saves import save_summary, SaveError, SaveConflict, STATE_VERSION_KEY
+    try:
+        if request.method == 'PATCH':
+            # {"base_version": ..., "patch": [RFC 6902 operations]}
+            if not isinstance(data, dict):
+                raise SaveError("Patch saves need a base_version and a patch")
+            updated_data = patch_game_state(current_user, data.get('base_version'), data.get('patch'))
+        else:
+            updated_data = save_game_state(current_user, data)
+    except SaveConflict as e:
+        # The client should send a full save instead
+        return jsonify({'error': str(e), 'conflict': True}), 409
+    except SaveError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Return the updated data so a client can sync
-    return jsonify({'success': True, 'updated_data': updated_data})
+    # Return the updated data so a client can sync (only the server-side changes for a patch)
+    return jsonify({
+        'success': True,
+        'state_version': updated_data[STATE_VERSION_KEY],
+        'updated_data': save_summary(updated_data) if request.method == 'PATCH' else updated_data
+    })
 
 @main.route('/api/load_game', methods=['GET'])
 @login_required
 def load_game():
-    if not current_user.game_data or current_user.game_data == "{}":
+    if not current_user.has_game_data:
         # Initialize new game data
         game_data = current_user.initialize_game_data()
         db.session.commit()
@@ -69,14 +76,15 @@ def load_game():
     
     try:
         # Always update resources when loading the game
-        # The update_resources function will calculate resources based on time elapsed
-        # since the last update, even if a user was offline
-        updated_data = current_user.update_resources(force_update=True)
+        # Resources are calculated based on time elapsed since the last update,
+        # even if a user was offline
+        from flask_app.socket_events import current_resources
+        updated_data = current_resources(current_user)
         db.session.commit()
         
         # Return the updated data with newly calculated resources
         return jsonify(updated_data)
-    except json.JSONDecodeError:
+    except codec.JSONDecodeError:
         # Handle corrupt data
         game_data = current_user.initialize_game_data()
         db.session.commit()
@@ -85,7 +93,7 @@ def load_game():
 @main.route('/api/game_settings', methods=['GET'])
 def game_settings():
     """Get game settings for the front-end"""
-    settings = GameSettings.get_settings()
+    settings = GameSettings.snapshot()
     
     return jsonify({
         'orbit_speed_factor': float(settings.orbit_speed_factor) if settings.orbit_speed_factor else 0.00001,
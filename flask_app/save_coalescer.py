@@ -0,0 +1,173 @@
+import threading
+import time
+
+class SaveCoalescer:
+    """
+    Per-user save debouncer with a hard rate limit
+    
+    A save is held for up to `window` seconds and replaced by any newer save
+    from the same user in the meantime, so a burst of saves costs one write.
+    The first save of a burst sets the write time, so a client saving
+    continuously is still written every window. Each user also has a token
+    bucket of `burst` saves refilled at `rate_limit` per minute; saves
+    beyond it are rejected before any parsing or writing is done, unless
+    they would only replace a save that is still waiting (which costs no
+    extra write and keeps the newest state).
+    """
+    
+    def __init__(self, window=2.0, rate_limit=60, burst=10):
+        """
+        Args:
+            window: Seconds a save is held for newer ones (0 writes every save immediately)
+            rate_limit: Saves per minute each user can sustain
+            burst: Saves a user can make back to back before the rate limit applies
+        """
+        self.window = window
+        self.rate = rate_limit / 60.0
+        self.burst = burst
+        
+        # user_id -> (due, data) for saves waiting to be written
+        self._pending = {}
+        # user_id -> (tokens, updated) for the rate limit
+        self._buckets = {}
+        self._lock = threading.Lock()
+        
+        # Counters for server stats
+        self.received = 0
+        self.rejected = 0
+        self.coalesced = 0
+        self.written = 0
+    
+    def __len__(self):
+        return len(self._pending)
+    
+    def __contains__(self, user_id):
+        return user_id in self._pending
+    
+    def allow(self, user_id, now=None):
+        """
+        Count a save from a user and check it against their rate limit
+        
+        Returns:
+            False if the save should be rejected
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.received += 1
+            tokens, updated = self._buckets.get(user_id, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[user_id] = (tokens, now)
+                if user_id in self._pending:
+                    return True
+                self.rejected += 1
+                return False
+            self._buckets[user_id] = (tokens - 1, now)
+            return True
+    
+    def retry_after(self, user_id, now=None):
+        """Seconds until a user's next save is allowed (None if saves are never refilled)"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(user_id, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                return 0.0
+            return (1 - tokens) / self.rate if self.rate > 0 else None
+    
+    def offer(self, user_id, data, now=None):
+        """
+        Hold a save to be written once the window is up
+        
+        Returns:
+            True if it replaced a save that was still waiting
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            previous = self._pending.get(user_id)
+            if previous is not None:
+                self._pending[user_id] = (previous[0], data)
+                self.coalesced += 1
+                return True
+            self._pending[user_id] = (now + self.window, data)
+            return False
+    
+    def restore(self, user_id, data, now=None):
+        """Put back a save whose write failed, unless a newer one is already waiting"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._pending.setdefault(user_id, (now + self.window, data))
+    
+    def get(self, user_id):
+        """Get a user's waiting save, or None"""
+        with self._lock:
+            entry = self._pending.get(user_id)
+            return entry[1] if entry is not None else None
+    
+    def pop(self, user_id):
+        """Take a user's waiting save to write it now (None if there isn't one)"""
+        with self._lock:
+            entry = self._pending.pop(user_id, None)
+            return entry[1] if entry is not None else None
+    
+    def pop_due(self, now=None):
+        """
+        Take every save whose window is up
+        
+        Returns:
+            List of (user_id, data)
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            due = [user_id for user_id, (due, data) in self._pending.items() if due <= now]
+            return [(user_id, self._pending.pop(user_id)[1]) for user_id in due]
+    
+    def pop_all(self):
+        """Take every waiting save (e.g. on shutdown)"""
+        with self._lock:
+            pending = [(user_id, data) for user_id, (due, data) in self._pending.items()]
+            self._pending.clear()
+            return pending
+    
+    def _refilled(self, bucket, now):
+        tokens, updated = bucket
+        return tokens + (now - updated) * self.rate >= self.burst
+    
+    def forget(self, user_id, now=None):
+        """
+        Drop a disconnected user's rate limit state once it has refilled
+        
+        A user still limited keeps their bucket, so reconnecting doesn't
+        buy them a fresh burst; prune() drops it once it has refilled.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(user_id)
+            if bucket is not None and self._refilled(bucket, now):
+                del self._buckets[user_id]
+    
+    def prune(self, now=None):
+        """
+        Drop every rate limit bucket that has fully refilled
+        
+        Returns:
+            Number of buckets dropped
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            refilled = [user_id for user_id, bucket in self._buckets.items() if self._refilled(bucket, now)]
+            for user_id in refilled:
+                del self._buckets[user_id]
+            return len(refilled)
+    
+    def stats(self):
+        """Get the save counters and the number of saves waiting"""
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'buckets': len(self._buckets),
+                'received': self.received,
+                'rejected': self.rejected,
+                'coalesced': self.coalesced,
+                'written': self.written
+            }
@@ -0,0 +1,69 @@
+import math
+from datetime import datetime, timedelta
+
+# Top-level game_data fields and the type a save must give them (if present)
+NUMBER_FIELDS = ("resources", "research_points", "population")
+DICT_FIELDS = ("materials", "mining_facilities", "research_outposts", "colony_bases",
+               "orbital_structures", "buildings", "ships", "playerPosition")
+LIST_FIELDS = ("planets", "stars")
+
+# Dict fields whose values must all be numbers
+COUNT_FIELDS = ("materials", "mining_facilities", "research_outposts", "colony_bases", "ships")
+
+# Server-set field identifying the save that produced a state, which patch
+# saves name as their base. Resource ticks don't change it.
+STATE_VERSION_KEY = "state_version"
+
+# Fields the server changes on a save, returned to clients that sent a patch
+SUMMARY_FIELDS = NUMBER_FIELDS + ("materials", "last_updated", STATE_VERSION_KEY)
+
+EPOCH = datetime(1970, 1, 1)
+
+class SaveError(ValueError):
+    """A client save payload that can't be stored"""
+
+class SaveConflict(SaveError):
+    """A patch save whose base is not the stored state"""
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def validate_save(data):
+    """
+    Check a client save payload before it is stored
+    
+    Only the shape the server relies on is checked (balances, facility
+    counts, ships and the planet/star lists); other fields pass through.
+    
+    Raises:
+        SaveError: If the payload is malformed
+    """
+    if not isinstance(data, dict):
+        raise SaveError("Game data must be an object")
+    
+    for field in NUMBER_FIELDS:
+        if field in data and not is_number(data[field]):
+            raise SaveError(f"'{field}' must be a number")
+    
+    for field in DICT_FIELDS:
+        if field in data and not isinstance(data[field], dict):
+            raise SaveError(f"'{field}' must be an object")
+    
+    for field in LIST_FIELDS:
+        if field in data and not isinstance(data[field], list):
+            raise SaveError(f"'{field}' must be a list")
+    
+    for field in COUNT_FIELDS:
+        for key, value in data.get(field, {}).items():
+            if not is_number(value):
+                raise SaveError(f"'{field}.{key}' must be a number")
+    
+    return data
+
+def state_version(now):
+    """Get the state version for a save made at the given time (microseconds since the epoch)"""
+    return (now - EPOCH) // timedelta(microseconds=1)
+
+def save_summary(data):
+    """Get the fields of a saved state the server may have changed"""
+    return {field: data[field] for field in SUMMARY_FIELDS if field in data}
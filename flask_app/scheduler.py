@@ -0,0 +1,145 @@
+import heapq
+import itertools
+import threading
+import time
+
+# Golden ratio conjugate - stepping the phase by this keeps any number of
+# users spread evenly across the tick interval
+PHASE_STEP = 0.6180339887498949
+
+class TickScheduler:
+    """
+    Heap-based scheduler giving each user their own resource tick due time
+    
+    New users are phased across the interval so ticks are spread evenly
+    instead of processed in one burst, and each user ticks at the rate for
+    their current state (e.g. 'building' vs 'idle').
+    """
+    
+    def __init__(self, intervals, default_state='idle'):
+        """
+        Args:
+            intervals: Map of state -> seconds between ticks
+            default_state: State for new users and when a timed state expires
+        """
+        self.intervals = dict(intervals)
+        self.default_state = default_state
+        
+        # Heap of (due, seq, user_id); self._entries maps user_id -> (due, seq)
+        # and heap entries that don't match it are stale and skipped when popped
+        self._heap = []
+        self._entries = {}
+        self._states = {}
+        self._state_expiry = {}
+        self._counter = itertools.count()
+        self._phase = 0.0
+        self._lock = threading.Lock()
+        
+        # Lag of the most recently popped tick and the worst seen
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def __contains__(self, user_id):
+        return user_id in self._entries
+    
+    def _push(self, user_id, due):
+        seq = next(self._counter)
+        self._entries[user_id] = (due, seq)
+        heapq.heappush(self._heap, (due, seq, user_id))
+    
+    def _interval(self, user_id):
+        return self.intervals[self._states.get(user_id, self.default_state)]
+    
+    def add(self, user_id, state=None, now=None):
+        """Schedule a user, phasing their first tick into the interval"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._states[user_id] = state or self.default_state
+            self._phase = (self._phase + PHASE_STEP) % 1.0
+            self._push(user_id, now + self._interval(user_id) * self._phase)
+    
+    def remove(self, user_id):
+        """Stop scheduling a user"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._states.pop(user_id, None)
+            self._state_expiry.pop(user_id, None)
+    
+    def set_state(self, user_id, state, duration=None, now=None):
+        """
+        Change the tick rate for a user
+        
+        Args:
+            user_id: Scheduled user
+            state: New state, one of the configured intervals
+            duration: Seconds before reverting to the default state (None keeps it)
+            now: Current monotonic time
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if user_id not in self._entries:
+                return
+            
+            self._states[user_id] = state
+            if duration is None:
+                self._state_expiry.pop(user_id, None)
+            else:
+                self._state_expiry[user_id] = now + duration
+            
+            # Bring the next tick forward if the new rate is faster
+            due = now + self.intervals[state]
+            if due < self._entries[user_id][0]:
+                self._push(user_id, due)
+    
+    def pop_due(self, now=None):
+        """
+        Get every user whose tick is due and schedule their next tick
+        
+        Returns:
+            List of due user IDs
+        """
+        now = time.monotonic() if now is None else now
+        due_users = []
+        
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due, seq, user_id = heapq.heappop(self._heap)
+                if self._entries.get(user_id) != (due, seq):
+                    continue
+                
+                due_users.append(user_id)
+                self.last_lag = now - due
+                self.max_lag = max(self.max_lag, self.last_lag)
+                
+                # Drop back to the default rate once a timed state expires
+                expiry = self._state_expiry.get(user_id)
+                if expiry is not None and expiry <= now:
+                    self._states[user_id] = self.default_state
+                    del self._state_expiry[user_id]
+                
+                # Keep the user's phase unless we've fallen a whole interval behind
+                next_due = due + self._interval(user_id)
+                if next_due <= now:
+                    next_due = now + self._interval(user_id)
+                self._push(user_id, next_due)
+        
+        return due_users
+    
+    def stats(self):
+        """Get queue depth, lag and the number of users in each state"""
+        with self._lock:
+            states = {}
+            for user_id in self._entries:
+                state = self._states.get(user_id, self.default_state)
+                states[state] = states.get(state, 0) + 1
+            
+            return {
+                'queue_depth': len(self._entries),
+                'heap_size': len(self._heap),
+                'lag': self.last_lag,
+                'max_lag': self.max_lag,
+                'states': states
+            }
@@ -0,0 +1,71 @@
+"""
+Versioned shape of the game_data blob
+
+Every game_data dict carries a schema_version. Stored data older than
+CURRENT_VERSION is brought up to date once, by the registered upgrade
+steps, when it is first loaded (or by `flask game-data upgrade` for the
+whole table), so resource ticks and saves can assume the current shape
+instead of back-filling missing keys on every call.
+"""
+
+SCHEMA_VERSION_KEY = "schema_version"
+
+FACTIONS = ("blue", "red", "green")
+
+# Upgrade steps by the version they upgrade from; each returns the next version
+UPGRADES = {}
+
+def upgrade_step(from_version):
+    """Register a function that upgrades game data from one version to the next in place"""
+    def register(func):
+        UPGRADES[from_version] = func
+        return func
+    return register
+
+@upgrade_step(0)
+def fill_defaults(data):
+    """Add the balances, materials and facility maps games created before they existed lack"""
+    for key in ("resources", "research_points", "population"):
+        data.setdefault(key, 0)
+    
+    materials = data.setdefault("materials", {})
+    for faction in FACTIONS:
+        materials.setdefault(faction, 0)
+    
+    for key in ("mining_facilities", "research_outposts", "colony_bases", "orbital_structures", "buildings"):
+        data.setdefault(key, {})
+    
+    ships = data.setdefault("ships", {})
+    ships.setdefault("fighters", 0)
+    ships.setdefault("capital_ships", 0)
+
+CURRENT_VERSION = max(UPGRADES) + 1
+
+def upgrade_game_data(data):
+    """
+    Bring parsed game data up to CURRENT_VERSION in place
+    
+    An empty dict is a user who hasn't started a game and is left alone.
+    
+    Returns:
+        True if any upgrade step ran
+    """
+    if not data or data.get(SCHEMA_VERSION_KEY, 0) >= CURRENT_VERSION:
+        return False
+    run_steps(data, data.get(SCHEMA_VERSION_KEY, 0))
+    return True
+
+def upgrade_payload(data):
+    """
+    Bring game data sent by a client up to CURRENT_VERSION in place
+    
+    Clients can drop fields whatever version they claim, so every step runs.
+    """
+    run_steps(data, 0)
+    return data
+
+def run_steps(data, version):
+    while version < CURRENT_VERSION:
+        UPGRADES[version](data)
+        version += 1
+    data[SCHEMA_VERSION_KEY] = version
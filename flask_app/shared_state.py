@@ -0,0 +1,423 @@
+"""
+Socket.IO state shared between server processes
+
+Online players, pending battle requests and combat rooms live behind a
+small store interface so one process can keep them in memory while
+several processes behind a load balancer share them through Redis (or
+anything speaking its protocol). Values are JSON objects that callers
+replace or update through the store rather than mutate in place, since a
+Redis backed value is a fresh copy on every read.
+
+Emits between processes go through Flask-SocketIO's message_queue, which
+should point at the same Redis server. Cached game state, economy engine
+balances and waiting saves stay with the process a player is connected
+to; when another process resets or writes a player's game, it publishes
+an invalidation so that process drops what it holds.
+"""
+import secrets
+import threading
+import time
+
+from flask_app import codec
+from flask_app.presence import Presence
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+BACKENDS = ('memory', 'redis')
+
+# Seconds Redis keeps a pending battle or combat room nobody touched, so
+# ones left behind by a crashed process don't pile up
+REDIS_KEY_TTL = 6 * 3600
+
+# Seconds a process may go without a presence heartbeat before other
+# processes take its players offline (it beats three times per period)
+PRESENCE_PROCESS_TTL = 30
+
+class MemoryStore:
+    """JSON objects by key, for a single server process"""
+    
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._items)
+    
+    def __contains__(self, key):
+        return key in self._items
+    
+    def get(self, key):
+        """Get a copy of a stored object, or None"""
+        value = self._items.get(key)
+        return dict(value) if value is not None else None
+    
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = dict(value)
+    
+    def update(self, key, fields):
+        """
+        Change some fields of a stored object
+        
+        Returns:
+            The updated object, or None if there is none (nothing is created)
+        """
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                return None
+            value.update(fields)
+            return dict(value)
+    
+    def pop(self, key):
+        """Remove an object, returning it (or None)"""
+        with self._lock:
+            return self._items.pop(key, None)
+
+class RedisStore:
+    """JSON objects by key in Redis, one string key per object"""
+    
+    def __init__(self, client, prefix, ttl=REDIS_KEY_TTL):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+    
+    def _key(self, key):
+        return f"{self.prefix}:{key}"
+    
+    def __contains__(self, key):
+        return bool(self.client.exists(self._key(key)))
+    
+    def get(self, key):
+        value = self.client.get(self._key(key))
+        return codec.loads(value) if value is not None else None
+    
+    def set(self, key, value):
+        self.client.set(self._key(key), codec.dumps(value), ex=self.ttl)
+    
+    def update(self, key, fields):
+        """Change some fields of a stored object atomically (optimistic WATCH/MULTI)"""
+        name = self._key(key)
+        
+        def apply(pipe):
+            value = pipe.get(name)
+            if value is None:
+                return None
+            value = codec.loads(value)
+            value.update(fields)
+            pipe.multi()
+            pipe.set(name, codec.dumps(value), ex=self.ttl)
+            return value
+        
+        return self.client.transaction(apply, name, value_from_callable=True)
+    
+    def pop(self, key):
+        pipe = self.client.pipeline()
+        pipe.get(self._key(key))
+        pipe.delete(self._key(key))
+        value = pipe.execute()[0]
+        return codec.loads(value) if value is not None else None
+
+class RedisPresence:
+    """
+    Presence registry shared by every server process through Redis
+    
+    Same interface and semantics as Presence. Users are a hash of
+    [sid, player] by user ID with a reverse hash of sids, connection order
+    and each faction are sorted sets scored by the version the user joined
+    at, and the latest deltas are a capped list. Changes are WATCH/MULTI
+    transactions on the version key, so every process sees one sequence
+    of versions.
+    
+    Each process also keeps the sids connected to it in a set of its own
+    and heartbeats into a sorted set of processes. A process that stops
+    beating (it crashed or was killed) has its players disconnected by
+    the next process to beat, so they don't stay online forever.
+    """
+    
+    def __init__(self, client, prefix, log_size=1000, process_ttl=PRESENCE_PROCESS_TTL):
+        self.client = client
+        self.prefix = prefix
+        self.log_size = log_size
+        self.process_ttl = process_ttl
+        self.process = secrets.token_hex(8)
+        self._task = None
+        self._lock = threading.Lock()
+        self._users = f"{prefix}:users"
+        self._sids = f"{prefix}:sids"
+        self._order = f"{prefix}:order"
+        self._factions = f"{prefix}:factions"
+        self._version = f"{prefix}:version"
+        self._log = f"{prefix}:log"
+        self._epoch = f"{prefix}:epoch"
+        self._processes = f"{prefix}:processes"
+        self._process_sids = self._connections_key(self.process)
+        self.client.set(self._epoch, secrets.token_hex(4), nx=True)
+    
+    def _faction_key(self, faction):
+        return f"{self.prefix}:faction:{faction}"
+    
+    def _connections_key(self, process):
+        return f"{self.prefix}:process:{process}"
+    
+    def _entry(self, user_id):
+        value = self.client.hget(self._users, user_id)
+        return codec.loads(value) if value is not None else None
+    
+    def __len__(self):
+        return self.client.hlen(self._users)
+    
+    def __contains__(self, user_id):
+        return bool(self.client.hexists(self._users, user_id))
+    
+    def __getitem__(self, user_id):
+        entry = self._entry(user_id)
+        if entry is None:
+            raise KeyError(user_id)
+        return entry[0]
+    
+    def __iter__(self):
+        return iter([int(user_id) for user_id in self.client.hkeys(self._users)])
+    
+    def get(self, user_id, default=None):
+        entry = self._entry(user_id)
+        return entry[0] if entry is not None else default
+    
+    def player(self, user_id):
+        entry = self._entry(user_id)
+        return entry[1] if entry is not None else None
+    
+    def user_id(self, sid):
+        user_id = self.client.hget(self._sids, sid)
+        return int(user_id) if user_id is not None else None
+    
+    def _record(self, pipe, version, op, player):
+        delta = {'version': version, 'op': op, 'player': player}
+        pipe.set(self._version, version)
+        pipe.rpush(self._log, codec.dumps(delta))
+        pipe.ltrim(self._log, -self.log_size, -1)
+        return delta
+    
+    def connect(self, user_id, sid, username, faction):
+        player = {'id': user_id, 'username': username, 'faction': faction}
+        
+        def apply(pipe):
+            previous = pipe.hget(self._users, user_id)
+            previous = codec.loads(previous) if previous is not None else None
+            version = int(pipe.get(self._version) or 0) + 1
+            pipe.multi()
+            pipe.hset(self._users, user_id, codec.dumps([sid, player]))
+            pipe.hset(self._sids, sid, user_id)
+            pipe.sadd(self._process_sids, sid)
+            if previous is not None and previous[1] == player:
+                return None
+            if previous is not None:
+                pipe.zrem(self._faction_key(previous[1]['faction']), user_id)
+            pipe.zadd(self._order, {user_id: version})
+            pipe.zadd(self._faction_key(faction), {user_id: version})
+            pipe.sadd(self._factions, faction)
+            return self._record(pipe, version, 'join', player)
+        
+        return self.client.transaction(apply, self._version, self._users, value_from_callable=True)
+    
+    def disconnect(self, sid):
+        def apply(pipe):
+            user_id = pipe.hget(self._sids, sid)
+            entry = pipe.hget(self._users, user_id) if user_id is not None else None
+            entry = codec.loads(entry) if entry is not None else None
+            version = int(pipe.get(self._version) or 0) + 1
+            pipe.multi()
+            pipe.hdel(self._sids, sid)
+            pipe.srem(self._process_sids, sid)
+            if entry is None or entry[0] != sid:
+                return None
+            user_id = int(user_id)
+            pipe.hdel(self._users, user_id)
+            pipe.zrem(self._order, user_id)
+            pipe.zrem(self._faction_key(entry[1]['faction']), user_id)
+            return self._record(pipe, version, 'leave', {'id': user_id})
+        
+        return self.client.transaction(apply, self._version, self._users, self._sids,
+                                       value_from_callable=True)
+    
+    def heartbeat(self, now=None):
+        """
+        Mark this process alive and disconnect the players of processes that stopped
+        
+        Returns:
+            The 'leave' deltas to broadcast
+        """
+        if now is None:
+            seconds, microseconds = self.client.time()
+            now = seconds + microseconds / 1e6
+        self.client.zadd(self._processes, {self.process: now})
+        
+        deltas = []
+        for process in self.client.zrangebyscore(self._processes, '-inf', now - self.process_ttl):
+            key = self._connections_key(process)
+            # Another process may be doing the same; disconnect only acts once
+            for sid in self.client.smembers(key):
+                delta = self.disconnect(sid)
+                if delta is not None:
+                    deltas.append(delta)
+            pipe = self.client.pipeline()
+            pipe.delete(key)
+            pipe.zrem(self._processes, process)
+            pipe.execute()
+        return deltas
+    
+    def keep_alive(self, handler, start_task):
+        """Start heartbeating, calling handler(delta) for players of stopped processes (once)"""
+        with self._lock:
+            if self._task is None:
+                self._task = start_task(self._beat, handler)
+    
+    def _beat(self, handler):
+        while True:
+            try:
+                for delta in self.heartbeat():
+                    handler(delta)
+            except Exception as e:
+                # Keep beating through Redis restarts
+                print(f"Presence heartbeat error: {e}")
+            time.sleep(self.process_ttl / 3)
+    
+    def sync(self, epoch=None, version=None):
+        pipe = self.client.pipeline()
+        pipe.get(self._epoch)
+        pipe.get(self._version)
+        pipe.lrange(self._log, 0, -1)
+        current_epoch, current, log = pipe.execute()
+        if current_epoch is None:
+            # Redis lost our keys (restart or flush): start a new epoch
+            self.client.set(self._epoch, secrets.token_hex(4), nx=True)
+            current_epoch = self.client.get(self._epoch)
+        current = int(current or 0)
+        result = {'epoch': current_epoch, 'version': current}
+        
+        missed = current - version if epoch == current_epoch and isinstance(version, int) else -1
+        if 0 <= missed <= len(log):
+            deltas = [codec.loads(delta) for delta in log[len(log) - missed:]] if missed else []
+            if not deltas or deltas[0]['version'] == version + 1:
+                result['deltas'] = deltas
+                return result
+        
+        result['players'] = [codec.loads(entry)[1] for entry in self.client.hvals(self._users)]
+        return result
+    
+    def roster(self, faction=None, offset=0, limit=100, exclude=None):
+        if faction is not None and not isinstance(faction, str):
+            return [], 0
+        key = self._order if faction is None else self._faction_key(faction)
+        pipe = self.client.pipeline()
+        pipe.zcard(key)
+        if exclude is not None:
+            pipe.zrank(key, exclude)
+        count, *rank = pipe.execute()
+        excluded_rank = rank[0] if rank else None
+        
+        # Skip one more when the excluded user is before the page
+        start = offset + (excluded_rank is not None and excluded_rank < offset)
+        user_ids = [user_id for user_id in self.client.zrange(key, start, start + limit)
+                    if excluded_rank is None or int(user_id) != exclude][:limit]
+        entries = self.client.hmget(self._users, user_ids) if user_ids else []
+        players = [codec.loads(entry)[1] for entry in entries if entry is not None]
+        return players, count - (excluded_rank is not None)
+    
+    def stats(self):
+        factions = sorted(self.client.smembers(self._factions))
+        pipe = self.client.pipeline()
+        pipe.hlen(self._users)
+        pipe.get(self._version)
+        pipe.hlen(self._sids)
+        for faction in factions:
+            pipe.zcard(self._faction_key(faction))
+        online, version, connections, *counts = pipe.execute()
+        return {
+            'online': online,
+            'version': int(version or 0),
+            'connections': connections,
+            'factions': dict(zip(factions, counts))
+        }
+
+class LocalInvalidations:
+    """Game state invalidations for a single process, where there's no one else to tell"""
+    
+    def publish(self, user_ids):
+        pass
+    
+    def subscribe(self, handler, start_task):
+        pass
+
+class RedisInvalidations:
+    """
+    Tell every other server process to drop users' in-memory game state
+    
+    User IDs are published on a Redis channel; each process listens on a
+    background task and calls the handler for IDs other processes sent.
+    """
+    
+    def __init__(self, client, channel):
+        self.client = client
+        self.channel = channel
+        # Identifies our own messages, which we have already handled
+        self.token = secrets.token_hex(8)
+        self._task = None
+        self._lock = threading.Lock()
+    
+    def publish(self, user_ids):
+        self.client.publish(self.channel, codec.dumps({'from': self.token, 'user_ids': list(user_ids)}))
+    
+    def subscribe(self, handler, start_task):
+        """Start calling handler(user_id) for invalidations from other processes (once)"""
+        with self._lock:
+            if self._task is None:
+                self._task = start_task(self._listen, handler)
+    
+    def _listen(self, handler):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    payload = codec.loads(message['data'])
+                    if payload['from'] == self.token:
+                        continue
+                    for user_id in payload['user_ids']:
+                        handler(user_id)
+            except Exception as e:
+                # Keep listening through Redis restarts
+                print(f"Game state invalidation listener error, resubscribing: {e}")
+                time.sleep(1)
+
+def create_state(backend='memory', url=None, prefix='massgravity', presence_log_size=1000,
+                 presence_process_ttl=PRESENCE_PROCESS_TTL):
+    """
+    Create the presence registry and battle stores for a backend
+    
+    Args:
+        backend: 'memory' for one process or 'redis' to share them
+        url: Redis URL for the 'redis' backend
+        prefix: Prefix of every Redis key
+        presence_log_size: Roster deltas kept for clients catching up
+        presence_process_ttl: Seconds without a heartbeat before a process's
+            players are taken offline ('redis' only)
+    
+    Returns:
+        Tuple of (presence, pending_battles, combat_rooms, invalidations)
+    """
+    if backend == 'redis':
+        if redis is not None and url:
+            client = redis.Redis.from_url(url, decode_responses=True)
+            return (RedisPresence(client, f"{prefix}:presence", presence_log_size,
+                                  presence_process_ttl),
+                    RedisStore(client, f"{prefix}:pending_battle"),
+                    RedisStore(client, f"{prefix}:combat_room"),
+                    RedisInvalidations(client, f"{prefix}:forget_game_state"))
+        print("Redis state backend needs `pip install redis` and a STATE_BACKEND_URL, using memory")
+    elif backend != 'memory':
+        print(f"Unknown state backend {backend!r}, using memory")
+    return Presence(presence_log_size), MemoryStore(), MemoryStore(), LocalInvalidations()
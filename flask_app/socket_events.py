@@ -1,51 +1,700 @@
 from flask_socketio import emit, join_room, leave_room
+from sqlalchemy import event
 from flask_login import current_user
 from flask import request
-import json
 from datetime import datetime, timedelta
 import threading
 import time
+import atexit
 
 from flask_app import socketio, db
-from flask_app.models.user import User
+from flask_app.models.user import User, settle_resources, project_game_data
 from flask_app.models.game_settings import GameSettings
+from flask_app.models.world import Balance, fleets
+from flask_app.scheduler import TickScheduler
+from flask_app.timers import TimerService
+from flask_app.economy import EconomyEngine
+from flask_app.deltas import DeltaEncoder
+from flask_app.state_cache import GameStateCache
+from flask_app.save_coalescer import SaveCoalescer
+from flask_app.presence import Presence
+from flask_app.shared_state import MemoryStore, LocalInvalidations, create_state
+from flask_app.schema import upgrade_payload
+from flask_app.saves import validate_save, save_summary, state_version, SaveError, SaveConflict, STATE_VERSION_KEY
+from flask_app.jsonpatch import apply_patch, copy_value, PatchError, PatchConflict
 
-# Store active connections
-active_users = {}
-# Store combat rooms and pending battle requests
-combat_rooms = {}
-pending_battles = {}
+# Online players on every server process: user_id -> current sid, with the roster indexes
+active_users = Presence()
+# Users connected to this process: user_id -> sid (ticks, caches and the economy engine are per process)
+local_sids = {}
+# Roster page size when the client doesn't ask for one, and the largest it can ask for
+ROSTER_PAGE_SIZE = 100
+ROSTER_MAX_PAGE_SIZE = 500
+# Room of clients following roster changes (players panel open)
+LOBBY_ROOM = 'lobby'
+# Store combat rooms and pending battle requests (shared like active_users)
+combat_rooms = MemoryStore()
+pending_battles = MemoryStore()
+# Tells other server processes to drop a user's cached game state (a no-op for one process)
+invalidations = LocalInvalidations()
+# Session info key of users whose game state is forgotten again once the session commits
+FORGOTTEN_USERS_KEY = "forgotten_game_state_ids"
 # Resource update thread
 resource_thread = None
 # Thread control
 thread_stop_event = threading.Event()
+# Guards starting the resource thread against it exiting at the same time
+# (the task objects of eventlet/gevent can't be asked whether they're alive)
+resource_thread_lock = threading.Lock()
+# Per-user resource tick schedule
+tick_scheduler = None
+# Battle request, readiness and inactivity timeouts
+timers = TimerService(socketio.start_background_task)
+battle_timeouts = {'request': 60, 'ready': 10, 'inactivity': 300}
+# Vectorized economy state for online users (only with ECONOMY_ENGINE=numpy)
+economy_engine = None
+# Last resource state sent to each client (only with RESOURCE_DELTAS enabled)
+delta_encoder = None
+# Write-behind parsed game state for online users (only with GAME_STATE_CACHE enabled)
+state_cache = None
+# Whether resources are computed on read instead of accrued into game_data
+lazy_accrual = False
+# Debounced, rate-limited Socket.IO saves waiting to be written
+save_coalescer = None
+# Stats from the most recent resource tick
+tick_stats = {
+    'ticks': 0,
+    'users': 0,
+    'duration': 0.0
+}
+
+def init_app(app):
+    """Set up the resource tick scheduler, economy engine, delta encoder, state cache, save coalescer and battle timeouts from app config"""
+    global tick_scheduler, economy_engine, delta_encoder, state_cache, lazy_accrual, save_coalescer
+    global active_users, pending_battles, combat_rooms, invalidations
+    battle_timeouts.update(request=app.config.get('BATTLE_REQUEST_TIMEOUT', 60),
+                           ready=app.config.get('BATTLE_READY_TIMEOUT', 10),
+                           inactivity=app.config.get('BATTLE_INACTIVITY_TIMEOUT', 300))
+    lazy_accrual = app.config.get('RESOURCE_ACCRUAL_MODE') == 'lazy'
+    active_users, pending_battles, combat_rooms, invalidations = create_state(
+        app.config.get('STATE_BACKEND', 'memory'),
+        app.config.get('STATE_BACKEND_URL'),
+        presence_log_size=app.config.get('PRESENCE_LOG_SIZE', 1000),
+        presence_process_ttl=app.config.get('PRESENCE_PROCESS_TTL', 30)
+    )
+    tick_scheduler = TickScheduler({
+        'idle': app.config.get('RESOURCE_TICK_INTERVAL', 5),
+        'building': app.config.get('RESOURCE_TICK_BUILDING_INTERVAL', 2)
+    })
+    
+    if app.config.get('ECONOMY_ENGINE') == 'numpy':
+        try:
+            economy_engine = EconomyEngine()
+        except RuntimeError as e:
+            print(f"Falling back to scalar resource updates: {e}")
+    
+    if app.config.get('RESOURCE_DELTAS', True):
+        delta_encoder = DeltaEncoder(app.config.get('RESOURCE_KEYFRAME_INTERVAL', 12))
+    
+    if app.config.get('GAME_STATE_CACHE', False):
+        state_cache = GameStateCache(app.config.get('GAME_STATE_CACHE_BUDGET', 64 * 1024 * 1024))
+        
+        # Write back whatever is still dirty when the server stops
+        def flush_on_shutdown():
+            with app.app_context():
+                flushed = state_cache.flush()
+                print(f"Flushed cached game state for {flushed} users on shutdown")
+        atexit.register(flush_on_shutdown)
+    
+    save_coalescer = SaveCoalescer(app.config.get('SAVE_COALESCE_WINDOW', 2.0),
+                                   app.config.get('SAVE_RATE_LIMIT', 60),
+                                   app.config.get('SAVE_RATE_BURST', 10))
+    
+    # Registered after the state cache's handler so it runs first and the
+    # cache flush picks up what it stores
+    def write_saves_on_shutdown():
+        with app.app_context():
+            written = write_pending_saves(save_coalescer.pop_all())
+            if written:
+                print(f"Wrote {written} pending saves on shutdown")
+    atexit.register(write_saves_on_shutdown)
+
+def load_game_state(user):
+    """Get a user's parsed game data, from a save waiting to be written or the state cache for online users"""
+    if save_coalescer is not None:
+        pending = save_coalescer.get(user.id)
+        if pending is not None:
+            return pending
+    if state_cache is not None:
+        entry = state_cache.get(user.id)
+        if entry is None and user.id in local_sids:
+            entry = state_cache.load(user)
+        if entry is not None:
+            return entry.data
+    return user.read_game_data()
+
+def store_game_state(user, data, balances_only=False):
+    """
+    Write a user's game data
+    
+    Cached (online) users are only marked dirty and written on the next
+    flush; everyone else gets game_data set directly for the caller to commit.
+    
+    Args:
+        user: User the data belongs to
+        data: Parsed game data
+        balances_only: True if only balances changed
+    """
+    # This write replaces any save still waiting (data usually is that save)
+    if save_coalescer is not None and save_coalescer.pop(user.id) is not None:
+        balances_only = False
+    
+    if state_cache is not None and user.id in state_cache:
+        state_cache.put(user, data)
+    else:
+        user.write_game_data(data, balances_only=balances_only)
+
+def save_game_state(user, data, now=None, queue=False):
+    """
+    Save a client's game data (the pipeline shared by HTTP and Socket.IO)
+    
+    Validates the payload, fills in anything it lacks for the current
+    schema, stamps it, accrues resources into it and stores it with a
+    single serialization. Cached (online) users are saved into
+    the state cache and written on the next flush; everyone else is written
+    in one commit.
+    
+    Args:
+        user: User saving the game
+        data: Parsed client game data, updated in place
+        now: Save time (defaults to the current UTC time)
+        queue: Hold the save in the save coalescer, to be written once its
+               window is up unless a newer save replaces it first
+    
+    Returns:
+        The saved game data with updated resources
+    
+    Raises:
+        SaveError: If the payload is malformed
+    """
+    validate_save(data)
+    upgrade_payload(data)
+    now = now or datetime.utcnow()
+    data['last_updated'] = now.isoformat()
+    data[STATE_VERSION_KEY] = state_version(now)
+    
+    # Accrue from the stamp so missing balances and facility maps are filled in
+    updated_data = user.apply_accrual(data, now=now)
+    
+    if queue and save_coalescer is not None and save_coalescer.window > 0:
+        save_coalescer.offer(user.id, updated_data)
+        return updated_data
+    
+    if state_cache is not None and user.id in state_cache:
+        state_cache.put(user, updated_data)
+    else:
+        # A player connected to another process (e.g. saving over HTTP) may
+        # have state there that would be written back over this save
+        if user.id not in local_sids:
+            forget_game_state(user.id)
+        user.write_game_data(updated_data)
+        db.session.commit()
+    if save_coalescer is not None:
+        save_coalescer.pop(user.id)
+        save_coalescer.written += 1
+    
+    # Keep an online player's economy engine state in step with the save
+    sync_online_user(user, updated_data)
+    return updated_data
+
+def write_pending_saves(pending, chunk_size=500):
+    """
+    Write saves taken from the save coalescer with one commit per chunk
+    
+    Args:
+        pending: List of (user_id, saved game data)
+        chunk_size: Maximum number of users loaded and committed together
+    
+    Returns:
+        Number of saves written
+    """
+    written = 0
+    for start in range(0, len(pending), chunk_size):
+        chunk = dict(pending[start:start + chunk_size])
+        try:
+            users = User.query.filter(User.id.in_(list(chunk))).all()
+            for user in users:
+                if state_cache is not None and user.id in state_cache:
+                    state_cache.put(user, chunk[user.id])
+                else:
+                    user.write_game_data(chunk[user.id])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error writing {len(chunk)} pending saves: {e}")
+            for user_id, data in chunk.items():
+                save_coalescer.restore(user_id, data)
+            continue
+        
+        for user in users:
+            sync_online_user(user, chunk[user.id])
+        written += len(users)
+    
+    save_coalescer.written += written
+    return written
+
+def write_user_saves(user_ids):
+    """Write the waiting saves of the given users now (before reading their state elsewhere)"""
+    if save_coalescer is None:
+        return 0
+    pending = [(user_id, save_coalescer.pop(user_id)) for user_id in user_ids if user_id in save_coalescer]
+    pending = [(user_id, data) for user_id, data in pending if data is not None]
+    return write_pending_saves(pending) if pending else 0
+
+def patch_game_state(user, base_version, patch, now=None, queue=False):
+    """
+    Save a client's game data from a JSON Patch against an earlier save
+    
+    The patch is applied to a copy of the stored state, which then goes
+    through the same pipeline as a full save.
+    
+    Args:
+        user: User saving the game
+        base_version: State version the patch was made against
+        patch: List of RFC 6902 operations
+        now: Save time (defaults to the current UTC time)
+        queue: Hold the save in the save coalescer (see save_game_state)
+    
+    Returns:
+        The saved game data with updated resources
+    
+    Raises:
+        SaveConflict: If the stored state is not the patch's base, or the
+                      patch doesn't apply to it (the client should send a full save)
+        SaveError: If the patch or the patched state is malformed
+    """
+    current = load_game_state(user)
+    if base_version is None or current.get(STATE_VERSION_KEY) != base_version:
+        raise SaveConflict("Saved game has changed since the patch base")
+    
+    # Cached or waiting state is shared, so never patch it in place
+    data = copy_value(current)
+    try:
+        apply_patch(data, patch)
+    except PatchConflict as e:
+        raise SaveConflict(str(e))
+    except PatchError as e:
+        raise SaveError(str(e))
+    
+    return save_game_state(user, data, now=now, queue=queue)
+
+def forget_game_state(user_id):
+    """
+    Drop a user's cached game state and waiting save after it was reset or deleted elsewhere
+    
+    Call it before committing the change. The state is dropped here right
+    away and, once the session commits, again here (a tick may have loaded
+    the old game in between) and in every other server process.
+    """
+    drop_game_state(user_id)
+    db.session.info.setdefault(FORGOTTEN_USERS_KEY, set()).add(user_id)
+
+@event.listens_for(db.session, 'after_commit')
+def _forget_committed_game_state(session):
+    forgotten = session.info.pop(FORGOTTEN_USERS_KEY, None)
+    if forgotten:
+        for user_id in forgotten:
+            drop_game_state(user_id)
+        invalidations.publish(forgotten)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_forgotten_game_state(session):
+    session.info.pop(FORGOTTEN_USERS_KEY, None)
+
+def drop_game_state(user_id):
+    """Drop a user's cached game state, waiting save and economy state in this process"""
+    if save_coalescer is not None:
+        save_coalescer.pop(user_id)
+    if state_cache is not None:
+        state_cache.discard(user_id)
+    if economy_engine is not None:
+        economy_engine.remove(user_id)
+
+def current_resources(user):
+    """Get a user's current resources, using the state cache for online users"""
+    write_user_saves([user.id])
+    if state_cache is not None and user.id in local_sids:
+        entry = state_cache.load(user)
+        return refresh_cached_resources(user.id, entry)
+    return user.refresh_resources()
+
+def refresh_cached_resources(user_id, entry):
+    """Get current resources from a cached entry, accruing into it unless accrual is lazy"""
+    if lazy_accrual:
+        return project_game_data(entry.data, entry.faction)
+    
+    settle_resources(entry.data, entry.faction)
+    state_cache.mark_dirty(user_id)
+    return entry.data
+
+def load_ships(users):
+    """
+    Get ship counts for users, keyed by user ID
+    
+    Online players' ships come from their cached state when the state cache
+    is on (saves there reach the fleet table on the next flush); everyone
+    else is looked up in the fleet table, falling back to game_data for
+    users the world backfill hasn't reached.
+    """
+    write_user_saves([user.id for user in users])
+    ships = {}
+    lookup = []
+    for user in users:
+        if state_cache is not None and user.id in local_sids:
+            ships[user.id] = load_game_state(user).get('ships', {'fighters': 0, 'capital_ships': 0})
+        else:
+            lookup.append(user)
+    
+    if lookup:
+        stored = fleets(user.id for user in lookup)
+        for user in lookup:
+            ships[user.id] = stored.get(user.id) or user.read_game_data().get(
+                'ships', {'fighters': 0, 'capital_ships': 0})
+    
+    return ships
+
+def emit_resources(data, room, partial=False):
+    """
+    Emit a user's resources, sending only what changed since their last update
+    
+    Args:
+        data: Current game data (or just balances if partial)
+        room: The user's room (their session ID)
+        partial: True if data only holds some fields
+    """
+    if delta_encoder is None:
+        socketio.emit('resource_update', data, room=room)
+        return
+    
+    event, payload = delta_encoder.encode(room, data, partial=partial)
+    socketio.emit(event, payload, room=room)
+
+def emit_resources_keyframe(data):
+    """Send the full resource state to the client handling the current event"""
+    if delta_encoder is not None:
+        delta_encoder.keyframe(request.sid, data)
+    emit('resource_update', data)
+
+def sync_online_user(user, data):
+    """Reload an online user's economy state after their game_data was written"""
+    if economy_engine is not None and user.id in local_sids:
+        # Users without a game (e.g. after an admin reset) have nothing to accrue
+        # and no balance row to write back to
+        if data:
+            economy_engine.load(user.id, user.faction, data)
+        else:
+            economy_engine.remove(user.id)
+
+def flush_economy(user_ids=None, chunk_size=500):
+    """
+    Write economy engine balances back to game_data
+    
+    A chunk that fails to commit is retried one user at a time, so a single
+    bad user (e.g. one whose game was reset mid-flush) doesn't lose everyone
+    else's balances.
+    
+    Args:
+        user_ids: Users to flush (defaults to every user in the engine)
+        chunk_size: Maximum number of users loaded and committed together
+    
+    Returns:
+        Number of users flushed
+    """
+    if economy_engine is None:
+        return 0
+    
+    user_ids = [user_id for user_id in (user_ids if user_ids is not None else list(local_sids))
+                if user_id in economy_engine]
+    flushed_count = 0
+    
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        try:
+            flushed_count += write_economy(chunk)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error flushing economy state for {len(chunk)} users, retrying one at a time: {e}")
+            for user_id in chunk:
+                try:
+                    flushed_count += write_economy([user_id])
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error flushing economy state for user {user_id}: {e}")
+    
+    return flushed_count
+
+def write_economy(user_ids):
+    """Export engine balances for users into their game_data and commit, returning the count written"""
+    written = 0
+    for user in User.query.filter(User.id.in_(user_ids)).all():
+        data = load_game_state(user)
+        if not data:
+            # Reset since it was loaded; there is nothing to write back to
+            economy_engine.remove(user.id)
+            continue
+        store_game_state(user, economy_engine.export(user.id, data), balances_only=True)
+        written += 1
+    db.session.commit()
+    return written
+
+def update_resources_vectorized(rooms):
+    """Advance every due user in one vectorized step and emit their balances"""
+    # Users dropped from the engine (their game was reset or written by
+    # another process) are loaded again; those without a game stay out
+    missing = [user_id for user_id in rooms if user_id not in economy_engine]
+    if missing:
+        for user in User.query.filter(User.id.in_(missing)):
+            sync_online_user(user, load_game_state(user))
+        db.session.commit()
+    
+    settings = GameSettings.snapshot()
+    advanced = economy_engine.step(settings, user_ids=list(rooms.keys()))
+    
+    for user_id in advanced:
+        emit_resources(economy_engine.balances(user_id), rooms[user_id], partial=True)
+    
+    return len(advanced)
+
+def update_resources_cached(rooms, chunk_size=500):
+    """Update resources for cached users in memory, falling back to the database for the rest"""
+    uncached = {}
+    updated_count = 0
+    
+    for user_id, room_id in rooms.items():
+        entry = state_cache.get(user_id)
+        if entry is None:
+            uncached[user_id] = room_id
+            continue
+        
+        try:
+            emit_resources(refresh_cached_resources(user_id, entry), room_id)
+            updated_count += 1
+        except Exception as e:
+            print(f"Error updating resources for user {user_id}: {e}")
+    
+    if uncached:
+        updated_count += update_resources_batched(uncached, chunk_size)
+    
+    return updated_count
+
+def update_resources_projected(rooms, chunk_size=500):
+    """
+    Emit projected balances for lazily accrued users without parsing game_data
+    
+    Balances are the stored balance row plus the user's production rate
+    columns times the time since last_accrual_at, the same arithmetic as
+    project_resources(). Users without a balance row or timestamp yet fall
+    back to the batched update.
+    """
+    user_ids = list(rooms.keys())
+    fallback = {}
+    updated_count = 0
+    
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        now = datetime.utcnow()
+        
+        rows = (db.session.query(User.id, User.faction, User.last_accrual_at,
+                                 User.resources_per_minute, User.research_per_minute,
+                                 User.population_per_minute, User.material_per_minute, Balance)
+                .join(Balance, Balance.user_id == User.id)
+                .filter(User.id.in_(chunk))
+                .all())
+        projected = set()
+        
+        for (user_id, faction, last_accrual_at, resource_rate, research_rate,
+             population_rate, material_rate, balance) in rows:
+            if last_accrual_at is None:
+                continue
+            
+            # Rates are per minute, so scale by elapsed time in minutes
+            time_factor = (now - last_accrual_at).total_seconds() / 60.0
+            materials = {'blue': balance.blue, 'red': balance.red, 'green': balance.green}
+            if faction in materials:
+                materials[faction] += material_rate * time_factor
+            
+            emit_resources({
+                'resources': balance.resources + resource_rate * time_factor,
+                'research_points': balance.research_points + research_rate * time_factor,
+                'population': balance.population + population_rate * time_factor,
+                'materials': materials,
+                'last_updated': now.isoformat()
+            }, rooms[user_id], partial=True)
+            projected.add(user_id)
+        
+        db.session.commit()
+        updated_count += len(projected)
+        fallback.update((user_id, rooms[user_id]) for user_id in chunk if user_id not in projected)
+    
+    if fallback:
+        updated_count += update_resources_batched(fallback, chunk_size)
+    
+    return updated_count
+
+def update_user_resources(user_id, room_id):
+    """Update and emit resources for a single user (one query and one commit)"""
+    try:
+        user = User.query.get(user_id)
+        if user:
+            # Update resources server-side
+            updated_data = user.refresh_resources()
+            db.session.commit()
+            
+            # Emit updated resources to the user
+            emit_resources(updated_data, room_id)
+            return 1
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error updating resources for user {user_id}: {e}")
+    return 0
+
+def update_resources_batched(rooms, chunk_size=500):
+    """
+    Update resources for many users with one query and one commit per chunk
+    
+    Args:
+        rooms: Map of user_id -> room_id for the users to update
+        chunk_size: Maximum number of users loaded and committed together
+    
+    Returns:
+        Number of users whose resources were updated
+    """
+    user_ids = list(rooms.keys())
+    updated_count = 0
+    
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        updates = []
+        
+        try:
+            # Load the whole chunk with a single IN (...) query
+            users = User.query.filter(User.id.in_(chunk)).all()
+            
+            for user in users:
+                try:
+                    updates.append((user.id, user.refresh_resources()))
+                except Exception as e:
+                    print(f"Error updating resources for user {user.id}: {e}")
+            
+            # Commit the whole chunk at once
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error committing resource tick for {len(chunk)} users: {e}")
+            continue
+        
+        # Only emit once the chunk has been persisted
+        for user_id, updated_data in updates:
+            emit_resources(updated_data, rooms[user_id])
+        updated_count += len(updates)
+    
+    return updated_count
 
 def background_resource_update(app_instance=None):
-    """Background thread that updates resources for all active users"""
+    """Background thread that updates resources for active users as their ticks come due"""
     print("Starting resource update thread")
     
     # Use passed app instance
     app = app_instance
+    interval = app.config.get('RESOURCE_TICK_INTERVAL', 5)
+    resolution = app.config.get('RESOURCE_TICK_RESOLUTION', 0.25)
+    batched = app.config.get('RESOURCE_TICK_BATCHED', True)
+    chunk_size = app.config.get('RESOURCE_TICK_CHUNK_SIZE', 500)
+    flush_interval = app.config.get('ECONOMY_FLUSH_INTERVAL', 60)
+    cache_flush_interval = app.config.get('GAME_STATE_FLUSH_INTERVAL', 10)
+    vectorized = economy_engine is not None and not lazy_accrual
+    last_flush = time.monotonic()
+    last_cache_flush = time.monotonic()
     
-    while not thread_stop_event.is_set():
-        # Every 5 seconds, update resources for all active users
-        for user_id, room_id in list(active_users.items()):
-            try:
-                # Use app context for database operations
-                with app.app_context():
-                    user = User.query.get(user_id)
-                    if user:
-                        # Update resources server-side
-                        updated_data = user.update_resources()
-                        db.session.commit()
-                        
-                        # Emit updated resources to the user
-                        socketio.emit('resource_update', updated_data, room=room_id)
-            except Exception as e:
-                print(f"Error updating resources for user {user_id}: {e}")
+    # Totals for the periodic tick report
+    report_start = time.monotonic()
+    report_users = 0
+    report_duration = 0.0
+    
+    global resource_thread
+    while True:
+        # Exit under the lock so a user connecting meanwhile either keeps us
+        # running or sees resource_thread cleared and starts a new one
+        with resource_thread_lock:
+            if thread_stop_event.is_set():
+                resource_thread = None
+                return
+        tick_start = time.monotonic()
+        
+        # Write saves whose coalescing window is up
+        if len(save_coalescer):
+            with app.app_context():
+                write_pending_saves(save_coalescer.pop_due(tick_start), chunk_size)
+        
+        # Update resources for every user whose tick is due; users with a save
+        # still waiting skip this tick rather than accrue over the stored state
+        due_users = tick_scheduler.pop_due(tick_start)
+        rooms = {user_id: local_sids[user_id] for user_id in due_users
+                 if user_id in local_sids and user_id not in save_coalescer}
+        updated_count = 0
         
-        # Wait for 5 seconds
-        time.sleep(5)
+        if rooms:
+            with app.app_context():
+                if vectorized:
+                    updated_count = update_resources_vectorized(rooms)
+                elif state_cache is not None:
+                    updated_count = update_resources_cached(rooms, chunk_size)
+                elif lazy_accrual and batched:
+                    updated_count = update_resources_projected(rooms, chunk_size)
+                elif batched:
+                    updated_count = update_resources_batched(rooms, chunk_size)
+                else:
+                    updated_count = sum(update_user_resources(user_id, room_id)
+                                        for user_id, room_id in rooms.items())
+        
+        duration = time.monotonic() - tick_start
+        tick_stats['ticks'] += 1
+        tick_stats['users'] = updated_count
+        tick_stats['duration'] = duration
+        tick_stats.update(tick_scheduler.stats())
+        report_users += updated_count
+        report_duration += duration
+        
+        # Periodically write the economy engine's balances back to the database
+        if vectorized and tick_start - last_flush >= flush_interval:
+            with app.app_context():
+                flush_economy(chunk_size=chunk_size)
+            last_flush = tick_start
+        
+        # Write back cached game state that changed since the last flush
+        if state_cache is not None and tick_start - last_cache_flush >= cache_flush_interval:
+            with app.app_context():
+                state_cache.flush(chunk_size=chunk_size)
+            last_cache_flush = tick_start
+        
+        # Report tick volume and lag once per interval, and drop save rate
+        # limit buckets that have refilled since
+        if tick_start - report_start >= interval:
+            save_coalescer.prune(tick_start)
+            print(f"Resource ticks: updated {report_users} users in {report_duration * 1000:.1f} ms "
+                  f"(queue depth {tick_stats['queue_depth']}, lag {tick_stats['lag'] * 1000:.1f} ms)")
+            report_start = tick_start
+            report_users = 0
+            report_duration = 0.0
+        
+        # Wake every resolution so users falling due close together are
+        # still processed as one small batch (a cooperative sleep under eventlet/gevent)
+        socketio.sleep(max(resolution - duration, 0))
+
+def broadcast_presence(delta):
+    """Send a roster join/leave delta to the clients following the lobby"""
+    if delta is not None:
+        socketio.emit('presence_delta', delta, room=LOBBY_ROOM)
 
 @socketio.on('connect')
 def handle_connect():
@@ -54,22 +703,29 @@ def handle_connect():
         # Add user to active users
         user_id = current_user.id
         room_id = request.sid
-        active_users[user_id] = room_id
+        local_sids[user_id] = room_id
+        broadcast_presence(active_users.connect(user_id, room_id, current_user.username, current_user.faction))
+        tick_scheduler.add(user_id)
         join_room(room_id)
         
+        # Drop this process's state for users whose game another process changes
+        invalidations.subscribe(drop_game_state, socketio.start_background_task)
+        # Keep this process's players in a shared roster, taking those of stopped processes offline
+        active_users.keep_alive(broadcast_presence, socketio.start_background_task)
+        
         print(f"User {user_id} connected with room {room_id}")
         
         # Start the resource update thread if not already running
         global resource_thread
-        if resource_thread is None or not resource_thread.is_alive():
+        with resource_thread_lock:
             thread_stop_event.clear()
-            
-            # Get app reference for the background thread
-            from flask import current_app
-            app = current_app._get_current_object()
-            
-            # Use Flask-SocketIO's background task function instead of manual thread
-            resource_thread = socketio.start_background_task(background_resource_update, app)
+            if resource_thread is None:
+                # Get app reference for the background thread
+                from flask import current_app
+                app = current_app._get_current_object()
+                
+                # Use Flask-SocketIO's background task function instead of manual thread
+                resource_thread = socketio.start_background_task(background_resource_update, app)
         
         # Calculate accumulated resources since last update and send initial update
         try:
@@ -79,12 +735,15 @@ def handle_connect():
             
             # Use app context for database operations
             with app.app_context():
-                # Force resource update to calculate accumulated resources while offline
-                updated_data = current_user.update_resources(force_update=True)
+                # Calculate accumulated resources while offline
+                updated_data = current_resources(current_user)
                 db.session.commit()
                 
+                # Start tracking the user in the economy engine
+                sync_online_user(current_user, updated_data)
+                
                 # Send updated data with accumulated resources
-                emit('resource_update', updated_data)
+                emit_resources_keyframe(updated_data)
                 print(f"Sent initial update to user {user_id} with accumulated resources")
         except Exception as e:
             print(f"Error sending initial update: {e}")
@@ -97,18 +756,50 @@ def handle_disconnect():
     if current_user.is_authenticated:
         user_id = current_user.id
         
-        # Remove user from active users
-        if user_id in active_users:
-            room_id = active_users[user_id]
-            leave_room(room_id)
-            del active_users[user_id]
+        # Forget what this client was last sent
+        if delta_encoder is not None:
+            delta_encoder.reset(request.sid)
+        leave_room(request.sid)
+        
+        # Tear down the user's state only if this is their current connection,
+        # not an older tab closing while they're still connected on another
+        if local_sids.get(user_id) == request.sid:
+            # Persist and drop the user's economy state
+            if economy_engine is not None and user_id in economy_engine:
+                flush_economy([user_id])
+                economy_engine.remove(user_id)
+            
+            # Write the user's waiting save before their cached state is flushed
+            write_user_saves([user_id])
+            save_coalescer.forget(user_id)
+            
+            # Write back and drop the user's cached game state
+            if state_cache is not None and user_id in state_cache:
+                state_cache.flush([user_id])
+                state_cache.discard(user_id)
+            
+            # Remove user from this process's active users
+            del local_sids[user_id]
+            tick_scheduler.remove(user_id)
+        
+        delta = active_users.disconnect(request.sid)
+        if delta is not None:
+            broadcast_presence(delta)
             print(f"User {user_id} disconnected")
         
-        # Stop the thread if no more active users
-        if not active_users:
+        # Stop the thread if no more active users on this process
+        if not local_sids:
             thread_stop_event.set()
             print("No active users, stopping resource update thread")
 
+def reject_rate_limited_save(user_id):
+    """Tell a client its save was over the rate limit and when it can send its newest state again"""
+    emit('save_error', {
+        'message': 'Saving too often, try again shortly',
+        'rate_limited': True,
+        'retry_after': save_coalescer.retry_after(user_id)
+    })
+
 @socketio.on('save_game')
 def handle_save_game(data):
     """Handle game save events from client"""
@@ -120,20 +811,21 @@ def handle_save_game(data):
             
             # Use app context for database operations
             with app.app_context():
-                # Add timestamp
-                data['last_updated'] = datetime.utcnow().isoformat()
+                if not save_coalescer.allow(current_user.id):
+                    reject_rate_limited_save(current_user.id)
+                    return
                 
-                # Save game state
-                current_user.game_data = json.dumps(data)
-                db.session.commit()
+                # Save game state (written once the coalescing window is up)
+                updated_data = save_game_state(current_user, data, queue=True)
                 
-                # Force resource update
-                updated_data = current_user.update_resources()
-                db.session.commit()
+                # Tick faster while the player is actively building
+                tick_scheduler.set_state(current_user.id, 'building',
+                                         duration=app.config.get('BUILDING_STATE_DURATION', 60))
                 
                 # Send success and updated data
                 emit('save_success', {
                     'success': True,
+                    'state_version': updated_data[STATE_VERSION_KEY],
                     'updated_data': updated_data
                 })
         except Exception as e:
@@ -142,6 +834,42 @@ def handle_save_game(data):
     else:
         emit('save_error', {'message': 'Not authenticated'})
 
+@socketio.on('save_game_patch')
+def handle_save_game_patch(data):
+    """Handle incremental game saves (a JSON Patch against the client's last save)"""
+    if current_user.is_authenticated:
+        try:
+            from flask import current_app
+            app = current_app._get_current_object()
+            
+            with app.app_context():
+                if not save_coalescer.allow(current_user.id):
+                    reject_rate_limited_save(current_user.id)
+                    return
+                
+                if not isinstance(data, dict):
+                    raise SaveError("Patch saves need a base_version and a patch")
+                updated_data = patch_game_state(current_user, data.get('base_version'), data.get('patch'),
+                                                queue=True)
+                
+                tick_scheduler.set_state(current_user.id, 'building',
+                                         duration=app.config.get('BUILDING_STATE_DURATION', 60))
+                
+                # Only send back what the server changed, the client has the rest
+                emit('save_success', {
+                    'success': True,
+                    'state_version': updated_data[STATE_VERSION_KEY],
+                    'updated_data': save_summary(updated_data)
+                })
+        except SaveConflict as e:
+            # The client falls back to a full save
+            emit('save_conflict', {'message': str(e)})
+        except Exception as e:
+            print(f"Error saving game patch: {e}")
+            emit('save_error', {'message': str(e)})
+    else:
+        emit('save_error', {'message': 'Not authenticated'})
+
 
 @socketio.on('request_update')
 def handle_request_update():
@@ -155,46 +883,149 @@ def handle_request_update():
             # Use app context for database operations
             with app.app_context():
                 # Update resources
-                updated_data = current_user.update_resources()
+                updated_data = current_resources(current_user)
                 db.session.commit()
                 
                 # Send updated data
-                emit('resource_update', updated_data)
+                emit_resources_keyframe(updated_data)
         except Exception as e:
             print(f"Error handling update request: {e}")
     else:
         print("Unauthenticated update request")
 
-@socketio.on('get_active_players')
-def handle_get_active_players():
-    """Handle client request for list of active players"""
+@socketio.on('request_resync')
+def handle_request_resync():
+    """Handle a client that lost track of resource deltas and needs a full keyframe"""
     if current_user.is_authenticated:
         try:
             # Get app context
             from flask import current_app
             app = current_app._get_current_object()
             
-            # Prepare list of active players (excluding current user)
-            player_list = []
-            for user_id, room_id in active_users.items():
-                if user_id != current_user.id:
-                    with app.app_context():
-                        user = User.query.get(user_id)
-                        if user:
-                            player_list.append({
-                                'id': user.id,
-                                'username': user.username,
-                                'faction': user.faction
-                            })
+            with app.app_context():
+                updated_data = current_resources(current_user)
+                db.session.commit()
+                
+                # Send the full state and restart the delta sequence
+                emit_resources_keyframe(updated_data)
+        except Exception as e:
+            print(f"Error handling resync request: {e}")
+    else:
+        print("Unauthenticated resync request")
+
+@socketio.on('join_lobby')
+def handle_join_lobby(data=None):
+    """
+    Follow roster changes
+    
+    The client sends the presence epoch and version it last applied, if
+    any, and gets just the deltas it missed (or the full roster when it has
+    none or they are no longer kept); presence_delta events follow as
+    players come and go. Clients that see a gap in versions send this
+    again to resync.
+    """
+    if current_user.is_authenticated:
+        data = data if isinstance(data, dict) else {}
+        join_room(LOBBY_ROOM)
+        sync = active_users.sync(data.get('epoch'), data.get('version'))
+        sync['self_id'] = current_user.id
+        emit('presence_sync', sync)
+    else:
+        print("Unauthenticated lobby join")
+
+@socketio.on('leave_lobby')
+def handle_leave_lobby():
+    """Stop following roster changes (players panel closed)"""
+    leave_room(LOBBY_ROOM)
+
+@socketio.on('get_active_players')
+def handle_get_active_players(data=None):
+    """
+    Handle client request for list of active players
+    
+    The client can send {faction, offset, limit} to page through a large
+    lobby or filter it; the roster comes from the presence registry.
+    """
+    if current_user.is_authenticated:
+        try:
+            data = data if isinstance(data, dict) else {}
+            faction = data.get('faction')
+            offset = max(0, int(data.get('offset') or 0))
+            limit = min(max(1, int(data.get('limit') or ROSTER_PAGE_SIZE)), ROSTER_MAX_PAGE_SIZE)
+            
+            # Prepare a page of active players (excluding current user)
+            player_list, total = active_users.roster(faction, offset, limit, exclude=current_user.id)
             
             # Send the player list to the client
-            emit('active_players_list', {'players': player_list})
+            emit('active_players_list', {
+                'players': player_list,
+                'total': total,
+                'offset': offset,
+                'limit': limit
+            })
         except Exception as e:
             print(f"Error getting active players: {e}")
     else:
         print("Unauthenticated active players request")
 
 
+def expire_battle_request(target_id, requester_id, timestamp, target_name):
+    """Drop a battle request its target didn't answer in time and tell both players"""
+    pending_battle = pending_battles.get(target_id)
+    if (pending_battle is None or pending_battle['requester_id'] != requester_id
+            or pending_battle['timestamp'] != timestamp):
+        return
+    pending_battles.pop(target_id)
+    
+    if target_id in active_users:
+        socketio.emit('battle_request_expired', {'from_id': requester_id}, room=active_users[target_id])
+    if requester_id in active_users:
+        socketio.emit('battle_request_expired', {
+            'target_id': target_id,
+            'target_name': target_name
+        }, room=active_users[requester_id])
+
+def check_battle_readiness(battle_room):
+    """Tell both players if either of them didn't get ready for combat in time"""
+    battle_info = combat_rooms.get(battle_room)
+    if battle_info is not None:
+        if not (battle_info.get('player1_ready') and battle_info.get('player2_ready')):
+            socketio.emit('combat_timeout', {
+                'message': 'Opponent failed to initialize combat properly'
+            }, room=battle_room)
+
+def touch_battle(battle_room, battle_info):
+    """Push back a battle's inactivity timeout after a move by either player"""
+    now = time.time()
+    # Record activity in the room only a few times per timeout, so moves
+    # don't each write to a shared state backend
+    if now - battle_info.get('last_activity', 0) >= battle_timeouts['inactivity'] / 4:
+        combat_rooms.update(battle_room, {'last_activity': now})
+    timers.schedule(('battle_inactive', battle_room), battle_timeouts['inactivity'], expire_battle, battle_room)
+
+def expire_battle(battle_room):
+    """End a battle nobody has moved in for the inactivity timeout"""
+    battle_info = combat_rooms.get(battle_room)
+    if battle_info is None:
+        return
+    
+    # Moves may have gone to another server process; wait out what's left
+    idle = time.time() - battle_info.get('last_activity', 0)
+    if idle < battle_timeouts['inactivity']:
+        timers.schedule(('battle_inactive', battle_room), battle_timeouts['inactivity'] - idle,
+                        expire_battle, battle_room)
+        return
+    
+    socketio.emit('battle_ended', {'winner': None, 'result': 'timeout'}, room=battle_room)
+    close_battle(battle_room)
+
+def close_battle(battle_room):
+    """Drop a battle's combat room, its timeouts and its Socket.IO room"""
+    combat_rooms.pop(battle_room)
+    timers.cancel(('battle_ready', battle_room))
+    timers.cancel(('battle_inactive', battle_room))
+    socketio.server.close_room(battle_room, namespace='/')
+
 @socketio.on('request_battle')
 def handle_request_battle(data):
     """Handle request to battle another player"""
@@ -218,7 +1049,7 @@ def handle_request_battle(data):
             
             # Get target user info
             with app.app_context():
-                target_user = User.query.get(target_id)
+                target_user = active_users.player(target_id)
                 if not target_user:
                     emit('battle_request_error', {'message': 'Target player not found'})
                     return
@@ -231,8 +1062,10 @@ def handle_request_battle(data):
                     'timestamp': datetime.utcnow().isoformat()
                 }
                 
-                # Store pending battle request
-                pending_battles[target_id] = battle_request
+                # Store pending battle request, dropping it if it isn't answered in time
+                pending_battles.set(target_id, battle_request)
+                timers.schedule(('battle_request', target_id), battle_timeouts['request'], expire_battle_request,
+                                target_id, current_user.id, battle_request['timestamp'], target_user['username'])
                 
                 # Send battle request to target player
                 target_room = active_users[target_id]
@@ -245,7 +1078,7 @@ def handle_request_battle(data):
                 # Confirm to requesting player
                 emit('battle_request_sent', {
                     'target_id': target_id,
-                    'target_name': target_user.username
+                    'target_name': target_user['username']
                 })
                 
         except Exception as e:
@@ -268,14 +1101,16 @@ def handle_accept_battle(data):
             requester_id = data['requester_id']
             
             # Check if there's a pending battle request
-            if current_user.id not in pending_battles or pending_battles[current_user.id]['requester_id'] != requester_id:
+            pending_battle = pending_battles.get(current_user.id)
+            if pending_battle is None or pending_battle['requester_id'] != requester_id:
                 emit('battle_response_error', {'message': 'No such battle request found'})
                 return
                 
             # Check if requester is still online
             if requester_id not in active_users:
                 emit('battle_response_error', {'message': 'Requesting player is no longer online'})
-                pending_battles.pop(current_user.id, None)  # Clean up
+                pending_battles.pop(current_user.id)  # Clean up
+                timers.cancel(('battle_request', current_user.id))
                 return
                 
             # Get app context
@@ -286,14 +1121,17 @@ def handle_accept_battle(data):
             battle_room_id = f"battle_{min(requester_id, current_user.id)}_{max(requester_id, current_user.id)}"
             
             # Store battle room info with initial ready states as False
-            combat_rooms[battle_room_id] = {
+            combat_rooms.set(battle_room_id, {
                 'player1': requester_id,
                 'player2': current_user.id,
                 'player1_ready': False,
                 'player2_ready': False,
                 'start_time': datetime.utcnow().isoformat(),
+                'last_activity': time.time(),
                 'status': 'active'
-            }
+            })
+            timers.schedule(('battle_inactive', battle_room_id), battle_timeouts['inactivity'],
+                            expire_battle, battle_room_id)
             
             # Get user game data for ships
             with app.app_context():
@@ -303,12 +1141,10 @@ def handle_accept_battle(data):
                     emit('battle_response_error', {'message': 'Requesting player not found'})
                     return
                     
-                # Get ship counts from game data
-                requester_data = json.loads(requester.game_data)
-                current_user_data = json.loads(current_user.game_data)
-                
-                requester_ships = requester_data.get('ships', {'fighters': 0, 'capital_ships': 0})
-                current_user_ships = current_user_data.get('ships', {'fighters': 0, 'capital_ships': 0})
+                # Get ship counts for both players
+                ships = load_ships([requester, current_user])
+                requester_ships = ships[requester_id]
+                current_user_ships = ships[current_user.id]
                 
                 # Create response data for each player
                 requester_data = {
@@ -339,22 +1175,13 @@ def handle_accept_battle(data):
                 socketio.emit('battle_accepted', requester_data, room=active_users[requester_id])
                 emit('battle_accepted', acceptor_data)
                 
-                # Set timeout to check if both players become ready
-                def check_readiness():
-                    if battle_room_id in combat_rooms:
-                        battle_info = combat_rooms[battle_room_id]
-                        if not (battle_info.get('player1_ready') and battle_info.get('player2_ready')):
-                            # Not all players are ready after timeout, notify both
-                            socketio.emit('combat_timeout', {
-                                'message': 'Opponent failed to initialize combat properly'
-                            }, room=battle_room_id)
-                
-                # Schedule readiness check after 10 seconds
-                socketio.sleep(10)
-                check_readiness()
+                # Check that both players become ready (cancelled by combat_ready once they are)
+                timers.schedule(('battle_ready', battle_room_id), battle_timeouts['ready'],
+                                check_battle_readiness, battle_room_id)
                 
                 # Clean up pending request
-                pending_battles.pop(current_user.id, None)
+                pending_battles.pop(current_user.id)
+                timers.cancel(('battle_request', current_user.id))
                 
         except Exception as e:
             print(f"Error handling battle acceptance: {e}")
@@ -383,8 +1210,8 @@ def handle_decline_battle(data):
                 }, room=active_users[requester_id])
                 
             # Clean up pending request
-            if current_user.id in pending_battles:
-                pending_battles.pop(current_user.id, None)
+            pending_battles.pop(current_user.id)
+            timers.cancel(('battle_request', current_user.id))
                 
         except Exception as e:
             print(f"Error handling battle decline: {e}")
@@ -411,10 +1238,10 @@ def handle_join_combat(data):
             print(f"User {current_user.id} joined combat room {battle_room_id}")
             
             # Check if this battle room exists in combat_rooms
-            if battle_room_id in combat_rooms:
+            battle_info = combat_rooms.get(battle_room_id)
+            if battle_info is not None:
                 # If both players have already joined, re-send the battle_accepted event
                 # to ensure the client gets it even if they reconnect
-                battle_info = combat_rooms[battle_room_id]
                 if battle_info['status'] == 'active':
                     # Get app context for database queries
                     from flask import current_app
@@ -428,12 +1255,10 @@ def handle_join_combat(data):
                         # Get opponent info
                         opponent = User.query.get(opponent_id)
                         if opponent:
-                            # Get game data for ships
-                            current_user_data = json.loads(current_user.game_data)
-                            opponent_data = json.loads(opponent.game_data)
-                            
-                            current_user_ships = current_user_data.get('ships', {'fighters': 0, 'capital_ships': 0})
-                            opponent_ships = opponent_data.get('ships', {'fighters': 0, 'capital_ships': 0})
+                            # Get ship counts for both players
+                            ships = load_ships([current_user, opponent])
+                            current_user_ships = ships[current_user.id]
+                            opponent_ships = ships[opponent_id]
                             
                             # Re-emit battle_accepted event
                             emit('battle_accepted', {
@@ -463,21 +1288,26 @@ def handle_combat_ready(data):
             battle_room = data['battle_room']
             
             # Verify this is a valid battle room
-            if battle_room not in combat_rooms:
+            battle_info = combat_rooms.get(battle_room)
+            if battle_info is None:
                 return
                 
             # Verify user is part of this battle
-            battle_info = combat_rooms[battle_room]
             if current_user.id not in [battle_info['player1'], battle_info['player2']]:
                 return
                 
             # Mark this player as ready
             player_key = 'player1_ready' if current_user.id == battle_info['player1'] else 'player2_ready'
-            combat_rooms[battle_room][player_key] = True
+            battle_info = combat_rooms.update(battle_room, {player_key: True})
+            if battle_info is None:
+                return
+            
+            touch_battle(battle_room, battle_info)
             
             # Check if both players are ready
-            if combat_rooms[battle_room].get('player1_ready') and combat_rooms[battle_room].get('player2_ready'):
-                # Both players are ready, notify them
+            if battle_info.get('player1_ready') and battle_info.get('player2_ready'):
+                # Both players are ready, stop the readiness timeout and notify them
+                timers.cancel(('battle_ready', battle_room))
                 socketio.emit('combat_synchronized', {
                     'battle_room': battle_room,
                     'status': 'ready'
@@ -508,14 +1338,16 @@ def handle_ship_move(data):
             battle_room = data['battle_room']
             
             # Verify this is a valid battle room
-            if battle_room not in combat_rooms:
+            battle_info = combat_rooms.get(battle_room)
+            if battle_info is None:
                 return
                 
             # Verify user is part of this battle
-            battle_info = combat_rooms[battle_room]
             if current_user.id not in [battle_info['player1'], battle_info['player2']]:
                 return
                 
+            touch_battle(battle_room, battle_info)
+            
             # Get opponent ID
             opponent_id = battle_info['player1'] if current_user.id == battle_info['player2'] else battle_info['player2']
             
@@ -543,14 +1375,16 @@ def handle_ship_attack(data):
             battle_room = data['battle_room']
             
             # Verify this is a valid battle room
-            if battle_room not in combat_rooms:
+            battle_info = combat_rooms.get(battle_room)
+            if battle_info is None:
                 return
                 
             # Verify user is part of this battle
-            battle_info = combat_rooms[battle_room]
             if current_user.id not in [battle_info['player1'], battle_info['player2']]:
                 return
                 
+            touch_battle(battle_room, battle_info)
+            
             # Forward the attack to the battle room
             socketio.emit('opponent_attack', {
                 'attacker_id': data['attacker_id'],
@@ -575,27 +1409,22 @@ def handle_end_battle(data):
             battle_room = data['battle_room']
             
             # Verify this is a valid battle room
-            if battle_room not in combat_rooms:
+            battle_info = combat_rooms.get(battle_room)
+            if battle_info is None:
                 return
                 
             # Verify user is part of this battle
-            battle_info = combat_rooms[battle_room]
             if current_user.id not in [battle_info['player1'], battle_info['player2']]:
                 return
                 
-            # Get opponent ID
-            opponent_id = battle_info['player1'] if current_user.id == battle_info['player2'] else battle_info['player2']
-            
-            # Mark battle as ended
-            combat_rooms[battle_room]['status'] = 'ended'
-            combat_rooms[battle_room]['end_time'] = datetime.utcnow().isoformat()
-            combat_rooms[battle_room]['winner'] = data.get('winner')
-            
             # Notify both players
             socketio.emit('battle_ended', {
                 'winner': data.get('winner'),
                 'result': data.get('result', 'unknown')
             }, room=battle_room)
+            
+            # The battle is over: drop its room and timeouts
+            close_battle(battle_room)
                 
         except Exception as e:
             print(f"Error handling end battle: {e}")
@@ -624,12 +1453,13 @@ def handle_cancel_battle(data):
                 }, room=active_users[opponent_id])
             
             # Clean up any pending battle
-            if opponent_id in pending_battles and pending_battles[opponent_id]['requester_id'] == current_user.id:
-                pending_battles.pop(opponent_id, None)
+            pending_battle = pending_battles.get(opponent_id)
+            if pending_battle is not None and pending_battle['requester_id'] == current_user.id:
+                pending_battles.pop(opponent_id)
+                timers.cancel(('battle_request', opponent_id))
                 
-            # Clean up combat room if it exists
-            if battle_room_id in combat_rooms:
-                combat_rooms.pop(battle_room_id, None)
+            # Clean up combat room and its timeouts if it exists
+            close_battle(battle_room_id)
                 
         except Exception as e:
             print(f"Error handling battle cancellation: {e}")
@@ -0,0 +1,206 @@
+import threading
+from collections import OrderedDict
+
+from flask_app import codec, schema, worldgen
+
+class CachedState:
+    """Parsed game data for one user, with what's needed to accrue it without the User row"""
+    __slots__ = ('data', 'faction', 'username', 'size', 'saved')
+    
+    def __init__(self, data, faction, username, size, saved=False):
+        self.data = data
+        self.faction = faction
+        self.username = username
+        self.size = size
+        # Whether a save replaced the data since the last flush, as opposed
+        # to only balances changing, so the flush rewrites the world rows
+        self.saved = saved
+
+class GameStateCache:
+    """
+    Write-behind cache of parsed game_data for online users
+    
+    Handlers read and mutate the cached dict instead of parsing, dumping
+    and committing game_data on every event. Changed entries are marked
+    dirty and written back in batches by flush(), which the resource tick
+    calls every flush interval and the server calls on disconnect and
+    shutdown. Once the estimated size of all entries passes the memory
+    budget the least recently used entries are evicted; dirty ones are
+    kept aside until the next flush so nothing is lost.
+    """
+    
+    def __init__(self, memory_budget=64 * 1024 * 1024):
+        self.memory_budget = memory_budget
+        self._entries = OrderedDict()
+        self._dirty = set()
+        self._evicted = {}
+        self._size = 0
+        self._lock = threading.RLock()
+        
+        # Counters for server stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writes = 0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def __contains__(self, user_id):
+        return user_id in self._entries
+    
+    def get(self, user_id):
+        """Get a user's cached state, or None if it isn't cached"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                # Entries evicted before they were flushed are still the newest state
+                entry = self._evicted.pop(user_id, None)
+                if entry is None:
+                    self.misses += 1
+                    return None
+                self._insert(user_id, entry)
+                self._dirty.add(user_id)
+                self._evict()
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry
+    
+    def load(self, user):
+        """Get a user's cached state, parsing it from their game_data on a miss"""
+        entry = self.get(user.id)
+        if entry is not None:
+            return entry
+        
+        raw = user.game_data_text()
+        data = worldgen.expand_world(codec.loads(raw))
+        # Data from an older schema is upgraded once and written on the next flush
+        upgraded = schema.upgrade_game_data(data)
+        entry = CachedState(data, user.faction, user.username, len(raw), saved=upgraded)
+        with self._lock:
+            self._insert(user.id, entry)
+            if upgraded:
+                self._dirty.add(user.id)
+            self._evict()
+        return entry
+    
+    def put(self, user, data, size=None):
+        """
+        Replace a user's cached state and mark it dirty
+        
+        Args:
+            user: User the data belongs to
+            data: Parsed game data
+            size: Serialized size if known (defaults to the previous estimate)
+        """
+        with self._lock:
+            previous = self._entries.get(user.id) or self._evicted.pop(user.id, None)
+            if size is None:
+                size = previous.size if previous is not None else len(codec.dumps(data))
+            self._insert(user.id, CachedState(data, user.faction, user.username, size, saved=True))
+            self._dirty.add(user.id)
+            self._evict()
+    
+    def mark_dirty(self, user_id):
+        """Flag a cached entry that was changed in place"""
+        with self._lock:
+            if user_id in self._entries:
+                self._dirty.add(user_id)
+    
+    def discard(self, user_id):
+        """Drop a user's cached state without writing it (e.g. after a reset or delete)"""
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry is not None:
+                self._size -= entry.size
+            self._evicted.pop(user_id, None)
+            self._dirty.discard(user_id)
+    
+    def _insert(self, user_id, entry):
+        previous = self._entries.pop(user_id, None)
+        if previous is not None:
+            self._size -= previous.size
+        self._entries[user_id] = entry
+        self._size += entry.size
+    
+    def _resize(self, user_id, entry, size):
+        """Replace an entry's size estimate with its real serialized size"""
+        with self._lock:
+            if self._entries.get(user_id) is entry:
+                self._size += size - entry.size
+            entry.size = size
+    
+    def _evict(self):
+        """Evict least recently used entries until under the memory budget"""
+        while self._size > self.memory_budget and len(self._entries) > 1:
+            user_id, entry = self._entries.popitem(last=False)
+            self._size -= entry.size
+            self.evictions += 1
+            if user_id in self._dirty:
+                self._dirty.discard(user_id)
+                self._evicted[user_id] = entry
+    
+    def flush(self, user_ids=None, chunk_size=500):
+        """
+        Write dirty entries back to game_data with one commit per chunk
+        
+        Args:
+            user_ids: Users to flush (defaults to every dirty entry)
+            chunk_size: Maximum number of users loaded and committed together
+        
+        Returns:
+            Number of users written
+        """
+        from flask_app import db
+        from flask_app.models.user import User
+        
+        with self._lock:
+            pending = dict(self._evicted)
+            self._evicted.clear()
+            dirty = self._dirty if user_ids is None else self._dirty.intersection(user_ids)
+            for user_id in dirty:
+                pending[user_id] = self._entries[user_id]
+            self._dirty.difference_update(dirty)
+        
+        user_ids = list(pending.keys())
+        written = 0
+        
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            try:
+                for user in User.query.filter(User.id.in_(chunk)).all():
+                    entry = pending[user.id]
+                    raw = user.write_game_data(entry.data, balances_only=not entry.saved)
+                    self._resize(user.id, entry, len(raw))
+                db.session.commit()
+                for user_id in chunk:
+                    pending[user_id].saved = False
+                written += len(chunk)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error flushing cached game state for {len(chunk)} users: {e}")
+                
+                # Keep the entries dirty so the next flush retries them
+                with self._lock:
+                    for user_id in chunk:
+                        if user_id in self._entries:
+                            self._dirty.add(user_id)
+                        else:
+                            self._evicted.setdefault(user_id, pending[user_id])
+        
+        self.writes += written
+        return written
+    
+    def stats(self):
+        """Get entry counts, estimated memory use and hit/miss counters"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'dirty': len(self._dirty) + len(self._evicted),
+                'memory_bytes': self._size,
+                'memory_budget': self.memory_budget,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'writes': self.writes
+            }
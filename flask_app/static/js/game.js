@@ -6,6 +6,7 @@ import { GameUI } from './ui.js';
 import { ShipBuilder } from './shipBuilder.js';
 import { shipsDisplay } from './loaders/theatre.js';
 import { PlanetMaterialGenerator } from './materials/planetMaterial.js';
+import { cloneState, diffState } from './jsonPatch.js';
 const materialGenerator = new PlanetMaterialGenerator();
 
 let theatre = false;
@@ -54,6 +55,14 @@ class MassGravity {
         
         // Store reference to gameState
         this.gameState = gameState;
+        
+        // Last state the server confirmed and its version, so saves can be sent as patches
+        this.savedState = null;
+        this.stateVersion = null;
+        // Snapshots of saves sent over Socket.IO that haven't been answered yet
+        this.pendingSaves = [];
+        // Resend of a save dropped by the server's rate limit, if one is scheduled
+        this.saveRetryTimer = null;
 
         // Try to load game data and settings first
         Promise.all([
@@ -148,6 +157,8 @@ class MassGravity {
                 gameState = data;
                 window.gameState = gameState; // Update global reference
                 this.gameState = gameState; // Update instance reference
+                this.savedState = cloneState(data);
+                this.stateVersion = data.state_version ?? null;
                 console.log("Game loaded successfully");
                 
                 // Update the resource display
@@ -276,32 +287,61 @@ class MassGravity {
                 });
             }
             
+            // Send only what changed since the last confirmed save when there is one
+            const snapshot = cloneState(gameState);
+            const patch = this.savedState && this.stateVersion !== null
+                ? diffState(this.savedState, snapshot)
+                : null;
+            
             // Use Socket.IO to save the game
             if (window.socket) {
-                console.log("Saving game via Socket.IO");
-                window.socket.emit('save_game', gameState);
+                this.pendingSaves.push(snapshot);
+                if (patch) {
+                    console.log(`Saving game via Socket.IO (${patch.length} changes)`);
+                    window.socket.emit('save_game_patch', { base_version: this.stateVersion, patch });
+                } else {
+                    console.log("Saving game via Socket.IO");
+                    window.socket.emit('save_game', gameState);
+                }
             } else {
                 console.warn("Socket.IO not available, falling back to HTTP API");
                 
                 // Fallback to HTTP API
-                const response = await fetch('/api/save_game', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify(gameState)
-                });
+                let response = null;
+                if (patch) {
+                    response = await fetch('/api/save_game', {
+                        method: 'PATCH',
+                        headers: {
+                            'Content-Type': 'application/json'
+                        },
+                        body: JSON.stringify({ base_version: this.stateVersion, patch })
+                    });
+                    
+                    if (response.status === 409) {
+                        console.log("Saved game changed on the server, sending a full save");
+                        response = null;
+                    }
+                }
+                
+                if (!response) {
+                    response = await fetch('/api/save_game', {
+                        method: 'POST',
+                        headers: {
+                            'Content-Type': 'application/json'
+                        },
+                        body: JSON.stringify(gameState)
+                    });
+                }
                 
                 const result = await response.json();
                 if (result.success) {
                     console.log("Game saved successfully via HTTP API");
+                    this.saveAcknowledged(snapshot, result);
                     
                     // If server returned updated data (after mining calculations), use it
                     if (result.updated_data) {
                         console.log("Received updated game data from server");
-                        gameState = result.updated_data;
-                        window.gameState = gameState; // Update global reference
-                        this.gameState = gameState; // Update instance reference
+                        Object.assign(gameState, result.updated_data);
                         this.updateResourceDisplay();
                     }
                     
@@ -314,6 +354,41 @@ class MassGravity {
         }
     }
     
+    // Remember the state the server stored so the next save can be a patch against it
+    saveAcknowledged(snapshot, response) {
+        this.savedState = Object.assign(snapshot, cloneState(response.updated_data || {}));
+        this.stateVersion = response.state_version ?? null;
+    }
+    
+    // Socket.IO save responses arrive in the order the saves were sent
+    socketSaveSucceeded(response) {
+        const snapshot = this.pendingSaves.shift();
+        if (snapshot) {
+            this.saveAcknowledged(snapshot, response);
+        }
+    }
+    
+    socketSaveFailed(response = {}) {
+        this.pendingSaves.shift();
+        
+        // A rate limited save was dropped, so send the newest state again once the limit allows
+        if (response.rate_limited && !this.saveRetryTimer) {
+            const delay = Math.max(response.retry_after ?? 1, 0.5) * 1000;
+            this.saveRetryTimer = setTimeout(() => {
+                this.saveRetryTimer = null;
+                this.saveGame();
+            }, delay);
+        }
+    }
+    
+    // The server's state isn't the patch base any more, so send everything
+    socketSaveConflicted() {
+        this.pendingSaves.shift();
+        this.savedState = null;
+        this.stateVersion = null;
+        this.saveGame();
+    }
+    
     // Helper method to show save notification
     showSaveNotification() {
         const notification = document.createElement('div');
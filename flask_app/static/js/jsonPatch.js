@@ -0,0 +1,43 @@
+// JSON Patch (RFC 6902) helpers for incremental game saves
+
+// Deep copy of a JSON-compatible value
+export function cloneState(value) {
+    return JSON.parse(JSON.stringify(value));
+}
+
+// Escape a key for use in a JSON Pointer
+function escapeToken(key) {
+    return String(key).replace(/~/g, '~0').replace(/\//g, '~1');
+}
+
+function isObject(value) {
+    return value !== null && typeof value === 'object' && !Array.isArray(value);
+}
+
+// Build the operations that turn `before` into `after`
+// Arrays that changed length are replaced whole rather than diffed element by element
+export function diffState(before, after, path = '', patch = []) {
+    if (Array.isArray(before) && Array.isArray(after) && before.length === after.length) {
+        after.forEach((value, index) => diffState(before[index], value, `${path}/${index}`, patch));
+    } else if (isObject(before) && isObject(after)) {
+        Object.keys(before).forEach(key => {
+            if (!(key in after) || after[key] === undefined) {
+                patch.push({ op: 'remove', path: `${path}/${escapeToken(key)}` });
+            }
+        });
+        Object.keys(after).forEach(key => {
+            if (after[key] === undefined) {
+                return;
+            }
+            const childPath = `${path}/${escapeToken(key)}`;
+            if (!(key in before) || before[key] === undefined) {
+                patch.push({ op: 'add', path: childPath, value: after[key] });
+            } else {
+                diffState(before[key], after[key], childPath, patch);
+            }
+        });
+    } else if (JSON.stringify(before) !== JSON.stringify(after)) {
+        patch.push({ op: 'replace', path, value: after });
+    }
+    return patch;
+}
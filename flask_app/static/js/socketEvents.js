@@ -4,6 +4,14 @@ const socket = io();
 // Store battle request info
 let currentBattleRequest = null;
 
+// Online players by ID, kept up to date with presence deltas while the players panel is open
+const onlinePlayers = new Map();
+// Roster epoch and version last applied (null until the first presence_sync)
+let presenceEpoch = null;
+let presenceVersion = null;
+// Our own user ID, left out of the players list
+let selfId = null;
+
 // Connection status handlers
 socket.on('connect', function() {
     const statusDiv = document.getElementById('connection-status');
@@ -11,11 +19,16 @@ socket.on('connect', function() {
     statusDiv.innerHTML = '<div class="indicator"></div><span>Connected</span>';
     console.log('Socket connected');
 
-    // Request active players list
-    socket.emit('get_active_players');
+    // Rejoin the lobby after a reconnect, catching up from the last version seen
+    if (playersPanelOpen()) {
+        joinLobby();
+    }
 });
 
 socket.on('disconnect', function() {
+    // The server starts over with a keyframe on reconnect
+    resourceState = null;
+
     const statusDiv = document.getElementById('connection-status');
     statusDiv.className = 'disconnected';
     statusDiv.innerHTML = '<div class="indicator"></div><span>Disconnected</span>';
@@ -34,6 +47,59 @@ socket.on('active_players_list', function(data) {
     updatePlayersList(data.players);
 });
 
+function playersPanelOpen() {
+    return document.getElementById('players-panel').style.display !== 'none';
+}
+
+// Follow roster changes, asking only for what changed since the version we have
+function joinLobby() {
+    socket.emit('join_lobby', { epoch: presenceEpoch, version: presenceVersion });
+}
+
+function applyPresenceDelta(delta) {
+    if (delta.op === 'join') {
+        onlinePlayers.set(delta.player.id, delta.player);
+    } else {
+        onlinePlayers.delete(delta.player.id);
+    }
+    presenceVersion = delta.version;
+}
+
+function renderOnlinePlayers() {
+    updatePlayersList(Array.from(onlinePlayers.values()).filter(player => player.id !== selfId));
+}
+
+// Full roster or the deltas missed since the version we sent
+socket.on('presence_sync', function(data) {
+    selfId = data.self_id;
+    if (data.players) {
+        onlinePlayers.clear();
+        data.players.forEach(player => onlinePlayers.set(player.id, player));
+        presenceEpoch = data.epoch;
+        presenceVersion = data.version;
+    } else {
+        data.deltas
+            .filter(delta => delta.version > presenceVersion)
+            .forEach(applyPresenceDelta);
+    }
+    renderOnlinePlayers();
+});
+
+// A player came online or went offline
+socket.on('presence_delta', function(delta) {
+    // Ignore deltas until synced, and ones the sync already covered
+    if (presenceVersion === null || delta.version <= presenceVersion) {
+        return;
+    }
+    if (delta.version !== presenceVersion + 1) {
+        // Missed some: catch up from the last version applied
+        joinLobby();
+        return;
+    }
+    applyPresenceDelta(delta);
+    renderOnlinePlayers();
+});
+
 // Battle request handlers
 socket.on('battle_request', function(data) {
     // Store request data
@@ -65,6 +131,18 @@ socket.on('battle_declined', function(data) {
     showNotification(`${data.opponent_name} declined your battle request.`, 'error');
 });
 
+socket.on('battle_request_expired', function(data) {
+    if (data.from_id !== undefined) {
+        // A request we didn't answer in time
+        if (currentBattleRequest && currentBattleRequest.from_id === data.from_id) {
+            document.getElementById('battle-request-modal').style.display = 'none';
+            currentBattleRequest = null;
+        }
+    } else {
+        showNotification(`${data.target_name} didn't answer your battle request.`, 'error');
+    }
+});
+
 socket.on('battle_response_error', function(data) {
     showNotification(data.message, 'error');
 });
@@ -74,10 +152,11 @@ document.getElementById('toggle-players-panel').addEventListener('click', functi
     const panel = document.getElementById('players-panel');
     if (panel.style.display === 'none') {
         panel.style.display = 'block';
-        // Request updated player list
-        socket.emit('get_active_players');
+        // Catch up on the players list and follow changes while the panel is open
+        joinLobby();
     } else {
         panel.style.display = 'none';
+        socket.emit('leave_lobby');
     }
 });
 
@@ -103,7 +182,9 @@ document.getElementById('decline-battle').addEventListener('click', function() {
 
 // Refresh players list button
 document.getElementById('refresh-players').addEventListener('click', function() {
-    socket.emit('get_active_players');
+    // Ask for the full roster
+    presenceVersion = null;
+    joinLobby();
 });
 
 // Function to update the players list
@@ -170,10 +251,62 @@ function updatePlayersList(players) {
     });
 }
 
-// Resource update handler from server
+// Last full resource state received from the server, used to apply deltas
+let resourceState = null;
+// Sequence number expected on the next resource delta
+let expectedDeltaSeq = 1;
+
+// Apply a nested object of changed values onto the target
+function mergeResourceChanges(target, changed) {
+    Object.keys(changed).forEach(key => {
+        const value = changed[key];
+        if (value && typeof value === 'object' && !Array.isArray(value) &&
+            target[key] && typeof target[key] === 'object' && !Array.isArray(target[key])) {
+            mergeResourceChanges(target[key], value);
+        } else {
+            target[key] = value;
+        }
+    });
+}
+
+// Resource update handler from server (full keyframe)
 socket.on('resource_update', function(data) {
     console.log('Resource update received:', data);
 
+    // Keep the keyframe as the base for following deltas
+    resourceState = data;
+    expectedDeltaSeq = 1;
+
+    applyResourceUpdate(resourceState);
+});
+
+// Resource delta handler from server (only changed fields)
+socket.on('resource_delta', function(delta) {
+    // Without the matching base state the delta can't be applied, so ask for a keyframe
+    if (!resourceState || delta.seq !== expectedDeltaSeq) {
+        console.warn('Resource delta out of sequence, requesting resync');
+        resourceState = null;
+        socket.emit('request_resync');
+        return;
+    }
+
+    mergeResourceChanges(resourceState, delta.changed);
+    delta.removed.forEach(path => {
+        let parent = resourceState;
+        for (let i = 0; i < path.length - 1 && parent; i++) {
+            parent = parent[path[i]];
+        }
+        if (parent) {
+            delete parent[path[path.length - 1]];
+        }
+    });
+    expectedDeltaSeq = delta.seq + 1;
+
+    applyResourceUpdate(resourceState);
+});
+
+// Update the game state and resource display from server resource data
+function applyResourceUpdate(data) {
     // Update game state with server data
     if (window.gameState) {
         // Update resources
@@ -200,12 +333,16 @@ socket.on('resource_update', function(data) {
             updateDOMResourceDisplay(data);
         }
     }
-});
+}
 
 // Save game response handler
 socket.on('save_success', function(response) {
     console.log('Save success:', response);
 
+    if (window.massGravity) {
+        window.massGravity.socketSaveSucceeded(response);
+    }
+
     if (response.updated_data) {
         // Update game state with returned data
         if (window.gameState) {
@@ -223,8 +360,19 @@ socket.on('save_success', function(response) {
     showNotification('Game saved successfully');
 });
 
+socket.on('save_conflict', function(response) {
+    // A patch save didn't match the server's state, resend the whole game
+    console.log('Save conflict, sending a full save:', response.message);
+    if (window.massGravity) {
+        window.massGravity.socketSaveConflicted();
+    }
+});
+
 socket.on('save_error', function(response) {
     console.error('Save error:', response);
+    if (window.massGravity) {
+        window.massGravity.socketSaveFailed(response);
+    }
     showNotification('Error saving game: ' + response.message, 'error');
 });
 
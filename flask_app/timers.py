@@ -0,0 +1,149 @@
+import heapq
+import itertools
+import threading
+import time
+
+class TimerService:
+    """
+    Heap-based one-shot timers run by a single background task
+    
+    Timers are keyed so scheduling a key again replaces its timer and
+    cancelling is a dictionary delete. Callbacks run on the timer task, so
+    they should be quick and do their own error handling beyond what's
+    logged here.
+    """
+    
+    def __init__(self, start_task=None):
+        """
+        Args:
+            start_task: Starts the timer loop in the background, e.g.
+                socketio.start_background_task (a daemon thread by default)
+        """
+        self._start_task = start_task or self._start_thread
+        self._task = None
+        
+        # Heap of (due, seq, key); self._entries maps key -> (due, seq, callback, args)
+        # and heap entries that don't match it are stale and skipped when popped
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        
+        self.fired = 0
+        self.cancelled = 0
+        self.errors = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def __contains__(self, key):
+        return key in self._entries
+    
+    @staticmethod
+    def _start_thread(target):
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        return thread
+    
+    def schedule(self, key, delay, callback, *args, now=None):
+        """
+        Call callback(*args) in `delay` seconds, replacing any timer for key
+        """
+        now = time.monotonic() if now is None else now
+        due = now + delay
+        with self._lock:
+            seq = next(self._counter)
+            self._entries[key] = (due, seq, callback, args)
+            heapq.heappush(self._heap, (due, seq, key))
+            
+            # Cancelled and replaced timers leave stale heap entries behind;
+            # rebuild once they outnumber the live ones
+            if len(self._heap) > 2 * len(self._entries) + 64:
+                self._heap = [(due, seq, key) for key, (due, seq, _, _) in self._entries.items()]
+                heapq.heapify(self._heap)
+            
+            if self._task is None:
+                self._task = self._start_task(self._run)
+            earliest = self._heap[0][1] == seq
+        
+        # Wake the loop if it is sleeping past this timer
+        if earliest:
+            self._wakeup.set()
+    
+    def cancel(self, key):
+        """
+        Cancel the timer for key
+        
+        Returns:
+            True if there was one
+        """
+        with self._lock:
+            if self._entries.pop(key, None) is None:
+                return False
+            self.cancelled += 1
+            return True
+    
+    def pop_due(self, now=None):
+        """
+        Remove every timer that is due
+        
+        Returns:
+            List of (callback, args) in due order
+        """
+        now = time.monotonic() if now is None else now
+        due_timers = []
+        
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due, seq, key = heapq.heappop(self._heap)
+                entry = self._entries.get(key)
+                if entry is None or entry[1] != seq:
+                    continue
+                
+                del self._entries[key]
+                due_timers.append((entry[2], entry[3]))
+                self.last_lag = now - due
+                self.max_lag = max(self.max_lag, self.last_lag)
+        
+        return due_timers
+    
+    def _next_delay(self, now):
+        """Seconds until the earliest timer, or None if there are none"""
+        with self._lock:
+            while self._heap:
+                due, seq, key = self._heap[0]
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] == seq:
+                    break
+                heapq.heappop(self._heap)
+            return max(self._heap[0][0] - now, 0) if self._heap else None
+    
+    def _run(self):
+        while True:
+            for callback, args in self.pop_due():
+                self.fired += 1
+                try:
+                    callback(*args)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Error in timer {getattr(callback, '__name__', callback)}: {e}")
+            
+            # Sleep until the earliest timer or until an earlier one is scheduled
+            self._wakeup.wait(self._next_delay(time.monotonic()))
+            self._wakeup.clear()
+    
+    def stats(self):
+        """Get the number of pending timers, fired/cancelled totals and lag"""
+        with self._lock:
+            return {
+                'timers': len(self._entries),
+                'heap_size': len(self._heap),
+                'fired': self.fired,
+                'cancelled': self.cancelled,
+                'errors': self.errors,
+                'lag': self.last_lag,
+                'max_lag': self.max_lag
+            }
@@ -0,0 +1,81 @@
+import threading
+import time
+
+class UserCache:
+    """
+    Short-lived cache of logged in users' identity columns
+    
+    Flask-Login loads the user on every HTTP request and every Socket.IO
+    event. Entries hold plain column values rather than ORM objects (those
+    are bound to one session), expire after `ttl` seconds and are dropped
+    as soon as a commit changes or deletes the user.
+    """
+    
+    def __init__(self, ttl=30.0, max_size=10000):
+        """
+        Args:
+            ttl: Seconds an entry is used before the user is loaded again
+            max_size: Entries kept before the oldest are dropped
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        
+        # user_id -> (expires, values), oldest first
+        self._entries = {}
+        self._lock = threading.Lock()
+        
+        # Counters for server stats
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def get(self, user_id, now=None):
+        """Get a user's cached column values, or None if they aren't cached or have expired"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, user_id, values, now=None):
+        """Cache a freshly loaded user's column values"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._entries.pop(user_id, None)
+            while len(self._entries) >= self.max_size:
+                del self._entries[next(iter(self._entries))]
+            self._entries[user_id] = (now + self.ttl, values)
+    
+    def invalidate(self, user_ids):
+        """Drop users whose row changed"""
+        with self._lock:
+            for user_id in user_ids:
+                if self._entries.pop(user_id, None) is not None:
+                    self.invalidations += 1
+    
+    def stats(self):
+        """Get the cache size and hit counters"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations
+            }
+
+# Cache used by the user loader, set by init_app() (None when USER_CACHE_TTL is 0)
+cache = None
+
+def init_app(app):
+    """Create the user cache from app config"""
+    global cache
+    ttl = app.config.get('USER_CACHE_TTL', 30)
+    cache = UserCache(ttl, app.config.get('USER_CACHE_SIZE', 10000)) if ttl > 0 else None
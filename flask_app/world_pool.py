@@ -0,0 +1,132 @@
+import threading
+from collections import deque
+
+from flask_app import worldgen
+
+class WorldPool:
+    """
+    Bounded pool of pre-generated starting systems
+    
+    A background worker keeps up to `size` systems generated for the
+    current GameSettings planet range, so registering only has to claim one.
+    Systems generated for an old range are discarded when claimed, and an
+    empty pool falls back to generating inline.
+    """
+    
+    def __init__(self, size=32):
+        self.size = size
+        self._systems = deque()
+        self._lock = threading.Lock()
+        self._wanted = threading.Event()
+        self._worker = None
+        
+        # Counters for server stats
+        self.generated = 0
+        self.claimed = 0
+        self.misses = 0
+        self.discarded = 0
+    
+    def __len__(self):
+        return len(self._systems)
+    
+    def claim(self, min_planets, max_planets):
+        """
+        Take a starting system with a planet count in range
+        
+        Returns:
+            A starting system, or None if the pool has none (the caller generates one)
+        """
+        with self._lock:
+            while self._systems:
+                system = self._systems.popleft()
+                if min_planets <= system["num_planets"] <= max_planets:
+                    self.claimed += 1
+                    self._wanted.set()
+                    return system
+                self.discarded += 1
+            self.misses += 1
+        self._wanted.set()
+        return None
+    
+    def fill(self, min_planets, max_planets):
+        """
+        Generate systems until the pool is full
+        
+        Returns:
+            Number of systems generated
+        """
+        added = 0
+        while len(self._systems) < self.size:
+            system = worldgen.starting_system(min_planets, max_planets)
+            with self._lock:
+                self._systems.append(system)
+                self.generated += 1
+            added += 1
+        return added
+    
+    def start(self, app, start_task, recheck_interval=5):
+        """
+        Start the refill worker if it isn't running
+        
+        Args:
+            app: Flask app, for the settings lookup
+            start_task: Function that starts a background task (e.g. socketio.start_background_task)
+            recheck_interval: Seconds between refills when nothing was claimed,
+                              so settings changes are picked up
+        """
+        with self._lock:
+            if self._worker is not None:
+                return
+            self._worker = start_task(self._run, app, recheck_interval)
+    
+    def _run(self, app, recheck_interval):
+        from flask_app.models.game_settings import GameSettings
+        
+        while True:
+            self._wanted.clear()
+            try:
+                with app.app_context():
+                    settings = GameSettings.snapshot()
+                    self.fill(*worldgen.planet_range(settings.min_planets, settings.max_planets))
+            except Exception as e:
+                print(f"Error refilling world pool: {e}")
+            self._wanted.wait(recheck_interval)
+    
+    def stats(self):
+        """Get the pool size and claim counters"""
+        with self._lock:
+            return {
+                'available': len(self._systems),
+                'size': self.size,
+                'generated': self.generated,
+                'claimed': self.claimed,
+                'misses': self.misses,
+                'discarded': self.discarded
+            }
+
+# Pool used by registration, set by init_app() (None when WORLD_POOL_SIZE is 0)
+pool = None
+
+def init_app(app):
+    """Create the world pool from app config; its worker starts on the first claim"""
+    global pool
+    size = app.config.get('WORLD_POOL_SIZE', 32)
+    pool = WorldPool(size) if size > 0 else None
+
+def claim_system(settings):
+    """
+    Get a starting system for a new user, from the pool when it has one
+
+    Args:
+        settings: Game settings snapshot with the planet range
+
+    Returns:
+        A starting system, or None for the caller to generate one inline
+    """
+    if pool is None:
+        return None
+    
+    from flask import current_app
+    from flask_app import socketio
+    pool.start(current_app._get_current_object(), socketio.start_background_task)
+    return pool.claim(*worldgen.planet_range(settings.min_planets, settings.max_planets))
@@ -0,0 +1,206 @@
+"""
+Deterministic world generation from a game's seed
+
+A game's planets are generated from its seed with a seeded RNG, so the
+stored game_data only needs the seed, the planet count and a sparse
+overlay of what differs from the generated planets (orbit angles, built
+structures, ...). compact_world() swaps the planet list for that overlay
+before game_data is serialized and expand_world() rebuilds the list after
+it is parsed; generated planet lists are memoized per seed.
+"""
+import functools
+import math
+import random
+
+from flask_app import codec
+
+# Generator used for new overlays. Overlays record the version they were
+# made against, so changing generation means adding a new version.
+GENERATOR_VERSION = 1
+
+PLANET_TYPES = ["Terrestrial", "Gas Giant", "Ice Giant", "Desert", "Ocean"]
+
+def generate_planets_v1(rng, num_planets):
+    planets = []
+    for i in range(num_planets):
+        distance = 80 + i * 50 + rng.randint(0, 20)
+        angle = rng.random() * 2 * math.pi
+        planets.append({
+            "position": {
+                "x": distance * math.cos(angle),
+                "y": (rng.random() - 0.5) * 20,  # slight y-axis variation
+                "z": distance * math.sin(angle)
+            },
+            "orbit": {
+                "distance": distance,
+                "tilt": (rng.random() - 0.5) * 0.2,
+                "angle": angle
+            },
+            "data": {
+                "name": f"Planet {i+1}",
+                "type": rng.choice(PLANET_TYPES),
+                "seed": rng.random() * 1000,
+                "radius": 5 + rng.random() * 10,
+                "resources": {
+                    "minerals": rng.randint(20, 100),
+                    "energy": rng.randint(20, 100),
+                    "water": rng.randint(20, 100)
+                }
+            }
+        })
+    return planets
+
+GENERATORS = {
+    1: generate_planets_v1
+}
+
+# Central star every new system starts with
+STAR = {
+    "id": "star_1",
+    "position": {
+        "x": 0,
+        "y": 0,
+        "z": 0
+    },
+    "data": {
+        "name": "Sol Prime",
+        "type": "Main Sequence",
+        "temperature": 5500,
+        "luminosity": 1.0
+    }
+}
+
+@functools.lru_cache(maxsize=4096)
+def _generated(seed, num_planets, version):
+    """Memoized generated planets and their JSON (parsing it is the fastest way to a fresh copy)"""
+    planets = GENERATORS[version](random.Random(seed), num_planets)
+    return planets, codec.dumps(planets)
+
+def generate_planets(seed, num_planets, version=GENERATOR_VERSION):
+    """Get the planets a seed generates (a fresh copy the caller may change)"""
+    return codec.loads(_generated(seed, num_planets, version)[1])
+
+def planet_range(min_planets, max_planets):
+    """Get a usable (min, max) planet count from the settings (at least one planet, max >= min)"""
+    min_planets = max(1, min_planets or 1)
+    return min_planets, max(min_planets, max_planets or min_planets)
+
+def starting_system(min_planets, max_planets):
+    """
+    Generate the world part of a new game: a seed, its planets and the star
+    
+    Args:
+        min_planets: Fewest planets the system can have
+        max_planets: Most planets the system can have
+    
+    Returns:
+        Dict of seed, num_planets, planets, stars and per-planet building
+        and mining facility maps, to be merged into new game data
+    """
+    num_planets = random.randint(*planet_range(min_planets, max_planets))
+    seed = str(random.random())
+    
+    return {
+        "num_planets": num_planets,
+        "planets": generate_planets(seed, num_planets),
+        "stars": [codec.loads(codec.dumps(STAR))],
+        "seed": seed,
+        "buildings": {f"planet_{i}": [] for i in range(num_planets)},  # Map planet_id -> building data
+        "mining_facilities": {f"planet_{i}": 0 for i in range(num_planets)}  # Map planet_id -> mining facilities count
+    }
+
+def merge_patch(base, target):
+    """
+    Get the RFC 7386 merge patch that turns one dict into another
+    
+    Returns:
+        The patch ({} if they are equal), or None if target can't be
+        expressed as one (it contains nulls, which mean removal in a patch)
+    """
+    patch = {}
+    for key in base:
+        if key not in target:
+            patch[key] = None
+    
+    for key, value in target.items():
+        old = base.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            child = merge_patch(old, value)
+            if child is None:
+                return None
+            if child:
+                patch[key] = child
+            continue
+        
+        # Same type as well as equal, so 1.0 isn't stored as 1 or True as 1
+        if key in base and type(old) is type(value) and old == value and (
+                not isinstance(value, list) or codec.dumps(old) == codec.dumps(value)):
+            continue
+        if _contains_null(value):
+            return None
+        patch[key] = value
+    return patch
+
+def apply_merge_patch(target, patch):
+    """Apply an RFC 7386 merge patch to a dict in place"""
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            apply_merge_patch(target[key], value)
+        else:
+            target[key] = value
+    return target
+
+def _contains_null(value):
+    if value is None:
+        return True
+    if isinstance(value, dict):
+        return any(_contains_null(item) for item in value.values())
+    if isinstance(value, list):
+        return any(_contains_null(item) for item in value)
+    return False
+
+def compact_world(data):
+    """
+    Get the form of parsed game data to store
+    
+    The planet list is replaced by an overlay against the planets the seed
+    generates. Data that can't be compacted (no seed, a planet count that
+    doesn't match, planets that aren't objects or contain nulls) is
+    returned unchanged.
+    
+    Returns:
+        A shallow copy with 'planet_overlay' instead of 'planets', or data itself
+    """
+    planets = data.get("planets")
+    seed = data.get("seed")
+    if not planets or not isinstance(seed, str) or data.get("num_planets") != len(planets):
+        return data
+    
+    overlay = {}
+    generated_planets = _generated(seed, len(planets), GENERATOR_VERSION)[0]
+    for index, (generated, planet) in enumerate(zip(generated_planets, planets)):
+        if not isinstance(planet, dict):
+            return data
+        patch = merge_patch(generated, planet)
+        if patch is None:
+            return data
+        if patch:
+            overlay[str(index)] = patch
+    
+    compact = {key: value for key, value in data.items() if key != "planets"}
+    compact["planet_overlay"] = {"generator": GENERATOR_VERSION, "planets": overlay}
+    return compact
+
+def expand_world(data):
+    """Rebuild the planet list of parsed stored game data in place"""
+    stored = data.pop("planet_overlay", None)
+    if stored is None:
+        return data
+    
+    planets = generate_planets(data["seed"], data["num_planets"], stored["generator"])
+    for index, patch in stored["planets"].items():
+        apply_merge_patch(planets[int(index)], patch)
+    data["planets"] = planets
+    return data
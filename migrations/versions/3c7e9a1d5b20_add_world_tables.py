@@ -0,0 +1,97 @@
+"""Add planet, facility, fleet and balance tables
+
+Revision ID: 3c7e9a1d5b20
+Revises: ff4da29d09af
+Create Date: 2026-10-17 09:12:44.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c7e9a1d5b20'
+down_revision = 'ff4da29d09af'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('planet',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('planet_key', sa.String(length=64), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=64), nullable=True),
+        sa.Column('planet_type', sa.String(length=32), nullable=True),
+        sa.Column('x', sa.Float(), nullable=True),
+        sa.Column('y', sa.Float(), nullable=True),
+        sa.Column('z', sa.Float(), nullable=True),
+        sa.Column('minerals', sa.Float(), nullable=True),
+        sa.Column('energy', sa.Float(), nullable=True),
+        sa.Column('water', sa.Float(), nullable=True),
+        sa.Column('extra', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('planet', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_planet_user_id'), ['user_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_planet_planet_type'), ['planet_type'], unique=False)
+        batch_op.create_index('ix_planet_user_key', ['user_id', 'planet_key'], unique=False)
+
+    op.create_table('facility',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('planet_key', sa.String(length=64), nullable=False),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('facility', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_facility_user_id'), ['user_id'], unique=False)
+        batch_op.create_index('ix_facility_kind_user', ['kind', 'user_id'], unique=False)
+
+    op.create_table('fleet',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('fighters', sa.Integer(), nullable=False),
+        sa.Column('capital_ships', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+    op.create_table('balance',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('resources', sa.Float(), nullable=False),
+        sa.Column('research_points', sa.Float(), nullable=False),
+        sa.Column('population', sa.Float(), nullable=False),
+        sa.Column('blue', sa.Float(), nullable=False),
+        sa.Column('red', sa.Float(), nullable=False),
+        sa.Column('green', sa.Float(), nullable=False),
+        sa.Column('last_updated', sa.String(length=32), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    with op.batch_alter_table('balance', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_balance_resources'), ['resources'], unique=False)
+
+    # Existing game_data is copied into these tables with `flask world backfill`
+
+
+def downgrade():
+    with op.batch_alter_table('balance', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_balance_resources'))
+    op.drop_table('balance')
+
+    op.drop_table('fleet')
+
+    with op.batch_alter_table('facility', schema=None) as batch_op:
+        batch_op.drop_index('ix_facility_kind_user')
+        batch_op.drop_index(batch_op.f('ix_facility_user_id'))
+    op.drop_table('facility')
+
+    with op.batch_alter_table('planet', schema=None) as batch_op:
+        batch_op.drop_index('ix_planet_user_key')
+        batch_op.drop_index(batch_op.f('ix_planet_planet_type'))
+        batch_op.drop_index(batch_op.f('ix_planet_user_id'))
+    op.drop_table('planet')
@@ -0,0 +1,42 @@
+"""Add facility count and production rate columns to user
+
+Revision ID: 8e41b6f2c9d3
+Revises: 3c7e9a1d5b20
+Create Date: 2026-10-17 11:40:03.227915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e41b6f2c9d3'
+down_revision = '3c7e9a1d5b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('mining_facility_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('research_outpost_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('colony_base_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('resources_per_minute', sa.Float(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('research_per_minute', sa.Float(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('population_per_minute', sa.Float(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('material_per_minute', sa.Float(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('last_accrual_at', sa.DateTime(), nullable=True))
+
+    # Existing users get their counts and rates from `flask world backfill`
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('last_accrual_at')
+        batch_op.drop_column('material_per_minute')
+        batch_op.drop_column('population_per_minute')
+        batch_op.drop_column('research_per_minute')
+        batch_op.drop_column('resources_per_minute')
+        batch_op.drop_column('colony_base_count')
+        batch_op.drop_column('research_outpost_count')
+        batch_op.drop_column('mining_facility_count')
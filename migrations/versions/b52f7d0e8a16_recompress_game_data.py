@@ -0,0 +1,42 @@
+"""Recompress stored game_data
+
+Revision ID: b52f7d0e8a16
+Revises: 8e41b6f2c9d3
+Create Date: 2026-10-17 14:05:51.630472
+
+"""
+from alembic import op
+from flask import current_app
+
+from flask_app import compression
+
+
+# revision identifiers, used by Alembic.
+revision = 'b52f7d0e8a16'
+down_revision = '8e41b6f2c9d3'
+branch_labels = None
+depends_on = None
+
+CHUNK_SIZE = 500
+
+
+def rewrite(method):
+    totals = None
+    for totals in compression.recompress(op.get_bind(), method, CHUNK_SIZE):
+        pass
+    if totals:
+        print(f"Rewrote {totals['rewritten']} of {totals['rows']} game_data rows as {method}: "
+              f"{totals['bytes_before']} -> {totals['bytes_after']} bytes")
+
+
+def upgrade():
+    # The column stays Text; rows are rewritten in the configured format
+    # (nothing changes while GAME_DATA_COMPRESSION is 'none')
+    method = current_app.config.get('GAME_DATA_COMPRESSION', 'none')
+    if method != 'none':
+        rewrite(method)
+
+
+def downgrade():
+    # Older code only reads plain JSON
+    rewrite('none')
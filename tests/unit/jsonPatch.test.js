@@ -0,0 +1,186 @@
+/**
+ * @jest-environment jsdom
+ */
+import { cloneState, diffState } from '../../flask_app/static/js/jsonPatch.js';
+import { MassGravity } from '../../flask_app/static/js/game';
+
+// Minimal RFC 6902 add/remove/replace, enough to apply what diffState produces
+function applyPatch(document, patch) {
+  const result = cloneState(document);
+  patch.forEach(({ op, path, value }) => {
+    const tokens = path.split('/').slice(1).map(token => token.replace(/~1/g, '/').replace(/~0/g, '~'));
+    if (tokens.length === 0) {
+      throw new Error('whole document operations are not expected');
+    }
+    const key = tokens.pop();
+    const parent = tokens.reduce((container, token) => container[token], result);
+    if (op === 'remove') {
+      if (Array.isArray(parent)) {
+        parent.splice(Number(key), 1);
+      } else {
+        delete parent[key];
+      }
+    } else if (op === 'add' && Array.isArray(parent)) {
+      parent.splice(key === '-' ? parent.length : Number(key), 0, value);
+    } else {
+      parent[key] = value;
+    }
+  });
+  return result;
+}
+
+function expectRoundTrip(before, after) {
+  const patch = diffState(before, after);
+  expect(applyPatch(before, patch)).toEqual(after);
+  return patch;
+}
+
+describe('diffState', () => {
+  test('should produce no operations for equal states', () => {
+    const state = { resources: 10, planets: [{ id: 1, facilities: { mine: 2 } }] };
+
+    expect(diffState(state, cloneState(state))).toEqual([]);
+  });
+
+  test('should replace changed values in nested objects', () => {
+    const before = { resources: 10, research: { level: 1, points: 5 } };
+    const after = { resources: 12, research: { level: 1, points: 8 } };
+
+    const patch = expectRoundTrip(before, after);
+
+    expect(patch).toEqual([
+      { op: 'replace', path: '/resources', value: 12 },
+      { op: 'replace', path: '/research/points', value: 8 }
+    ]);
+  });
+
+  test('should add and remove keys', () => {
+    const before = { ships: { fighter: 3 }, bonus: 1 };
+    const after = { ships: { fighter: 3, cruiser: 1 } };
+
+    const patch = expectRoundTrip(before, after);
+
+    expect(patch).toContainEqual({ op: 'remove', path: '/bonus' });
+    expect(patch).toContainEqual({ op: 'add', path: '/ships/cruiser', value: 1 });
+  });
+
+  test('should treat undefined values as missing keys', () => {
+    const before = { a: 1, b: 2 };
+    const after = { a: 1, b: undefined, c: undefined };
+
+    expect(diffState(before, after)).toEqual([{ op: 'remove', path: '/b' }]);
+  });
+
+  test('should diff equal length arrays element by element', () => {
+    const before = { planets: [{ id: 1, mines: 1 }, { id: 2, mines: 4 }] };
+    const after = { planets: [{ id: 1, mines: 1 }, { id: 2, mines: 5 }] };
+
+    const patch = expectRoundTrip(before, after);
+
+    expect(patch).toEqual([{ op: 'replace', path: '/planets/1/mines', value: 5 }]);
+  });
+
+  test('should replace arrays that changed length whole', () => {
+    const before = { fleets: [1, 2, 3] };
+    const after = { fleets: [1, 2] };
+
+    const patch = expectRoundTrip(before, after);
+
+    expect(patch).toEqual([{ op: 'replace', path: '/fleets', value: [1, 2] }]);
+  });
+
+  test('should replace values whose type changed', () => {
+    const before = { a: { nested: true }, b: [1], c: 'text', d: null };
+    const after = { a: [1, 2], b: { nested: true }, c: 3, d: { x: 1 } };
+
+    const patch = expectRoundTrip(before, after);
+
+    expect(patch).toHaveLength(4);
+    patch.forEach(operation => expect(operation.op).toBe('replace'));
+  });
+
+  test('should escape "/" and "~" in keys', () => {
+    const before = { 'a/b': 1, 'c~d': 2 };
+    const after = { 'a/b': 3, 'c~d': 4 };
+
+    const patch = expectRoundTrip(before, after);
+
+    expect(patch.map(operation => operation.path)).toEqual(['/a~1b', '/c~0d']);
+  });
+
+  test('should not share structure between a state and its clone', () => {
+    const state = { planets: [{ id: 1 }] };
+    const clone = cloneState(state);
+
+    clone.planets[0].id = 2;
+
+    expect(state.planets[0].id).toBe(1);
+  });
+});
+
+describe('MassGravity incremental saves', () => {
+  let game;
+
+  beforeEach(() => {
+    // Only the save bookkeeping is exercised, so skip the constructor (and WebGL)
+    game = Object.create(MassGravity.prototype);
+    game.pendingSaves = [];
+    game.savedState = null;
+    game.stateVersion = null;
+    game.saveGame = jest.fn();
+    game.saveRetryTimer = null;
+  });
+
+  test('should use an acknowledged save as the next patch base', () => {
+    const snapshot = { resources: 10 };
+    game.pendingSaves.push(snapshot);
+
+    game.socketSaveSucceeded({ state_version: 'v2', updated_data: { resources: 11 } });
+
+    expect(game.pendingSaves).toHaveLength(0);
+    expect(game.savedState).toEqual({ resources: 11 });
+    expect(game.stateVersion).toBe('v2');
+  });
+
+  test('should drop the patch base and send a full save on conflict', () => {
+    game.pendingSaves.push({ resources: 12 });
+    game.savedState = { resources: 10 };
+    game.stateVersion = 'v1';
+
+    game.socketSaveConflicted();
+
+    expect(game.pendingSaves).toHaveLength(0);
+    expect(game.savedState).toBeNull();
+    expect(game.stateVersion).toBeNull();
+    expect(game.saveGame).toHaveBeenCalledTimes(1);
+  });
+
+  test('should keep the patch base when a save fails', () => {
+    game.pendingSaves.push({ resources: 12 });
+    game.savedState = { resources: 10 };
+    game.stateVersion = 'v1';
+
+    game.socketSaveFailed({ message: 'Invalid save' });
+
+    expect(game.pendingSaves).toHaveLength(0);
+    expect(game.savedState).toEqual({ resources: 10 });
+    expect(game.stateVersion).toBe('v1');
+    expect(game.saveRetryTimer).toBeNull();
+  });
+
+  test('should resend the newest state once after a rate limited save', () => {
+    jest.useFakeTimers();
+    game.pendingSaves.push({ resources: 12 }, { resources: 13 });
+
+    game.socketSaveFailed({ rate_limited: true, retry_after: 2 });
+    game.socketSaveFailed({ rate_limited: true, retry_after: 2 });
+    jest.advanceTimersByTime(1999);
+    expect(game.saveGame).not.toHaveBeenCalled();
+    jest.advanceTimersByTime(1);
+
+    expect(game.pendingSaves).toHaveLength(0);
+    expect(game.saveGame).toHaveBeenCalledTimes(1);
+    expect(game.saveRetryTimer).toBeNull();
+    jest.useRealTimers();
+  });
+});
@@ -0,0 +1,101 @@
+import pytest
+
+from flask_app.jsonpatch import apply_patch, copy_value, PatchError, PatchConflict, MAX_OPERATIONS
+
+def game_state():
+    return {
+        'resources': 100,
+        'research': {'level': 2, 'points': 5},
+        'planets': [{'id': 1, 'mines': 1}, {'id': 2, 'mines': 4}],
+        'a/b': 1,
+        'c~d': 2
+    }
+
+def test_add_remove_replace():
+    document = apply_patch(game_state(), [
+        {'op': 'replace', 'path': '/resources', 'value': 120},
+        {'op': 'add', 'path': '/research/bonus', 'value': {'mining': 0.1}},
+        {'op': 'remove', 'path': '/research/points'},
+        {'op': 'replace', 'path': '/planets/1/mines', 'value': 5}
+    ])
+
+    assert document['resources'] == 120
+    assert document['research'] == {'level': 2, 'bonus': {'mining': 0.1}}
+    assert document['planets'][1] == {'id': 2, 'mines': 5}
+
+def test_array_insert_append_and_remove():
+    document = apply_patch(game_state(), [
+        {'op': 'add', 'path': '/planets/0', 'value': {'id': 0}},
+        {'op': 'add', 'path': '/planets/-', 'value': {'id': 3}},
+        {'op': 'remove', 'path': '/planets/1'}
+    ])
+
+    assert [planet['id'] for planet in document['planets']] == [0, 2, 3]
+
+def test_replace_changes_type():
+    document = apply_patch(game_state(), [{'op': 'replace', 'path': '/research', 'value': [1, 2]}])
+
+    assert document['research'] == [1, 2]
+
+def test_escaped_keys():
+    document = apply_patch(game_state(), [
+        {'op': 'replace', 'path': '/a~1b', 'value': 3},
+        {'op': 'remove', 'path': '/c~0d'}
+    ])
+
+    assert document['a/b'] == 3
+    assert 'c~d' not in document
+
+def test_move_copy_and_test():
+    document = apply_patch(game_state(), [
+        {'op': 'test', 'path': '/research/level', 'value': 2},
+        {'op': 'copy', 'from': '/planets/0', 'path': '/home'},
+        {'op': 'move', 'from': '/research/points', 'path': '/points'}
+    ])
+
+    assert document['home'] == {'id': 1, 'mines': 1}
+    assert document['home'] is not document['planets'][0]
+    assert document['points'] == 5
+    assert 'points' not in document['research']
+
+@pytest.mark.parametrize('operation', [
+    {'op': 'replace', 'path': '/missing', 'value': 1},
+    {'op': 'remove', 'path': '/research/missing'},
+    {'op': 'add', 'path': '/missing/child', 'value': 1},
+    {'op': 'replace', 'path': '/planets/2/mines', 'value': 1},
+    {'op': 'add', 'path': '/planets/01', 'value': 1},
+    {'op': 'add', 'path': '/planets/²', 'value': 1},
+    {'op': 'remove', 'path': '/planets/١'},
+    {'op': 'test', 'path': '/resources', 'value': 99},
+    {'op': 'test', 'path': '/research/level', 'value': True}
+])
+def test_conflicts(operation):
+    with pytest.raises(PatchConflict):
+        apply_patch(game_state(), [operation])
+
+@pytest.mark.parametrize('patch', [
+    {'op': 'replace', 'path': '/resources', 'value': 1},
+    [{'op': 'increment', 'path': '/resources'}],
+    [{'op': 'replace', 'path': '/resources'}],
+    [{'op': 'move', 'path': '/points'}],
+    [{'op': 'replace', 'path': 'resources', 'value': 1}],
+    [{'op': 'replace', 'path': '', 'value': {}}],
+    [{'op': 'move', 'from': '/research', 'path': '/research/nested'}],
+    [{'op': 'test', 'path': '/resources', 'value': 100}] * (MAX_OPERATIONS + 1)
+])
+def test_malformed_patches(patch):
+    with pytest.raises(PatchError) as error:
+        apply_patch(game_state(), patch)
+
+    assert not isinstance(error.value, PatchConflict)
+
+def test_conflict_on_a_copy_leaves_the_document_alone():
+    document = game_state()
+
+    with pytest.raises(PatchConflict):
+        apply_patch(copy_value(document), [
+            {'op': 'replace', 'path': '/resources', 'value': 0},
+            {'op': 'remove', 'path': '/missing'}
+        ])
+
+    assert document == game_state()
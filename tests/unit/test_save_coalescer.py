@@ -0,0 +1,97 @@
+from flask_app.save_coalescer import SaveCoalescer
+
+def test_newer_saves_replace_a_waiting_one():
+    coalescer = SaveCoalescer(window=2.0)
+
+    assert coalescer.offer(1, {'v': 1}, now=0) is False
+    assert coalescer.offer(1, {'v': 2}, now=1) is True
+    assert coalescer.offer(2, {'v': 1}, now=1) is False
+
+    assert coalescer.get(1) == {'v': 2}
+    assert len(coalescer) == 2
+    assert coalescer.stats()['coalesced'] == 1
+
+def test_first_save_of_a_burst_sets_the_write_time():
+    coalescer = SaveCoalescer(window=2.0)
+    coalescer.offer(1, {'v': 1}, now=0)
+    coalescer.offer(1, {'v': 2}, now=1.9)
+    coalescer.offer(2, {'v': 1}, now=1)
+
+    assert coalescer.pop_due(now=1.99) == []
+    assert coalescer.pop_due(now=2) == [(1, {'v': 2})]
+    assert 1 not in coalescer
+    assert coalescer.pop_due(now=3) == [(2, {'v': 1})]
+
+def test_restore_keeps_a_newer_save():
+    coalescer = SaveCoalescer(window=2.0)
+    coalescer.restore(1, {'v': 1}, now=0)
+    coalescer.offer(2, {'v': 2}, now=0)
+    coalescer.restore(2, {'v': 1}, now=0)
+
+    assert coalescer.get(1) == {'v': 1}
+    assert coalescer.get(2) == {'v': 2}
+
+def test_pop_and_pop_all():
+    coalescer = SaveCoalescer(window=2.0)
+    coalescer.offer(1, {'v': 1}, now=0)
+    coalescer.offer(2, {'v': 2}, now=0)
+
+    assert coalescer.pop(1) == {'v': 1}
+    assert coalescer.pop(1) is None
+    assert coalescer.pop_all() == [(2, {'v': 2})]
+    assert len(coalescer) == 0
+
+def test_rate_limit_allows_a_burst_then_the_rate():
+    coalescer = SaveCoalescer(window=0, rate_limit=60, burst=3)
+
+    assert [coalescer.allow(1, now=0) for _ in range(4)] == [True, True, True, False]
+    assert coalescer.retry_after(1, now=0) == 1.0
+    assert coalescer.allow(1, now=0.5) is False
+    assert coalescer.allow(1, now=1.0) is True
+    assert coalescer.allow(2, now=1.0) is True
+
+    stats = coalescer.stats()
+    assert stats['received'] == 7
+    assert stats['rejected'] == 2
+
+def test_over_limit_save_may_replace_a_waiting_one():
+    coalescer = SaveCoalescer(window=2.0, rate_limit=60, burst=1)
+    assert coalescer.allow(1, now=0) is True
+    coalescer.offer(1, {'v': 1}, now=0)
+
+    assert coalescer.allow(1, now=0.1) is True
+    coalescer.offer(1, {'v': 2}, now=0.1)
+    coalescer.pop_due(now=2)
+
+    assert coalescer.allow(1, now=2.0) is True
+    assert coalescer.allow(1, now=2.0) is False
+    assert coalescer.stats()['rejected'] == 1
+
+def test_retry_after_without_refill():
+    coalescer = SaveCoalescer(rate_limit=0, burst=1)
+    coalescer.allow(1, now=0)
+
+    assert coalescer.retry_after(1, now=100) is None
+    assert coalescer.retry_after(2, now=100) == 0.0
+
+def test_reconnecting_does_not_refill_the_bucket():
+    coalescer = SaveCoalescer(window=0, rate_limit=60, burst=2)
+    coalescer.allow(1, now=0)
+    coalescer.allow(1, now=0)
+
+    coalescer.forget(1, now=0)
+
+    assert coalescer.allow(1, now=0) is False
+
+def test_refilled_buckets_are_dropped():
+    coalescer = SaveCoalescer(window=0, rate_limit=60, burst=2)
+    coalescer.allow(1, now=0)
+    coalescer.allow(2, now=0)
+    coalescer.allow(2, now=0)
+
+    assert coalescer.prune(now=1) == 1
+    assert coalescer.stats()['buckets'] == 1
+    coalescer.forget(2, now=1.5)
+    assert coalescer.stats()['buckets'] == 1
+    coalescer.forget(2, now=2)
+    assert coalescer.stats()['buckets'] == 0
@@ -0,0 +1,162 @@
+import threading
+import time
+
+import pytest
+
+from flask_app.presence import Presence
+from flask_app.shared_state import MemoryStore, RedisStore, RedisPresence, RedisInvalidations
+
+def redis_client(server=None):
+    fakeredis = pytest.importorskip('fakeredis')
+    return fakeredis.FakeRedis(server=server or fakeredis.FakeServer(), decode_responses=True)
+
+@pytest.fixture(params=['memory', 'redis'])
+def backend(request):
+    """Makes registries and stores of one backend; Redis ones share one server"""
+    if request.param == 'memory':
+        return {'presence': lambda **kwargs: Presence(**kwargs), 'store': MemoryStore}
+
+    client = redis_client()
+    return {
+        'presence': lambda **kwargs: RedisPresence(client, 'test:presence', **kwargs),
+        'store': lambda: RedisStore(client, 'test:store')
+    }
+
+def ids(players):
+    return [player['id'] for player in players]
+
+def test_connect_and_disconnect(backend):
+    presence = backend['presence']()
+
+    assert presence.connect(1, 'a', 'alice', 'red') == {
+        'version': 1, 'op': 'join', 'player': {'id': 1, 'username': 'alice', 'faction': 'red'}
+    }
+    assert 1 in presence and len(presence) == 1
+    assert presence[1] == 'a' and presence.get(2) is None
+    assert presence.user_id('a') == 1
+
+    assert presence.disconnect('a') == {'version': 2, 'op': 'leave', 'player': {'id': 1}}
+    assert 1 not in presence and presence.user_id('a') is None
+    assert presence.disconnect('a') is None
+
+def test_reconnect_keeps_the_roster_place(backend):
+    presence = backend['presence']()
+    presence.connect(1, 'a', 'alice', 'red')
+    presence.connect(2, 'b', 'bob', 'red')
+
+    assert presence.connect(1, 'a2', 'alice', 'red') is None
+    assert ids(presence.roster()[0]) == [1, 2]
+    assert presence[1] == 'a2'
+
+    # The old connection closing later doesn't take them offline
+    assert presence.disconnect('a') is None
+    assert 1 in presence
+
+def test_changed_faction_rejoins_at_the_end(backend):
+    presence = backend['presence']()
+    presence.connect(1, 'a', 'alice', 'red')
+    presence.connect(2, 'b', 'bob', 'red')
+
+    assert presence.connect(1, 'a2', 'alice', 'blue')['op'] == 'join'
+    assert ids(presence.roster()[0]) == [2, 1]
+    assert ids(presence.roster('red')[0]) == [2]
+    assert ids(presence.roster('blue')[0]) == [1]
+    assert presence.stats()['factions'] == {'red': 1, 'blue': 1}
+
+def test_roster_pages_and_excludes(backend):
+    presence = backend['presence']()
+    for user_id in range(1, 7):
+        presence.connect(user_id, f's{user_id}', f'u{user_id}', 'red' if user_id % 2 else 'blue')
+
+    assert ids(presence.roster(offset=1, limit=2)[0]) == [2, 3]
+    assert presence.roster(offset=1, limit=2, exclude=1) == (presence.roster(offset=2, limit=2)[0], 5)
+    assert presence.roster(faction='red', exclude=3) == (
+        [presence.player(1), presence.player(5)], 2
+    )
+    assert presence.roster(faction='green') == ([], 0)
+
+def test_sync_sends_missed_deltas_or_the_full_roster(backend):
+    presence = backend['presence'](log_size=2)
+    presence.connect(1, 'a', 'alice', 'red')
+    start = presence.sync()
+    assert ids(start['players']) == [1]
+
+    presence.connect(2, 'b', 'bob', 'blue')
+    caught_up = presence.sync(start['epoch'], start['version'])
+    assert caught_up['version'] == 2
+    assert [delta['version'] for delta in caught_up['deltas']] == [2]
+
+    presence.disconnect('a')
+    presence.connect(3, 'c', 'carol', 'green')
+    # Three versions missed but only two kept
+    assert ids(presence.sync(start['epoch'], start['version'])['players']) == [2, 3]
+    assert 'players' in presence.sync('other', 4)
+    assert presence.sync(start['epoch'], 4)['deltas'] == []
+
+def test_heartbeat_takes_stopped_processes_players_offline():
+    client = redis_client()
+    crashed = RedisPresence(client, 'test:presence', process_ttl=30)
+    alive = RedisPresence(client, 'test:presence', process_ttl=30)
+    crashed.connect(1, 'a', 'alice', 'red')
+    alive.connect(2, 'b', 'bob', 'red')
+    crashed.heartbeat(now=100)
+
+    assert alive.heartbeat(now=120) == []
+    deltas = alive.heartbeat(now=131)
+
+    assert deltas == [{'version': 3, 'op': 'leave', 'player': {'id': 1}}]
+    assert 1 not in alive and 2 in alive
+    assert alive.stats()['connections'] == 1
+    assert alive.heartbeat(now=200) == []
+
+def test_single_process_presence_never_expires():
+    presence = Presence()
+    presence.connect(1, 'a', 'alice', 'red')
+
+    assert presence.heartbeat(now=10 ** 9) == []
+    assert 1 in presence
+
+def test_store_get_set_update_pop(backend):
+    store = backend['store']()
+
+    assert store.get('battle') is None
+    assert store.update('battle', {'ready': True}) is None
+    assert 'battle' not in store
+
+    value = {'players': [1, 2], 'ready': False}
+    store.set('battle', value)
+    value['ready'] = True
+    assert 'battle' in store
+    assert store.get('battle') == {'players': [1, 2], 'ready': False}
+
+    assert store.update('battle', {'ready': True}) == {'players': [1, 2], 'ready': True}
+    store.get('battle')['ready'] = False
+    assert store.get('battle')['ready'] is True
+
+    assert store.pop('battle') == {'players': [1, 2], 'ready': True}
+    assert store.pop('battle') is None
+
+def test_invalidations_reach_other_processes_only():
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    sender = RedisInvalidations(redis_client(server), 'test:forget')
+    receiver = RedisInvalidations(redis_client(server), 'test:forget')
+    sent, received = [], []
+
+    def start_task(target, handler):
+        thread = threading.Thread(target=target, args=(handler,), daemon=True)
+        thread.start()
+        return thread
+
+    sender.subscribe(sent.append, start_task)
+    receiver.subscribe(received.append, start_task)
+    receiver.subscribe(received.append, start_task)
+
+    # Publish until the listener has subscribed (earlier messages are lost)
+    deadline = time.monotonic() + 5
+    while not received and time.monotonic() < deadline:
+        sender.publish([7, 8])
+        time.sleep(0.05)
+
+    assert received[:2] == [7, 8]
+    assert sent == []